@@ -0,0 +1,69 @@
+"""
+Compare the PDF backends on synthetic documents of a realistic size.
+
+    python -m benchmarks.compare_pdf_backends --pages 200 --image-size 1240 1754
+
+Every backend runs the same pipeline as the watermark preview: open the
+document, read the signature placeholders, merge an overlay into every page
+and write the result.
+"""
+import argparse
+import io
+import statistics
+import time
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from benchmarks.pdf_factory import make_pdf
+from edms.common.pdf_backends import PDF_BACKENDS
+from edms.common.pdf_backends import get_pdf_backend
+
+
+def make_overlay():
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=A4)
+    can.setFont("Helvetica", 40)
+    can.drawCentredString(300, 400, "WATERMARK")
+    can.save()
+    packet.seek(0)
+    return packet
+
+
+def run_pipeline(backend, pdf_data):
+    document = backend.open(io.BytesIO(pdf_data))
+    list(backend.iter_annotations(document))
+    overlay = backend.load_overlay(make_overlay())
+    for page_num in range(backend.page_count(document)):
+        backend.page_size(document, page_num)
+        backend.merge_overlay(document, page_num, overlay)
+    return backend.write(document)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--signature-fields", type=int, default=5)
+    parser.add_argument("--image-size", type=int, nargs=2, default=None)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    pdf_data = make_pdf(
+        pages=args.pages,
+        signature_fields=args.signature_fields,
+        image_size=args.image_size,
+    )
+    print(f"{args.pages} pages, {len(pdf_data) / (1024 * 1024):.1f} MB")
+
+    for name in PDF_BACKENDS:
+        backend = get_pdf_backend(name)
+        timings = []
+        for _ in range(args.rounds):
+            started_at = time.perf_counter()
+            run_pipeline(backend, pdf_data)
+            timings.append(time.perf_counter() - started_at)
+        print(f"{name:>10}: median {statistics.median(timings):.3f}s, min {min(timings):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
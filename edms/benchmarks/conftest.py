@@ -0,0 +1,194 @@
+"""
+Fixtures for the PDF benchmarks.
+
+The suite is not part of the default test run, run it explicitly and keep the
+results to compare commits:
+
+    pytest benchmarks --benchmark-autosave
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+
+``--benchmark-json=<path>`` writes a single JSON report instead. Every
+benchmark also records the peak Python heap of one extra run in
+``extra_info["peak_memory_bytes"]``, the signing ones the growth of the
+peak resident set size in ``extra_info["peak_rss_bytes"]``.
+"""
+import base64
+import datetime
+import io
+import tracemalloc
+import uuid
+
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from django.core.files.base import ContentFile
+
+from benchmarks.pdf_factory import make_image
+from benchmarks.pdf_factory import make_pdf
+from edms.assets.models import Asset
+from edms.common.image_cache import SignatureAppearanceCache
+from edms.common.image_cache import SignatureImageCache
+from edms.common.pdf_helper import extract_signature_fields
+from edms.documents.models import Document
+from edms.documents.models import DocumentSignature
+from edms.users.models import UserSignature
+from edms.users.tests.factories import UserFactory
+
+
+@pytest.fixture(autouse=True)
+def _media_storage(settings, tmpdir):
+    settings.MEDIA_ROOT = tmpdir.strpath
+    settings.PDF_POOL_ENABLED = False
+
+
+@pytest.fixture(autouse=True)
+def _signature_image_cache():
+    SignatureImageCache.clear()
+    SignatureAppearanceCache.clear()
+
+
+@pytest.fixture(scope="session")
+def pdf_cache():
+    return {}
+
+
+@pytest.fixture()
+def synthetic_pdf(pdf_cache):
+    """Return ``make_pdf(**spec)``, each spec is generated once per session."""
+    def build(**spec):
+        key = tuple(sorted(spec.items()))
+        if key not in pdf_cache:
+            pdf_cache[key] = make_pdf(**spec)
+        return pdf_cache[key]
+    return build
+
+
+@pytest.fixture()
+def peak_memory(benchmark):
+    """
+    Run a function once under tracemalloc and store the peak in the report.
+
+    Only allocations made through the Python allocator are counted, memory
+    owned by C libraries such as qpdf is not.
+    """
+    def record(func, *args, **kwargs):
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        benchmark.extra_info["peak_memory_bytes"] = peak
+        return peak
+    return record
+
+
+def read_proc_status(field):
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith(f"{field}:"):
+                return int(line.split()[1]) * 1024
+    raise OSError(f"{field} is not reported")
+
+
+@pytest.fixture()
+def peak_rss(benchmark):
+    """
+    Run a function once and store how much it raised the peak RSS in the report.
+
+    Unlike tracemalloc this also counts memory owned by C libraries. Linux
+    only, the peak is reset through /proc/self/clear_refs.
+    """
+    def record(func, *args, **kwargs):
+        try:
+            with open("/proc/self/clear_refs", "w") as clear_refs:
+                clear_refs.write("5")
+            baseline = read_proc_status("VmRSS")
+        except OSError:
+            pytest.skip("Peak RSS can only be measured on Linux.")
+        func(*args, **kwargs)
+        peak = read_proc_status("VmHWM") - baseline
+        benchmark.extra_info["peak_rss_bytes"] = peak
+        return peak
+    return record
+
+
+def make_png(width=400, height=160):
+    output = io.BytesIO()
+    make_image(width, height).save(output, format="PNG")
+    return output.getvalue()
+
+
+@pytest.fixture()
+def signing_document(db):
+    """
+    Create a signing document whose signature file is ``pdf_data``.
+
+    Every signer gets a default signature image, ``signed`` signers are
+    marked as already signed. ``users`` reuses existing users as the first
+    signers, so one user can sign several documents.
+    """
+    def build(pdf_data, signers=1, signed=0, document_category=Document.SIGNING_DOCUMENT, users=()):
+        document = Document.objects.create(
+            document_code=uuid.uuid4().hex,
+            document_title="Benchmark document",
+            document_summary="Benchmark document",
+            urgency_status="normal",
+            document_form="report",
+            security_type="normal",
+            document_processing_deadline_at=0,
+            publish_type="internal",
+            document_number_reference_code="BM",
+            sector="benchmark",
+            processing_status="processing",
+            document_category=document_category,
+        )
+        for order in range(1, signers + 1):
+            signer = users[order - 1] if order <= len(users) else UserFactory()
+            if not signer.user_signature_entries.filter(is_default=True).exists():
+                signature_image = Asset.objects.create(
+                    file=ContentFile(make_png(), name="signature.png"),
+                    size=0,
+                    mime_type="image/png",
+                    asset_name="signature.png",
+                    file_type=Asset.SIGNATURE_IMAGE,
+                )
+                UserSignature.objects.create(user=signer, signature_image=signature_image, is_default=True)
+            DocumentSignature.objects.create(
+                document=document,
+                signer=signer,
+                order=order,
+                signature_status=DocumentSignature.SIGNED if order <= signed else DocumentSignature.UNSIGNED,
+            )
+        return Asset.objects.create(
+            document=document,
+            file=ContentFile(pdf_data, name="document.pdf"),
+            size=len(pdf_data),
+            mime_type="application/pdf",
+            asset_name="document.pdf",
+            file_type=Asset.SIGNATURE_FILE,
+            signature_fields=extract_signature_fields(io.BytesIO(pdf_data)),
+        )
+    return build
+
+
+@pytest.fixture(scope="session")
+def signing_certificate():
+    """A self-signed certificate, base64 DER as returned by MySign."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "EDMS Benchmark Signer")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .sign(key, hashes.SHA256())
+    )
+    return base64.b64encode(certificate.public_bytes(serialization.Encoding.DER)).decode()
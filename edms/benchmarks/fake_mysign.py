@@ -0,0 +1,327 @@
+"""
+Local stand-in for the MySign remote signing service.
+
+Implements the calls made by edms.documents.signing_utils: login, client
+authentication, the credentials list, signHash and the request status. The
+signing keys are issued by a throwaway test CA, so the signatures embedded by
+the application validate against ``FakeMySign.ca_certificate_pem``. Once a
+transaction is confirmed the server can also call the application webhook.
+
+Latency and failures can be injected to load-test the signing flow::
+
+    python -m benchmarks.fake_mysign --port 8773 --latency 0.05 --failure-rate 0.01 \\
+        --webhook-url http://localhost:8000/api/v1/mysign/signing-webhook/ \\
+        --webhook-token <api token>
+
+and point ``MS_BASE_URL`` at ``http://localhost:8773``.
+"""
+import argparse
+import base64
+import datetime
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+from cryptography.x509.oid import NameOID
+
+SIGNED = "1"
+REJECTED = "4002"
+WAITING = "0"
+
+
+def build_certificate(subject, issuer, public_key, signing_key, is_ca):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return (
+        x509.CertificateBuilder()
+        .subject_name(subject)
+        .issuer_name(issuer)
+        .public_key(public_key)
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=365))
+        .add_extension(x509.BasicConstraints(ca=is_ca, path_length=None), critical=True)
+        .add_extension(
+            x509.KeyUsage(
+                digital_signature=not is_ca,
+                content_commitment=not is_ca,
+                key_encipherment=False,
+                data_encipherment=False,
+                key_agreement=False,
+                key_cert_sign=is_ca,
+                crl_sign=is_ca,
+                encipher_only=False,
+                decipher_only=False,
+            ),
+            critical=True,
+        )
+        .sign(signing_key, hashes.SHA256())
+    )
+
+
+class FakeMySign:
+    """
+    In-process fake MySign server.
+
+    ``latency`` seconds are added to every call, ``failure_rate`` of the calls
+    to ``fail_endpoints`` (all of them by default) answer 503. A transaction
+    is confirmed ``confirm_delay`` seconds after signHash, or rejected when
+    ``reject_rate`` says so, and the webhook is called at that moment.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        failure_rate=0.0,
+        fail_endpoints=None,
+        confirm_delay=0.0,
+        reject_rate=0.0,
+        webhook_url=None,
+        webhook_token=None,
+        seed=0,
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.fail_endpoints = set(fail_endpoints or [])
+        self.confirm_delay = confirm_delay
+        self.reject_rate = reject_rate
+        self.webhook_url = webhook_url
+        self.webhook_token = webhook_token
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = {}
+        self.users = {}
+        self.transactions = {}
+        self.requests = {}
+
+        self.ca_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        ca_name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "EDMS Fake MySign CA")])
+        self.ca_certificate = build_certificate(ca_name, ca_name, self.ca_key.public_key(), self.ca_key, is_ca=True)
+
+        self.server = ThreadingHTTPServer((host, port), self.build_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ca_certificate_pem(self):
+        return self.ca_certificate.public_bytes(serialization.Encoding.PEM)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_user(self, user_id):
+        with self.lock:
+            if user_id not in self.users:
+                key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+                subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, f"Fake signer {user_id}")])
+                certificate = build_certificate(
+                    subject, self.ca_certificate.subject, key.public_key(), self.ca_key, is_ca=False
+                )
+                self.users[user_id] = {
+                    "key": key,
+                    "credential_id": f"fake-credential-{user_id}",
+                    "certificates": [
+                        base64.b64encode(cert.public_bytes(serialization.Encoding.DER)).decode()
+                        for cert in (certificate, self.ca_certificate)
+                    ],
+                }
+            return self.users[user_id]
+
+    def should_fail(self, endpoint):
+        if not self.failure_rate or (self.fail_endpoints and endpoint not in self.fail_endpoints):
+            return False
+        with self.lock:
+            return self.random.random() < self.failure_rate
+
+    def count(self, endpoint):
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def login(self, data, user_id):
+        user_id = data.get("user_id")
+        if not user_id:
+            return 400, {"error": "invalid_request", "error_description": "user_id is required"}
+        self.get_user(user_id)
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens[token] = user_id
+        return 200, {"access_token": token, "token_type": "Bearer", "expires_in": 3600}
+
+    def authenticate(self, data, user_id):
+        return 200, {"access_token": uuid.uuid4().hex, "token_type": "Bearer", "expires_in": 3600}
+
+    def certificates(self, data, user_id):
+        user = self.get_user(user_id)
+        return 200, [{
+            "credential_id": user["credential_id"],
+            "cert": {"certificates": user["certificates"]},
+        }]
+
+    def sign_hash(self, data, user_id):
+        user = self.get_user(user_id)
+        if data.get("credentialID") != user["credential_id"]:
+            return 400, {"error": "invalid_request", "error_description": "Unknown credential"}
+        hashes_b64 = data.get("hash") or []
+        if len(hashes_b64) != data.get("numSignatures"):
+            return 400, {"error": "invalid_request", "error_description": "numSignatures does not match hash"}
+
+        transaction_id = uuid.uuid4().hex
+        with self.lock:
+            rejected = self.random.random() < self.reject_rate
+        self.transactions[transaction_id] = {
+            "user_id": user_id,
+            "hashes": [base64.b64decode(value) for value in hashes_b64],
+            "confirm_at": time.monotonic() + self.confirm_delay,
+            "rejected": rejected,
+        }
+        if self.webhook_url:
+            timer = threading.Timer(self.confirm_delay, self.call_webhook, args=(transaction_id,))
+            timer.daemon = True
+            timer.start()
+        return 200, {"transactionId": transaction_id, "expires_in": 300}
+
+    def request_status(self, data, user_id):
+        signing = self.transactions.get(data.get("transactionId"))
+        if not signing or signing["user_id"] != user_id:
+            return 400, {"error": "invalid_request", "error_description": "Unknown transaction"}
+        if time.monotonic() < signing["confirm_at"]:
+            return 200, {"status": WAITING}
+        if signing["rejected"]:
+            return 200, {"status": REJECTED}
+
+        key = self.get_user(user_id)["key"]
+        return 200, {
+            "status": SIGNED,
+            "signatures": [
+                base64.b64encode(key.sign(digest, padding.PKCS1v15(), Prehashed(hashes.SHA256()))).decode()
+                for digest in signing["hashes"]
+            ],
+        }
+
+    def call_webhook(self, transaction_id):
+        headers = {"Authorization": f"Token {self.webhook_token}"} if self.webhook_token else {}
+        try:
+            requests.post(self.webhook_url, json={"transaction_id": transaction_id}, headers=headers, timeout=10)
+        except requests.RequestException:
+            pass
+
+    def build_handler(self):
+        fake = self
+        routes = {
+            "/vtss/service/ras/v1/login": ("login", fake.login, False),
+            "/vtss/service/ras/v1/authenticate": ("authenticate", fake.authenticate, False),
+            "/vtss/service/certificates/info": ("certificates_info", fake.certificates, True),
+            "/vtss/service/signHash": ("sign_hash", fake.sign_hash, True),
+            "/vtss/service/requests/status": ("requests_status", fake.request_status, True),
+        }
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                route = routes.get(self.path)
+                if route is None:
+                    return self.reply(404, {"error": "not_found"})
+                endpoint, handler, authenticated = route
+                fake.count(endpoint)
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if fake.should_fail(endpoint):
+                    return self.reply(503, {"error": "server_error", "error_description": "Injected failure"})
+
+                user_id = None
+                if authenticated:
+                    token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+                    user_id = fake.tokens.get(token)
+                    if user_id is None:
+                        return self.reply(401, {"error": "invalid_token", "error_description": "Unknown token"})
+
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    data = json.loads(body or b"{}")
+                else:
+                    data = {}
+                self.reply(*handler(data, user_id))
+
+            def reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8773)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of calls answering 503")
+    parser.add_argument("--fail-endpoint", action="append", dest="fail_endpoints", help="limit failures to these endpoints")
+    parser.add_argument("--confirm-delay", type=float, default=1.0, help="seconds before a transaction is confirmed")
+    parser.add_argument("--reject-rate", type=float, default=0.0, help="share of transactions the signer rejects")
+    parser.add_argument("--webhook-url")
+    parser.add_argument("--webhook-token")
+    parser.add_argument("--ca-file", help="write the test CA certificate here, as PEM")
+    args = parser.parse_args()
+
+    fake = FakeMySign(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        fail_endpoints=args.fail_endpoints,
+        confirm_delay=args.confirm_delay,
+        reject_rate=args.reject_rate,
+        webhook_url=args.webhook_url,
+        webhook_token=args.webhook_token,
+    )
+    if args.ca_file:
+        with open(args.ca_file, "wb") as ca_file:
+            ca_file.write(fake.ca_certificate_pem)
+    print(f"Fake MySign listening on {fake.base_url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import io
+import random
+
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+
+def make_image(width, height, seed=0):
+    rng = random.Random(seed)
+    image = Image.new("L", (width, height))
+    image.putdata([rng.randrange(256) for _ in range(width * height)])
+    return image
+
+
+def make_pdf(pages=1, page_size=A4, signature_fields=0, image_size=None):
+    """
+    Build a synthetic PDF in memory.
+
+    Signature placeholders are text annotations whose contents is the signer
+    order, the same convention as uploaded signature files. They are spread
+    over the last page. With ``image_size`` every page gets its own embedded
+    grayscale image, which approximates a scanned document.
+    """
+    page_width, page_height = page_size
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=page_size)
+    for page_num in range(pages):
+        can.setFont("Helvetica", 12)
+        for line in range(40):
+            can.drawString(50, page_height - 60 - line * 18, f"Page {page_num + 1} line {line + 1} " * 3)
+        if image_size:
+            image = make_image(*image_size, seed=page_num)
+            can.drawImage(ImageReader(image), 50, 50, page_width - 100, page_height / 2)
+        if page_num == pages - 1:
+            for order in range(1, signature_fields + 1):
+                column = (order - 1) % 4
+                row = (order - 1) // 4
+                x = 40 + column * (page_width - 80) / 4
+                y = 80 + row * 60
+                can.textAnnotation(str(order), Rect=(x, y, x + 100, y + 40), relative=0)
+        can.showPage()
+    can.save()
+    return packet.getvalue()
@@ -0,0 +1,109 @@
+import io
+
+import pytest
+from reportlab.lib.pagesizes import A3
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.pagesizes import landscape
+
+from edms.common import pdf_helper
+from edms.common.pdf_backends import PDF_BACKENDS
+from edms.common.pdf_backends import get_pdf_backend
+from edms.documents.models import Document
+
+DOCUMENTS = [
+    pytest.param({"pages": 1}, id="1p-a4"),
+    pytest.param({"pages": 10}, id="10p-a4"),
+    pytest.param({"pages": 100}, id="100p-a4"),
+    pytest.param({"pages": 1000}, id="1000p-a4"),
+    pytest.param({"pages": 10, "page_size": letter}, id="10p-letter"),
+    pytest.param({"pages": 10, "page_size": landscape(A3)}, id="10p-a3-landscape"),
+    pytest.param({"pages": 10, "image_size": (620, 877)}, id="10p-scanned"),
+    pytest.param({"pages": 100, "image_size": (620, 877)}, id="100p-scanned"),
+]
+SIGNATURE_FIELDS = [1, 5, 20]
+BACKENDS = list(PDF_BACKENDS)
+
+
+@pytest.mark.parametrize("backend_name", BACKENDS)
+@pytest.mark.parametrize("spec", DOCUMENTS)
+def test_add_watermark_to_pdf(benchmark, peak_memory, synthetic_pdf, signing_document, spec, backend_name):
+    pdf_data = synthetic_pdf(signature_fields=5, **spec)
+    asset = signing_document(pdf_data, signers=5)
+
+    def run():
+        return pdf_helper.add_watermark_to_pdf(io.BytesIO(pdf_data), "Benchmark", asset, backend_name=backend_name)
+
+    peak_memory(run)
+    benchmark(run)
+
+
+@pytest.mark.parametrize("spec", DOCUMENTS)
+def test_add_watermark_to_signed_pdf(benchmark, peak_memory, synthetic_pdf, signing_document, spec):
+    pdf_data = synthetic_pdf(signature_fields=5, **spec)
+    asset = signing_document(
+        pdf_data,
+        signers=5,
+        signed=2,
+        document_category=Document.IN_PROGRESS_SIGNING_DOCUMENT,
+    )
+
+    def run():
+        return pdf_helper.add_watermark_to_pdf(io.BytesIO(pdf_data), "Benchmark", asset)
+
+    peak_memory(run)
+    benchmark(run)
+
+
+@pytest.mark.parametrize("backend_name", BACKENDS)
+@pytest.mark.parametrize("signature_fields", SIGNATURE_FIELDS)
+def test_stamp_signatures_to_pdf(
+    benchmark, peak_memory, synthetic_pdf, signing_document, signature_fields, backend_name
+):
+    pdf_data = synthetic_pdf(pages=10, signature_fields=signature_fields)
+    asset = signing_document(pdf_data, signers=signature_fields)
+    backend = get_pdf_backend(backend_name)
+    document = backend.open(io.BytesIO(pdf_data))
+
+    peak_memory(pdf_helper.stamp_signatures_to_pdf, asset, document, backend=backend)
+    benchmark(pdf_helper.stamp_signatures_to_pdf, asset, document, backend=backend)
+
+
+@pytest.mark.parametrize("spec", DOCUMENTS)
+def test_get_signature_field_coordinates(benchmark, peak_memory, synthetic_pdf, spec):
+    pdf_data = synthetic_pdf(signature_fields=20, **spec)
+
+    def run():
+        return pdf_helper.get_signature_field_coordinates(None, input_pdf=io.BytesIO(pdf_data))
+
+    peak_memory(run)
+    benchmark(run)
+
+
+@pytest.mark.parametrize("backend_name", BACKENDS)
+@pytest.mark.parametrize("spec", DOCUMENTS)
+def test_extract_signature_fields(benchmark, peak_memory, synthetic_pdf, spec, backend_name):
+    pdf_data = synthetic_pdf(signature_fields=20, **spec)
+    backend = get_pdf_backend(backend_name)
+
+    def run():
+        return pdf_helper.extract_signature_fields(io.BytesIO(pdf_data), backend=backend)
+
+    peak_memory(run)
+    benchmark(run)
+
+
+@pytest.mark.parametrize("signature_fields", SIGNATURE_FIELDS)
+@pytest.mark.parametrize("spec", DOCUMENTS)
+def test_get_positions_signature(benchmark, peak_memory, synthetic_pdf, signing_document, spec, signature_fields):
+    pdf_data = synthetic_pdf(signature_fields=signature_fields, **spec)
+    asset = signing_document(pdf_data, signers=signature_fields)
+    document_signature = asset.document.signatures.select_related("signer").last()
+
+    def run():
+        return pdf_helper.get_positions_signature(
+            input_pdf=io.BytesIO(pdf_data),
+            document_signature=document_signature,
+        )
+
+    peak_memory(run)
+    benchmark(run)
@@ -0,0 +1,93 @@
+import base64
+import io
+from types import SimpleNamespace
+
+import pytest
+from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+
+from benchmarks.pdf_factory import make_image
+from edms.common import pdf_helper
+from edms.common.image_cache import SignatureAppearanceCache
+from edms.documents.models import Document
+from edms.documents.signing_utils import MySignHelper
+
+DOCUMENTS = [
+    pytest.param({"pages": 1}, id="1p-a4"),
+    pytest.param({"pages": 10}, id="10p-a4"),
+    pytest.param({"pages": 100}, id="100p-a4"),
+    pytest.param({"pages": 1000}, id="1000p-a4"),
+    pytest.param({"pages": 10, "image_size": (620, 877)}, id="10p-scanned"),
+]
+# About 54 MB: every page embeds a 620x877 noise image that does not compress
+LARGE_DOCUMENT = {"pages": 100, "image_size": (620, 877)}
+
+
+@pytest.mark.parametrize("spec", DOCUMENTS)
+def test_prepare_document(benchmark, peak_memory, synthetic_pdf, signing_certificate, spec):
+    pdf_data = synthetic_pdf(signature_fields=1, **spec)
+    signature_field = pdf_helper.extract_signature_fields(io.BytesIO(pdf_data))[0]
+    signature_box = pdf_helper.get_signature_box(
+        signature_field["rect"],
+        signature_field["page_width"],
+        signature_field["page_height"],
+        0.2,
+        0.1,
+    )
+    cert = MySignHelper.get_cert509(signing_certificate)
+    signer = SimpleNamespace(name="Benchmark Signer", email="signer@example.com")
+    signature_appearance = SignatureAppearanceCache.build_appearance(make_image(400, 160))
+
+    def setup():
+        return (), {
+            "file_data": IncrementalPdfFileWriter(io.BytesIO(pdf_data)),
+            "sig_name": "Signature1",
+            "sigpage": signature_field["page"],
+            "signature_box": signature_box,
+            "signature_appearance": signature_appearance,
+            "cert": cert,
+            "signer": signer,
+        }
+
+    args, kwargs = setup()
+    peak_memory(MySignHelper.prepare_document, *args, **kwargs)
+    benchmark.pedantic(MySignHelper.prepare_document, setup=setup, rounds=5)
+
+
+@pytest.mark.parametrize("size", [(400, 160), (1200, 480)], ids=["400x160", "1200x480"])
+def test_build_signature_appearance(benchmark, size):
+    """Work taken out of every signature, done once per signature image version."""
+    image = make_image(*size)
+    benchmark(SignatureAppearanceCache.build_appearance, image)
+
+
+@pytest.fixture()
+def large_signature(synthetic_pdf, signing_document, signing_certificate):
+    pdf_data = synthetic_pdf(signature_fields=1, **LARGE_DOCUMENT)
+    asset = signing_document(pdf_data, document_category=Document.IN_PROGRESS_SIGNING_DOCUMENT)
+    document_signature = asset.document.signatures.select_related("signer").get()
+
+    def prepare():
+        return Document.prepare_signature(
+            document_signature=document_signature,
+            signer=document_signature.signer,
+            pdf_data=pdf_data,
+            signature_fields=asset.signature_fields,
+            signature_appearance=pdf_helper.get_default_signature_appearance(document_signature.signer),
+            cert_data=signing_certificate,
+        )
+    return prepare
+
+
+def test_prepare_signature_large(benchmark, peak_rss, peak_memory, large_signature):
+    peak_rss(large_signature)
+    peak_memory(large_signature)
+    benchmark.pedantic(large_signature, rounds=3)
+
+
+def test_insert_signature_large(benchmark, peak_rss, peak_memory, large_signature, signing_certificate):
+    signature_data = {**large_signature(), "cert": signing_certificate}
+    signed_bytes = base64.b64encode(bytes(256)).decode()
+
+    peak_rss(MySignHelper.insert_signature_into_pdf, signature_data, signed_bytes)
+    peak_memory(MySignHelper.insert_signature_into_pdf, signature_data, signed_bytes)
+    benchmark.pedantic(MySignHelper.insert_signature_into_pdf, args=(signature_data, signed_bytes), rounds=3)
@@ -0,0 +1,159 @@
+"""
+End-to-end signing against the fake MySign server and a moto S3 bucket.
+
+One round prepares the signatures, submits them in one signHash call and
+finalizes the transaction the way the webhook worker does: status lookup,
+signature embedding and upload of the signed file.
+"""
+import io
+
+import boto3
+import pytest
+from asn1crypto import x509 as asn1_x509
+from cryptography.hazmat.primitives import serialization
+from django.core.cache import cache
+from moto import mock_aws
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.validation import validate_pdf_signature
+from pyhanko_certvalidator import ValidationContext
+
+from benchmarks.fake_mysign import FakeMySign
+from edms.documents.models import Document
+from edms.documents.models import DocumentSignature
+from edms.documents.mysign_client import MySignClient
+from edms.documents.services import SigningService
+from edms.documents.verification import SignatureVerifier
+from edms.users.tests.factories import UserFactory
+
+BUCKET_NAME = "edms-benchmark"
+REGION_NAME = "us-east-1"
+
+MYSIGN = [
+    pytest.param({}, id="mysign-0ms"),
+    pytest.param({"latency": 0.05}, id="mysign-50ms"),
+    pytest.param(
+        {"latency": 0.05, "failure_rate": 0.2, "fail_endpoints": ["login", "certificates_info", "requests_status"]},
+        id="mysign-50ms-20pct-503",
+    ),
+]
+
+
+@pytest.fixture()
+def s3(settings, tmp_path):
+    settings.ASSET_CACHE_DIR = str(tmp_path / "asset-cache")
+    settings.AWS_ACCESS_KEY_ID = "benchmark"
+    settings.AWS_SECRET_ACCESS_KEY = "benchmark"
+    settings.AWS_S3_REGION_NAME = REGION_NAME
+    settings.AWS_STORAGE_BUCKET_NAME = BUCKET_NAME
+    with mock_aws():
+        client = boto3.client(
+            "s3",
+            region_name=REGION_NAME,
+            aws_access_key_id="benchmark",
+            aws_secret_access_key="benchmark",
+        )
+        client.create_bucket(Bucket=BUCKET_NAME)
+        yield client
+
+
+@pytest.fixture(params=MYSIGN)
+def fake_mysign(request, settings):
+    with FakeMySign(**request.param) as fake:
+        settings.MS_BASE_URL = fake.base_url
+        settings.MS_CLIENT_ID = "benchmark"
+        settings.MS_CLIENT_SECRET = "benchmark"
+        settings.MS_PROFILE_ID = "benchmark"
+        settings.MS_RETRY_BACKOFF = 0.05
+        MySignClient.reset()
+        cache.clear()
+        yield fake
+    MySignClient.reset()
+
+
+@pytest.fixture()
+def signing_flow(s3, fake_mysign, synthetic_pdf, signing_document, settings, django_capture_on_commit_callbacks):
+    signer = UserFactory(external_user_id="benchmark-signer")
+
+    def build(documents, pages):
+        pdf_data = synthetic_pdf(pages=pages, signature_fields=1)
+        assets = []
+        for _ in range(documents):
+            asset = signing_document(
+                pdf_data,
+                document_category=Document.IN_PROGRESS_SIGNING_DOCUMENT,
+                users=[signer],
+            )
+            s3.put_object(Bucket=BUCKET_NAME, Key=asset.file.name, Body=pdf_data)
+            assets.append(asset)
+        return assets
+
+    def sign(assets):
+        # The prepared files are written once the signatures commit
+        with django_capture_on_commit_callbacks(execute=True):
+            sign_hash_response, errors = Document.sign_documents(
+                documents=[asset.document for asset in assets],
+                user=signer,
+                client_id=settings.MS_CLIENT_ID,
+                client_secret=settings.MS_CLIENT_SECRET,
+                base_url=settings.MS_BASE_URL,
+                profile_id=settings.MS_PROFILE_ID,
+                access_key=settings.AWS_ACCESS_KEY_ID,
+                secret_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.AWS_S3_REGION_NAME,
+                bucket_name=BUCKET_NAME,
+            )
+        assert not errors
+        SigningService.finalize_transaction(sign_hash_response["transactionId"], signer)
+        return assets
+
+    return build, sign
+
+
+def assert_signed(s3, fake_mysign, assets):
+    trust_root = asn1_x509.Certificate.load(fake_mysign.ca_certificate.public_bytes(serialization.Encoding.DER))
+    validation_context = ValidationContext(trust_roots=[trust_root])
+    for asset in assets:
+        # Each signature is stored as a new revision the asset now points at
+        asset.refresh_from_db()
+        assert asset.document.signatures.get().signature_status == DocumentSignature.SIGNED
+        assert asset.document.revisions.count() == 2
+        signed_pdf = s3.get_object(Bucket=BUCKET_NAME, Key=asset.file.name)["Body"].read()
+        embedded_signature = PdfFileReader(io.BytesIO(signed_pdf)).embedded_signatures[0]
+        status = validate_pdf_signature(embedded_signature, validation_context)
+        assert status.intact and status.valid
+
+
+@pytest.mark.parametrize("documents", [1, 10])
+@pytest.mark.parametrize("pages", [10, 100])
+def test_sign_documents_e2e(benchmark, s3, fake_mysign, signing_flow, documents, pages):
+    build, sign = signing_flow
+
+    assets = benchmark.pedantic(sign, setup=lambda: ((build(documents, pages),), {}), rounds=3)
+
+    assert_signed(s3, fake_mysign, assets)
+    benchmark.extra_info["mysign_requests"] = dict(fake_mysign.requests)
+    benchmark.extra_info["mysign_metrics"] = MySignClient.get_metrics()
+
+
+@pytest.mark.parametrize("cached", [False, True], ids=["cold", "cached"])
+def test_verify_document(benchmark, s3, fake_mysign, signing_flow, settings, tmp_path, cached):
+    build, sign = signing_flow
+    [asset] = sign(build(1, 100))
+    document = Document.objects.get(id=asset.document_id)
+
+    trust_store = tmp_path / "trust_store.pem"
+    trust_store.write_bytes(fake_mysign.ca_certificate_pem)
+    settings.SIGNATURE_TRUST_STORE = str(trust_store)
+    SignatureVerifier._trust_roots = None
+
+    def setup():
+        if not cached:
+            cache.clear()
+        return (document,), {}
+
+    SignatureVerifier.verify_document(document)
+    result = benchmark.pedantic(SignatureVerifier.verify_document, setup=setup, rounds=5)
+
+    SignatureVerifier._trust_roots = None
+    assert result["valid"]
+    assert result["content_hash"] == document.current_revision.content_hash
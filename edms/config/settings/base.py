@@ -307,6 +307,21 @@ CELERY_TASK_TIME_LIMIT = 5 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-scheduler
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+# https://docs.celeryq.dev/en/stable/userguide/configuration.html#beat-schedule
+CELERY_BEAT_SCHEDULE = {
+    "expire-signing-sessions": {
+        "task": "edms.documents.tasks.expire_signing_sessions",
+        "schedule": env.int("SIGNING_SESSION_CLEANUP_INTERVAL", default=5 * 60),
+    },
+    "reconcile-pending-signatures": {
+        "task": "edms.documents.tasks.reconcile_pending_signatures",
+        "schedule": env.int("SIGNING_RECONCILE_INTERVAL", default=5 * 60),
+    },
+    "recover-stale-signing-jobs": {
+        "task": "edms.documents.tasks.recover_stale_signing_jobs",
+        "schedule": env.int("SIGNING_JOB_RECOVERY_INTERVAL", default=5 * 60),
+    },
+}
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#worker-send-task-events
 CELERY_WORKER_SEND_TASK_EVENTS = True
 # https://docs.celeryq.dev/en/stable/userguide/configuration.html#std-setting-task_send_sent_event
@@ -392,6 +407,99 @@ MS_CLIENT_ID = env("MS_CLIENT_ID")
 MS_CLIENT_SECRET = env("MS_CLIENT_SECRET")
 MS_BASE_URL = env("MS_BASE_URL")
 MS_PROFILE_ID = env("MS_PROFILE_ID")
+# HTTP client, see edms.documents.mysign_client
+MS_CONNECT_TIMEOUT = env.float("MS_CONNECT_TIMEOUT", default=5)
+MS_READ_TIMEOUT = env.float("MS_READ_TIMEOUT", default=30)
+MS_MAX_RETRIES = env.int("MS_MAX_RETRIES", default=3)
+MS_RETRY_BACKOFF = env.float("MS_RETRY_BACKOFF", default=0.5)
+MS_POOL_MAXSIZE = env.int("MS_POOL_MAXSIZE", default=10)
+# Access tokens are cached until MS_TOKEN_EXPIRY_MARGIN seconds before expiry,
+# MS_TOKEN_DEFAULT_TTL applies when the login answer has no expires_in
+MS_TOKEN_EXPIRY_MARGIN = env.int("MS_TOKEN_EXPIRY_MARGIN", default=60)
+MS_TOKEN_DEFAULT_TTL = env.int("MS_TOKEN_DEFAULT_TTL", default=300)
+MS_CERTIFICATES_CACHE_TIMEOUT = env.int("MS_CERTIFICATES_CACHE_TIMEOUT", default=60 * 60)
+# Documents signed together in one MySign transaction, and how many are prepared at once
+SIGNING_BATCH_MAX_DOCUMENTS = env.int("SIGNING_BATCH_MAX_DOCUMENTS", default=50)
+SIGNING_PREPARE_WORKERS = env.int("SIGNING_PREPARE_WORKERS", default=4)
+# Seconds a signing job may stay queued or running before the recovery task requeues or fails it,
+# above CELERY_TASK_TIME_LIMIT so a running job is only failed once its worker is gone
+SIGNING_JOB_STALE_AFTER = env.int("SIGNING_JOB_STALE_AFTER", default=10 * 60)
+# Seconds a prepared signature waits for the MySign confirmation before it is discarded
+SIGNING_SESSION_TIMEOUT = env.int("SIGNING_SESSION_TIMEOUT", default=60 * 60)
+# Webhook finalization is retried with exponential backoff starting at SIGNING_WEBHOOK_RETRY_BACKOFF
+# seconds, an event left processing for SIGNING_WEBHOOK_PROCESSING_TIMEOUT seconds is claimed again
+SIGNING_WEBHOOK_MAX_RETRIES = env.int("SIGNING_WEBHOOK_MAX_RETRIES", default=5)
+SIGNING_WEBHOOK_RETRY_BACKOFF = env.int("SIGNING_WEBHOOK_RETRY_BACKOFF", default=30)
+SIGNING_WEBHOOK_PROCESSING_TIMEOUT = env.int("SIGNING_WEBHOOK_PROCESSING_TIMEOUT", default=10 * 60)
+# Pending signatures older than this many seconds are looked up in MySign by the reconcile task
+SIGNING_RECONCILE_AFTER = env.int("SIGNING_RECONCILE_AFTER", default=10 * 60)
+SIGNING_RECONCILE_BATCH_SIZE = env.int("SIGNING_RECONCILE_BATCH_SIZE", default=200)
+SIGNING_RECONCILE_CONCURRENCY = env.int("SIGNING_RECONCILE_CONCURRENCY", default=8)
+# Lease and wait, in seconds, of the per-document lock around signature preparation and finalization,
+# a batch holds its locks for SIGNING_LOCK_TIMEOUT seconds per document
+SIGNING_LOCK_TIMEOUT = env.int("SIGNING_LOCK_TIMEOUT", default=60)
+SIGNING_LOCK_WAIT = env.int("SIGNING_LOCK_WAIT", default=5)
+
+# PDF
+# One of "pypdf2" or "pikepdf", see edms.common.pdf_backends
+PDF_BACKEND = env("PDF_BACKEND", default="pypdf2")
+# Watermark previews of signed documents as an incremental update
+PDF_INCREMENTAL_PREVIEW = env.bool("PDF_INCREMENTAL_PREVIEW", default=True)
+
+# PDF POOL
+# Rendering and signing preparation run in spawned worker processes, see
+# edms.common.pdf_pool
+PDF_POOL_ENABLED = env.bool("PDF_POOL_ENABLED", default=True)
+PDF_POOL_MAX_WORKERS = env.int("PDF_POOL_MAX_WORKERS", default=2)
+PDF_POOL_MAX_QUEUE = env.int("PDF_POOL_MAX_QUEUE", default=8)
+PDF_POOL_QUEUE_TIMEOUT = env.int("PDF_POOL_QUEUE_TIMEOUT", default=10)
+PDF_POOL_JOB_TIMEOUT = env.int("PDF_POOL_JOB_TIMEOUT", default=60)
+# Resident memory, in bytes, at which a job is stopped, and above which a worker is replaced after its job
+PDF_POOL_MAX_MEMORY = env.int("PDF_POOL_MAX_MEMORY", default=1024 * 1024 * 1024)
+PDF_POOL_RECYCLE_MEMORY = env.int("PDF_POOL_RECYCLE_MEMORY", default=512 * 1024 * 1024)
+PDF_POOL_MAX_TASKS_PER_CHILD = env.int("PDF_POOL_MAX_TASKS_PER_CHILD", default=100)
+
+# PDF OPTIMIZATION
+# Recompress uploaded PDFs after upload, see edms.common.pdf_optimizer
+PDF_OPTIMIZE_ON_UPLOAD = env.bool("PDF_OPTIMIZE_ON_UPLOAD", default=False)
+PDF_OPTIMIZE_MAX_DPI = env.int("PDF_OPTIMIZE_MAX_DPI", default=150)
+PDF_OPTIMIZE_JPEG_QUALITY = env.int("PDF_OPTIMIZE_JPEG_QUALITY", default=75)
+
+# OFFICE CONVERSION
+# Headless LibreOffice, run by process_assets in its own session rather than a PDF pool worker,
+# whose limits do not cover the processes it starts. The whole session is killed after
+# OFFICE_CONVERSION_TIMEOUT seconds or past OFFICE_CONVERSION_MAX_RSS bytes resident
+OFFICE_CONVERTER_BINARY = env("OFFICE_CONVERTER_BINARY", default="soffice")
+OFFICE_CONVERSION_TIMEOUT = env.int("OFFICE_CONVERSION_TIMEOUT", default=45)
+OFFICE_CONVERSION_MAX_RSS = env.int("OFFICE_CONVERSION_MAX_RSS", default=1024 * 1024 * 1024)
+
+# ASSET THUMBNAILS
+ASSET_THUMBNAIL_PAGES = env.int("ASSET_THUMBNAIL_PAGES", default=1)
+ASSET_THUMBNAIL_WIDTH = env.int("ASSET_THUMBNAIL_WIDTH", default=240)
+ASSET_THUMBNAIL_QUALITY = env.int("ASSET_THUMBNAIL_QUALITY", default=60)
+
+# ASSET TEXT SEARCH
+# Extracted text is capped per asset, content matches rank below metadata
+ASSET_TEXT_MAX_CHARS = env.int("ASSET_TEXT_MAX_CHARS", default=200_000)
+SEARCH_CONTENT_WEIGHT = env.float("SEARCH_CONTENT_WEIGHT", default=0.4)
+
+# SIGNATURE IMAGE CACHE
+SIGNATURE_IMAGE_CACHE_MAX_ENTRIES = env.int("SIGNATURE_IMAGE_CACHE_MAX_ENTRIES", default=256)
+SIGNATURE_IMAGE_CACHE_MAX_BYTES = env.int("SIGNATURE_IMAGE_CACHE_MAX_BYTES", default=2 * 1024 * 1024)
+SIGNATURE_IMAGE_CACHE_TIMEOUT = env.int("SIGNATURE_IMAGE_CACHE_TIMEOUT", default=7 * 24 * 60 * 60)
+
+# LOCAL ASSET CACHE
+# Document revisions kept on the local disk by content hash, see edms.common.asset_cache
+ASSET_CACHE_DIR = env("ASSET_CACHE_DIR", default="/tmp/edms-asset-cache")
+ASSET_CACHE_MAX_BYTES = env.int("ASSET_CACHE_MAX_BYTES", default=2 * 1024 * 1024 * 1024)
+
+# SIGNATURE VERIFICATION
+# PEM or DER certificates trusted as signer roots, a file or a directory of files
+SIGNATURE_TRUST_STORE = env("SIGNATURE_TRUST_STORE", default=str(APPS_DIR / "trust_store"))
+SIGNATURE_VERIFICATION_ALLOW_FETCHING = env.bool("SIGNATURE_VERIFICATION_ALLOW_FETCHING", default=False)
+# Seconds a verification result is cached, shorter when revocation data is fetched as it can change
+SIGNATURE_VERIFICATION_CACHE_TIMEOUT = env.int("SIGNATURE_VERIFICATION_CACHE_TIMEOUT", default=24 * 60 * 60)
+SIGNATURE_VERIFICATION_FETCHING_CACHE_TIMEOUT = env.int("SIGNATURE_VERIFICATION_FETCHING_CACHE_TIMEOUT", default=5 * 60)
 
 # FIREBASE
 GOOGLE_APPLICATION_CREDENTIALS = env("FCM_CONFIG_FILE")
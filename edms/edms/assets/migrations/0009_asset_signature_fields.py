@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0008_asset_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='signature_fields',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0009_asset_signature_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='thumbnails',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
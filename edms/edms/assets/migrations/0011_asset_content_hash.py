@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 12:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0010_asset_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
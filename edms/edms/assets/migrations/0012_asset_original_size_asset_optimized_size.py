@@ -0,0 +1,23 @@
+# Generated by Django 5.0.8 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0011_asset_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='original_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='asset',
+            name='optimized_size',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
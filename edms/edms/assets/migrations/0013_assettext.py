@@ -0,0 +1,31 @@
+# Generated by Django 5.0.8 on 2026-10-19 13:40
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0012_asset_original_size_asset_optimized_size'),
+        ('documents', '0007_alter_document_document_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetText',
+            fields=[
+                ('asset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='assets.asset')),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(null=True)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('truncated', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='asset_texts', to='documents.document')),
+            ],
+            options={
+                'indexes': [django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='assettext_search_vector_idx')],
+            },
+        ),
+    ]
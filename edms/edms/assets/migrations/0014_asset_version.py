@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0013_assettext'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='asset',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,14 +1,26 @@
+import hashlib
 import os
 import uuid
 from datetime import datetime
 
-from django.db import models
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.db.models import Value
 
+from edms.common import office_converter
+from edms.common import pdf_helper
+from edms.common import pdf_optimizer
 from edms.common.basemodels import BaseModel
 from rest_framework.generics import get_object_or_404
 
+from edms.common.pdf_pool import PdfRenderPool
 from edms.common.s3_helper import S3FileManager
 from edms.core.models import SoftDeleteModel
+from edms.search.filters import Unaccent
 
 
 def get_path_files(instance, filename):
@@ -66,6 +78,13 @@ class Asset(SoftDeleteModel, BaseModel):
         choices=FILE_TYPE_CHOICES,
         default=ATTACHMENT,
     )
+    signature_fields = models.JSONField(null=True, blank=True)
+    thumbnails = models.JSONField(null=True, blank=True)
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    original_size = models.BigIntegerField(null=True, blank=True)
+    optimized_size = models.BigIntegerField(null=True, blank=True)
+    # Bumped on every rewrite of the file, checked before a signature is embedded
+    version = models.PositiveIntegerField(default=0)
 
     def get_asset_file(self, access_key, secret_key, region_name, bucket_name):
         s3_client = S3FileManager.s3_connection(
@@ -81,6 +100,196 @@ class Asset(SoftDeleteModel, BaseModel):
         )
         return asset_file
 
+    def get_asset_data(self, access_key, secret_key, region_name, bucket_name):
+        s3_client = S3FileManager.s3_connection(
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region_name
+        )
+        return S3FileManager.get_object_data(
+            bucket_name=bucket_name,
+            file_key=self.file.name,
+            s3_client=s3_client
+        )
+
+    def get_signature_fields(self, input_pdf):
+        if self.signature_fields is None:
+            self.signature_fields = pdf_helper.get_signature_fields(input_pdf)
+            Asset.objects.filter(pk=self.pk).update(signature_fields=self.signature_fields)
+        return self.signature_fields
+
+    def read_file(self):
+        with self.file.open("rb") as asset_file:
+            return asset_file.read()
+
+    def get_pdf_data(self):
+        if self.mime_type == "application/pdf":
+            return self.read_file()
+        if office_converter.is_office_file(self.mime_type):
+            return self.get_converted_pdf()
+        return None
+
+    def get_converted_pdf(self, convert=True):
+        """
+        Return the PDF rendition of an Office asset.
+
+        Conversions are stored under the SHA-256 of the source file, so every
+        distinct file is converted once however many assets share it. With
+        ``convert`` unset a missing rendition returns None, web requests never
+        run LibreOffice and leave the conversion to process_assets.
+        """
+        file_data = None
+        if not self.content_hash:
+            file_data = self.read_file()
+            self.content_hash = hashlib.sha256(file_data).hexdigest()
+            Asset.objects.filter(pk=self.pk).update(content_hash=self.content_hash)
+
+        storage = self.file.storage
+        if storage.exists(self.get_converted_pdf_name()):
+            with storage.open(self.get_converted_pdf_name(), "rb") as converted_file:
+                return converted_file.read()
+        if not convert:
+            return None
+
+        if file_data is None:
+            file_data = self.read_file()
+        pdf_data = office_converter.convert_to_pdf(
+            file_data,
+            self.mime_type,
+            settings.OFFICE_CONVERTER_BINARY,
+            settings.OFFICE_CONVERSION_TIMEOUT,
+            settings.OFFICE_CONVERSION_MAX_RSS,
+        )
+        storage.save(self.get_converted_pdf_name(), ContentFile(pdf_data))
+        return pdf_data
+
+    def schedule_conversion(self):
+        """Queue the conversion of an Office asset, at most once per OFFICE_CONVERSION_TIMEOUT."""
+        if cache.add(f"asset:converting:{self.pk}", True, timeout=settings.OFFICE_CONVERSION_TIMEOUT * 2):
+            Asset.schedule_processing([self])
+
+    def get_converted_pdf_name(self):
+        return f"converted/{self.content_hash}.pdf"
+
+    def process(self, optimize=False):
+        pdf_data = self.get_pdf_data()
+        if pdf_data is None:
+            return
+        if optimize and self.mime_type == "application/pdf":
+            pdf_data = self.optimize(pdf_data)
+        self.generate_thumbnails(pdf_data)
+        if self.document_id:
+            self.extract_text(pdf_data)
+
+    def is_signing_started(self):
+        from edms.documents.models import DocumentSignature
+        return bool(self.document) and self.document.signatures.exclude(
+            signature_status=DocumentSignature.UNSIGNED
+        ).exists()
+
+    def optimize(self, pdf_data):
+        """
+        Replace an uploaded PDF by its optimized version when that is smaller.
+
+        Skipped once signing has started and for PDFs that already carry
+        digital signatures, rewriting the file would break the byte ranges of
+        embedded signatures. The optimized file is stored under a new name and
+        the original is deleted only once the asset points at it, unless a
+        document revision still refers to it.
+        """
+        if self.is_signing_started():
+            return pdf_data
+
+        optimized_data = PdfRenderPool.run(
+            pdf_optimizer.optimize_pdf,
+            pdf_data,
+            settings.PDF_OPTIMIZE_MAX_DPI,
+            settings.PDF_OPTIMIZE_JPEG_QUALITY,
+        )
+        if optimized_data is None:
+            return pdf_data
+
+        self.original_size = len(pdf_data)
+        self.optimized_size = len(optimized_data)
+        fields = {
+            "original_size": self.original_size,
+            "optimized_size": self.optimized_size,
+        }
+        if self.optimized_size >= self.original_size or self.is_signing_started():
+            Asset.objects.filter(pk=self.pk).update(**fields)
+            return pdf_data
+
+        storage = self.file.storage
+        original_name = self.file.name
+        root, ext = os.path.splitext(original_name)
+        optimized_name = storage.save(f"{root}-optimized{ext}", ContentFile(optimized_data))
+        content_hash = hashlib.sha256(optimized_data).hexdigest()
+        # Only if the file was not replaced meanwhile, a signature may have landed
+        if not Asset.objects.filter(pk=self.pk, file=original_name).update(
+            file=optimized_name,
+            size=self.optimized_size,
+            content_hash=content_hash,
+            version=models.F("version") + 1,
+            **fields,
+        ):
+            storage.delete(optimized_name)
+            return pdf_data
+
+        def delete_original():
+            from edms.documents.models import DocumentRevision
+            # Revision 0 of a document whose signing started meanwhile keeps the uploaded file
+            if not DocumentRevision.objects.filter(file=original_name).exists():
+                storage.delete(original_name)
+
+        transaction.on_commit(delete_original)
+        self.file.name = optimized_name
+        self.size = self.optimized_size
+        self.content_hash = content_hash
+        return optimized_data
+
+    def generate_thumbnails(self, pdf_data):
+        images = PdfRenderPool.run(
+            pdf_helper.render_thumbnails,
+            pdf_data,
+            pages=settings.ASSET_THUMBNAIL_PAGES,
+            width=settings.ASSET_THUMBNAIL_WIDTH,
+            quality=settings.ASSET_THUMBNAIL_QUALITY,
+        )
+        thumbnails = []
+        for page_num, image in enumerate(images, start=1):
+            name = os.path.join(os.path.dirname(self.file.name), "thumbnails", f"page-{page_num}.webp")
+            self.file.storage.delete(name)
+            thumbnails.append(self.file.storage.save(name, ContentFile(image)))
+        self.thumbnails = thumbnails
+        Asset.objects.filter(pk=self.pk).update(thumbnails=thumbnails)
+        return thumbnails
+
+    def extract_text(self, pdf_data):
+        text, page_count, truncated = PdfRenderPool.run(
+            pdf_helper.extract_text,
+            pdf_data,
+            settings.ASSET_TEXT_MAX_CHARS,
+        )
+        AssetText.objects.update_or_create(
+            asset=self,
+            defaults={
+                "document_id": self.document_id,
+                "search_vector": SearchVector(Unaccent(Value(text)), config="simple"),
+                "page_count": page_count,
+                "truncated": truncated,
+            },
+        )
+
+    def get_thumbnail_urls(self):
+        return [self.file.storage.url(name) for name in self.thumbnails or []]
+
+    @staticmethod
+    def schedule_processing(assets, optimize=False):
+        from edms.assets.tasks import process_assets
+        asset_ids = [asset.id for asset in assets if asset.file]
+        if asset_ids:
+            transaction.on_commit(lambda: process_assets.delay(asset_ids, optimize=optimize))
+
     def download_asset_file(self, access_key, secret_key, region_name, bucket_name):
         s3_client = S3FileManager.s3_connection(
             aws_access_key_id=access_key,
@@ -93,3 +302,40 @@ class Asset(SoftDeleteModel, BaseModel):
             s3_client=s3_client
         )
         return file_path
+
+
+class AssetTextManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(asset__deleted=False)
+
+
+class AssetText(models.Model):
+    """
+    Searchable text of a PDF or converted Office asset.
+
+    Only the unaccented ``simple`` tsvector is kept, not the text itself.
+    """
+    asset = models.OneToOneField(
+        Asset,
+        related_name="text",
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    document = models.ForeignKey(
+        "documents.Document",
+        related_name="asset_texts",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+    )
+    search_vector = SearchVectorField(null=True)
+    page_count = models.PositiveIntegerField(default=0)
+    truncated = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = AssetTextManager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["search_vector"], name="assettext_search_vector_idx"),
+        ]
@@ -0,0 +1,22 @@
+import logging
+
+from celery import shared_task
+
+from .models import Asset
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task()
+def process_assets(asset_ids, optimize=False):
+    """
+    Post-upload stages for document and meeting assets.
+
+    Office files are converted to PDF first, uploaded PDFs are optimized when
+    ``optimize`` is set, then page thumbnails are rendered from the PDF.
+    """
+    for asset in Asset.objects.filter(id__in=asset_ids):
+        try:
+            asset.process(optimize=optimize)
+        except Exception as e:
+            logger.error("Error: %s", e)
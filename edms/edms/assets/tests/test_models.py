@@ -0,0 +1,184 @@
+import io
+
+import pikepdf
+import pytest
+from django.contrib.postgres.search import SearchQuery
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from edms.assets.models import Asset
+from edms.assets.models import AssetText
+from edms.common import office_converter
+from edms.common import pdf_helper
+from edms.common.pdf_optimizer import has_digital_signatures
+from edms.common.tests.factories import make_pdf
+from edms.documents.models import DocumentRevision
+from edms.documents.tests.factories import DocumentFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def make_asset(pdf_data, file_type=Asset.ATTACHMENT, **kwargs):
+    return Asset.objects.create(
+        file=ContentFile(pdf_data, name="document.pdf"),
+        size=len(pdf_data),
+        mime_type="application/pdf",
+        asset_name="document.pdf",
+        file_type=file_type,
+        **kwargs,
+    )
+
+
+def test_signature_fields_of_a_legacy_asset_are_stored_once(monkeypatch):
+    pdf_data = make_pdf(signature_fields=[(0, 1)])
+    asset = make_asset(pdf_data, file_type=Asset.SIGNATURE_FILE)
+    parsed = []
+    get_signature_fields = pdf_helper.get_signature_fields
+    monkeypatch.setattr(pdf_helper, "get_signature_fields", lambda input_pdf: parsed.append(1) or get_signature_fields(input_pdf))
+
+    signature_fields = asset.get_signature_fields(io.BytesIO(pdf_data))
+    asset.refresh_from_db()
+
+    assert asset.get_signature_fields(io.BytesIO(pdf_data)) == signature_fields
+    assert [field["order"] for field in signature_fields] == [1]
+    assert parsed == [1]
+
+
+def test_thumbnails_are_rendered_in_the_pdf_pool(settings, pdf_pool):
+    settings.ASSET_THUMBNAIL_PAGES = 2
+    settings.ASSET_THUMBNAIL_WIDTH = 120
+    pdf_data = make_pdf(pages=3)
+    asset = make_asset(pdf_data)
+
+    thumbnails = asset.generate_thumbnails(pdf_data)
+
+    asset.refresh_from_db()
+    assert asset.thumbnails == thumbnails
+    assert [name.rsplit("/", 1)[1] for name in thumbnails] == ["page-1.webp", "page-2.webp"]
+    with asset.file.storage.open(thumbnails[0], "rb") as thumbnail:
+        assert Image.open(thumbnail).width == 120
+
+
+def make_office_asset(data):
+    return Asset.objects.create(
+        file=ContentFile(data, name="document.docx"),
+        size=len(data),
+        mime_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        asset_name="document.docx",
+        file_type=Asset.ATTACHMENT,
+    )
+
+
+def test_office_file_is_converted_once_per_content(monkeypatch):
+    conversions = []
+    monkeypatch.setattr(
+        office_converter,
+        "convert_to_pdf",
+        lambda file_data, *args: conversions.append(file_data) or b"%PDF-" + file_data,
+    )
+    asset = make_office_asset(b"report")
+    copy = make_office_asset(b"report")
+
+    assert copy.get_converted_pdf(convert=False) is None
+    assert asset.get_converted_pdf() == b"%PDF-report"
+    # The web request finds the rendition stored by process_assets
+    assert copy.get_converted_pdf(convert=False) == b"%PDF-report"
+    assert conversions == [b"report"]
+
+
+def make_optimizable_pdf(signature_field=False, sig_flags=0):
+    """A one page PDF with an uncompressed content stream, so optimizing it pays off."""
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    pdf.pages[0].Contents = pdf.make_stream(b"0 0 m 10 10 l S\n" * 2000)
+    if signature_field or sig_flags:
+        fields = pikepdf.Array()
+        if signature_field:
+            fields.append(pdf.make_indirect(pikepdf.Dictionary(
+                FT=pikepdf.Name.Sig,
+                T="Signature1",
+                Rect=[0, 0, 100, 50],
+            )))
+        pdf.Root.AcroForm = pdf.make_indirect(pikepdf.Dictionary(Fields=fields, SigFlags=sig_flags))
+    output = io.BytesIO()
+    pdf.save(output, compress_streams=False)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize(
+    ("signature_field", "sig_flags", "expected"),
+    [
+        (False, 0, False),
+        (True, 0, True),
+        (False, 3, True),
+    ],
+)
+def test_has_digital_signatures(signature_field, sig_flags, expected):
+    with pikepdf.open(io.BytesIO(make_optimizable_pdf(signature_field, sig_flags))) as pdf:
+        assert has_digital_signatures(pdf) is expected
+
+
+@pytest.mark.parametrize(("signature_field", "sig_flags"), [(True, 0), (False, 3)])
+def test_optimize_leaves_signed_pdfs_untouched(signature_field, sig_flags):
+    pdf_data = make_optimizable_pdf(signature_field, sig_flags)
+    asset = make_asset(pdf_data)
+    file_name = asset.file.name
+
+    assert asset.optimize(pdf_data) is pdf_data
+
+    asset.refresh_from_db()
+    assert asset.file.name == file_name
+    assert asset.version == 0
+    assert asset.optimized_size is None
+    assert asset.read_file() == pdf_data
+
+
+def test_optimize_stores_the_smaller_file_under_a_new_name(django_capture_on_commit_callbacks):
+    pdf_data = make_optimizable_pdf()
+    asset = make_asset(pdf_data)
+    original_name = asset.file.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        optimized_data = asset.optimize(pdf_data)
+
+    asset.refresh_from_db()
+    assert len(optimized_data) < len(pdf_data)
+    assert asset.file.name != original_name
+    assert asset.version == 1
+    assert asset.read_file() == optimized_data
+    assert not asset.file.storage.exists(original_name)
+
+
+def test_optimize_keeps_the_original_of_a_revision(django_capture_on_commit_callbacks):
+    pdf_data = make_optimizable_pdf()
+    asset = make_asset(pdf_data, file_type=Asset.SIGNATURE_FILE)
+    original_name = asset.file.name
+
+    with django_capture_on_commit_callbacks(execute=True):
+        asset.optimize(pdf_data)
+        # Signing started before the optimization committed
+        DocumentRevision.objects.create(
+            document=DocumentFactory(),
+            asset=asset,
+            file=original_name,
+            content_hash="hash",
+            size=len(pdf_data),
+        )
+
+    assert asset.file.name != original_name
+    assert asset.file.storage.exists(original_name)
+
+
+def test_extracted_text_is_searchable(settings):
+    settings.ASSET_TEXT_MAX_CHARS = 1000
+    document = DocumentFactory()
+    pdf_data = make_pdf(pages=2, text="Quarterly report, page {page}")
+    asset = make_asset(pdf_data, document=document)
+
+    asset.extract_text(pdf_data)
+
+    asset_text = AssetText.objects.get(asset=asset)
+    assert asset_text.document == document
+    assert (asset_text.page_count, asset_text.truncated) == (2, False)
+    assert AssetText.objects.filter(search_vector=SearchQuery("quarterly", config="simple")).exists()
+    assert not AssetText.objects.filter(search_vector=SearchQuery("annual", config="simple")).exists()
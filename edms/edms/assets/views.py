@@ -10,8 +10,12 @@ from rest_framework.response import Response
 from edms.common.app_status import AppResponse
 from edms.assets.models import Asset
 from edms.assets.serializers import AssetSerializer
+from edms.common.office_converter import is_office_file
 from edms.common.pdf_helper import add_watermark_to_pdf
+from edms.common.pdf_pool import PdfJobError
+from edms.common.app_status import ErrorResponse
 import datetime
+import io
 from django.conf import settings
 
 from edms.common.permissions import IsOwnerOrAdmin
@@ -49,14 +53,24 @@ class AssetViewSet(
     def get_preview_pdf(self, request, pk=None):
         asset = get_object_or_404(self.get_queryset(), id=pk)
 
-        input_pdf = asset.get_asset_file(
-            access_key=settings.AWS_ACCESS_KEY_ID,
-            secret_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME,
-            bucket_name=settings.AWS_STORAGE_BUCKET_NAME,
-        )
         watermark_text = f"{request.user.name} - {request.user.citizen_identification} - {datetime.datetime.now().strftime('%d/%m/%Y')}"
-        output_pdf = add_watermark_to_pdf(input_pdf, watermark_text, asset)
+        try:
+            if is_office_file(asset.mime_type):
+                pdf_data = asset.get_converted_pdf(convert=False)
+                if pdf_data is None:
+                    asset.schedule_conversion()
+                    return ErrorResponse("The document is being converted to PDF, please try again shortly.").failure_response()
+                input_pdf = io.BytesIO(pdf_data)
+            else:
+                input_pdf = asset.get_asset_file(
+                    access_key=settings.AWS_ACCESS_KEY_ID,
+                    secret_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME,
+                    bucket_name=settings.AWS_STORAGE_BUCKET_NAME,
+                )
+            output_pdf = add_watermark_to_pdf(input_pdf, watermark_text, asset)
+        except PdfJobError as e:
+            return ErrorResponse(str(e)).failure_response()
 
         response = HttpResponse(output_pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{asset.asset_name}_watermarked.pdf"'
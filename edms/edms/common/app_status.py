@@ -26,6 +26,7 @@ class AppResponse(Enum):
     SEND_DOCUMENTS = status.HTTP_200_OK, "DOCUMENTS__SEND__SUCCESS"
     START_SIGNING_DOCUMENTS = status.HTTP_200_OK, "DOCUMENTS__START_SIGNING__SUCCESS"
     CONTINUES_SIGNING_DOCUMENTS = status.HTTP_200_OK, "DOCUMENTS__CONTINUES_SIGNING__SUCCESS"
+    SUBMIT_SIGNING_DOCUMENTS = status.HTTP_202_ACCEPTED, "DOCUMENTS__SUBMIT_SIGNING__SUCCESS"
     SEND_DOCUMENTS_FAILURE = status.HTTP_400_BAD_REQUEST, "DOCUMENTS__SEND__FAILURE"
 
     CREATE_MEETING_SCHEDULE = status.HTTP_201_CREATED, "MEETING_SCHEDULE__CREATE__SUCCESS"
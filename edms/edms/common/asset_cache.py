@@ -0,0 +1,97 @@
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Share of ASSET_CACHE_MAX_BYTES kept by an eviction, so the next puts do not scan again
+EVICT_TO = 0.9
+
+
+class LocalAssetCache:
+    """
+    On-disk cache of immutable file contents, keyed by their SHA-256.
+
+    Entries are addressed by content and never change, so every process of the
+    host shares them without invalidation. Files are written to a temporary
+    name and renamed, a reader never sees a partial entry. The least recently
+    used entries are evicted once the cache grows past ASSET_CACHE_MAX_BYTES.
+    The size of the cache is counted by one scan of the directory on the
+    first put, then kept up to date as entries are written. Only an eviction
+    scans the directory again, it also picks up what other processes wrote.
+    Cache errors are logged and treated as misses.
+    """
+    _lock = threading.Lock()
+    # Bytes held by each cache directory
+    _sizes = {}
+
+    @staticmethod
+    def get_path(content_hash):
+        return Path(settings.ASSET_CACHE_DIR) / content_hash[:2] / content_hash
+
+    @classmethod
+    def get(cls, content_hash):
+        path = cls.get_path(content_hash)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.error("Error: %s", e)
+            return None
+        return data
+
+    @classmethod
+    def put(cls, content_hash, data):
+        path = cls.get_path(content_hash)
+        try:
+            if path.exists():
+                os.utime(path)
+                return
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as cache_file:
+                cache_file.write(data)
+            os.replace(cache_file.name, path)
+            cls.add_size(len(data))
+        except OSError as e:
+            logger.error("Error: %s", e)
+
+    @staticmethod
+    def scan(root):
+        entries = []
+        for path in root.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    @classmethod
+    def add_size(cls, size):
+        root = Path(settings.ASSET_CACHE_DIR)
+        with cls._lock:
+            if root in cls._sizes:
+                cls._sizes[root] += size
+            else:
+                # The new entry is already on disk
+                cls._sizes[root] = sum(entry_size for _, entry_size, _ in cls.scan(root))
+            if cls._sizes[root] > settings.ASSET_CACHE_MAX_BYTES:
+                cls._sizes[root] = cls.evict(root)
+
+    @classmethod
+    def evict(cls, root):
+        """Delete the least recently used entries of ``root`` down to EVICT_TO, returns the bytes left."""
+        entries = cls.scan(root)
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= settings.ASSET_CACHE_MAX_BYTES * EVICT_TO:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        return total
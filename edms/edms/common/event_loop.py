@@ -0,0 +1,27 @@
+import asyncio
+import threading
+
+_local = threading.local()
+
+
+def get_event_loop():
+    """Return the event loop of the current thread, created on first use and reused afterwards."""
+    loop = getattr(_local, "loop", None)
+    if loop is None or loop.is_closed():
+        loop = _local.loop = asyncio.new_event_loop()
+    return loop
+
+
+def run_sync(coroutine):
+    """
+    Run ``coroutine`` to completion on the event loop of the current thread.
+
+    Unlike asyncio.run, no loop is created and torn down per call. Code that
+    already runs inside an event loop must await the coroutine instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return get_event_loop().run_until_complete(coroutine)
+    coroutine.close()
+    raise RuntimeError("run_sync cannot be called from a running event loop, await the coroutine instead.")
@@ -0,0 +1,142 @@
+import io
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class SignatureImageCache:
+    """
+    Two level cache of decoded signature images.
+
+    Decoded images are kept in a bounded in-process LRU, the raw image bytes are
+    shared between processes through the default (Redis) cache. Keys contain the
+    asset id and its ``updated_at`` so a replaced image is never served stale.
+    """
+    _images = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_version(asset):
+        return int(asset.updated_at.timestamp() * 1000) if asset.updated_at else 0
+
+    @classmethod
+    def cache_key(cls, asset):
+        return f"signature_image:{asset.id}:{cls.get_version(asset)}"
+
+    @classmethod
+    def get_image(cls, asset):
+        key = cls.cache_key(asset)
+        with cls._lock:
+            image = cls._images.get(key)
+            if image is not None:
+                cls._images.move_to_end(key)
+                return image
+
+        image_data = cache.get(key)
+        if image_data is None:
+            image_data = cls.read_image_data(asset)
+            if len(image_data) <= settings.SIGNATURE_IMAGE_CACHE_MAX_BYTES:
+                cache.set(key, image_data, timeout=settings.SIGNATURE_IMAGE_CACHE_TIMEOUT)
+
+        image = Image.open(io.BytesIO(image_data))
+        image.load()
+
+        with cls._lock:
+            cls._images[key] = image
+            cls._images.move_to_end(key)
+            while len(cls._images) > settings.SIGNATURE_IMAGE_CACHE_MAX_ENTRIES:
+                cls._images.popitem(last=False)
+        return image
+
+    @staticmethod
+    def read_image_data(asset):
+        logger.info(f"Signature image cache miss for asset {asset.id}")
+        with asset.file.open("rb") as image_file:
+            return image_file.read()
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._images.clear()
+
+
+class SignatureAppearanceCache:
+    """
+    Pre-built signature appearances, per signature image version.
+
+    An appearance is the image XObject of a signature stamp in plain values:
+    the size, the colour space and the Flate compressed pixel data, with the
+    alpha channel as a soft mask. Decoding, conversion and compression happen
+    once per image version instead of on every signature, the signing only
+    lays the stamp out in its field. Cached on the same two levels as
+    SignatureImageCache.
+    """
+    _appearances = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def cache_key(asset):
+        return f"signature_appearance:{asset.id}:{SignatureImageCache.get_version(asset)}"
+
+    @classmethod
+    def get_appearance(cls, asset):
+        key = cls.cache_key(asset)
+        with cls._lock:
+            appearance = cls._appearances.get(key)
+            if appearance is not None:
+                cls._appearances.move_to_end(key)
+                return appearance
+
+        appearance = cache.get(key)
+        if appearance is None:
+            appearance = cls.build_appearance(SignatureImageCache.get_image(asset))
+            if cls.get_size(appearance) <= settings.SIGNATURE_IMAGE_CACHE_MAX_BYTES:
+                cache.set(key, appearance, timeout=settings.SIGNATURE_IMAGE_CACHE_TIMEOUT)
+
+        with cls._lock:
+            cls._appearances[key] = appearance
+            cls._appearances.move_to_end(key)
+            while len(cls._appearances) > settings.SIGNATURE_IMAGE_CACHE_MAX_ENTRIES:
+                cls._appearances.popitem(last=False)
+        return appearance
+
+    @classmethod
+    def build_appearance(cls, image):
+        """Encode ``image`` the way pyhanko embeds a Pillow image, see pyhanko.pdf_utils.images.pil_image."""
+        if image.mode not in ("RGB", "RGBA", "P", "PA", "L", "LA"):
+            image = image.convert("RGBA")
+        smask = None
+        if image.mode.endswith("A"):
+            smask = cls.build_appearance(image.split()[-1])
+            image = image.convert(image.mode[:-1])
+        if image.mode == "P" and image.palette.mode != "RGB":
+            image = image.convert("RGB")
+
+        if image.mode == "P":
+            palette = bytes(image.palette.palette)
+            color_space = ["Indexed", len(palette) // 3 - 1, palette]
+        else:
+            color_space = "DeviceGray" if image.mode == "L" else "DeviceRGB"
+        return {
+            "width": image.width,
+            "height": image.height,
+            "color_space": color_space,
+            "data": zlib.compress(image.tobytes()),
+            "smask": smask,
+        }
+
+    @classmethod
+    def get_size(cls, appearance):
+        return len(appearance["data"]) + (cls.get_size(appearance["smask"]) if appearance["smask"] else 0)
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls._appearances.clear()
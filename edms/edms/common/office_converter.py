@@ -0,0 +1,109 @@
+import logging
+import os
+import signal
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from edms.common.pdf_pool import PdfJobError
+
+logger = logging.getLogger(__name__)
+
+CONVERSION_POLL_INTERVAL = 0.2
+
+OFFICE_MIME_TYPES = {
+    "application/msword": ".doc",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document": ".docx",
+    "application/vnd.ms-excel": ".xls",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet": ".xlsx",
+    "application/vnd.ms-powerpoint": ".ppt",
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation": ".pptx",
+}
+
+
+def is_office_file(mime_type):
+    return mime_type in OFFICE_MIME_TYPES
+
+
+def get_session_rss(session_id):
+    """Return the resident memory, in bytes, of every process of ``session_id``."""
+    rss_pages = 0
+    for stat_path in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            # The fields after the command name, starting at the process state
+            fields = stat_path.read_text().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[3]) == session_id:
+            rss_pages += int(fields[21])
+    return rss_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def convert_to_pdf(file_data, mime_type, soffice_binary, timeout, max_rss):
+    """
+    Convert an Office document to PDF with headless LibreOffice.
+
+    LibreOffice runs in its own session, not in a PdfRenderPool worker: the
+    pool only measures the memory of its workers, not of the processes they
+    start, and a conversion would hold a worker for up to ``timeout``. The
+    session as a whole is killed once it runs for ``timeout`` seconds or its
+    resident memory grows past ``max_rss`` bytes, and once the conversion is
+    done, so no stray process outlives it. Every conversion gets its own LibreOffice profile
+    directory, so concurrent conversions do not lock each other out.
+    """
+    with tempfile.TemporaryDirectory(prefix="edms-office-") as work_dir:
+        work_dir = Path(work_dir)
+        input_path = work_dir / f"input{OFFICE_MIME_TYPES[mime_type]}"
+        input_path.write_bytes(file_data)
+        output_dir = work_dir / "output"
+        with open(work_dir / "stderr.log", "wb") as stderr:
+            try:
+                process = subprocess.Popen(
+                    [
+                        soffice_binary,
+                        "--headless",
+                        "--norestore",
+                        "--nolockcheck",
+                        f"-env:UserInstallation={(work_dir / 'profile').as_uri()}",
+                        "--convert-to",
+                        "pdf",
+                        "--outdir",
+                        str(output_dir),
+                        str(input_path),
+                    ],
+                    stdout=subprocess.DEVNULL,
+                    stderr=stderr,
+                    env={**os.environ, "HOME": str(work_dir)},
+                    start_new_session=True,
+                )
+            except OSError as e:
+                logger.error("Error: %s", e)
+                raise PdfJobError("The document could not be converted to PDF.") from e
+
+            deadline = time.monotonic() + timeout
+            try:
+                while process.poll() is None:
+                    if time.monotonic() > deadline:
+                        raise PdfJobError(f"The document conversion exceeded {timeout} seconds.")
+                    if get_session_rss(process.pid) > max_rss:
+                        raise PdfJobError("The document conversion exceeded its memory limit.")
+                    time.sleep(CONVERSION_POLL_INTERVAL)
+            finally:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                process.wait()
+
+        if process.returncode:
+            logger.error(
+                f"Document conversion exited with {process.returncode}: "
+                f"{(work_dir / 'stderr.log').read_text(errors='replace')[-1000:]}"
+            )
+            raise PdfJobError("The document could not be converted to PDF.")
+
+        output_path = output_dir / "input.pdf"
+        if not output_path.exists():
+            raise PdfJobError("The document could not be converted to PDF.")
+        return output_path.read_bytes()
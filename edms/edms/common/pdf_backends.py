@@ -0,0 +1,146 @@
+import io
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from PyPDF2 import PdfReader, PdfWriter
+
+
+class BasePdfBackend:
+    """
+    The subset of PDF operations used by pdf_helper.
+
+    Documents and overlays returned by a backend are opaque handles, they are
+    only passed back to the same backend.
+    """
+    name = None
+
+    def open(self, input_pdf):
+        raise NotImplementedError
+
+    def page_count(self, document):
+        raise NotImplementedError
+
+    def page_size(self, document, page_num):
+        raise NotImplementedError
+
+    def iter_annotations(self, document):
+        """Yield ``(page_num, contents, rect)`` for every page annotation."""
+        raise NotImplementedError
+
+    def load_overlay(self, packet):
+        raise NotImplementedError
+
+    def merge_overlay(self, document, page_num, overlay):
+        raise NotImplementedError
+
+    def write(self, document):
+        raise NotImplementedError
+
+
+class PyPDF2Backend(BasePdfBackend):
+    name = "pypdf2"
+
+    def open(self, input_pdf):
+        return PdfReader(input_pdf)
+
+    def page_count(self, document):
+        return len(document.pages)
+
+    def page_size(self, document, page_num):
+        mediabox = document.pages[page_num].mediabox
+        return float(mediabox.upper_right[0]), float(mediabox.upper_right[1])
+
+    def iter_annotations(self, document):
+        for page_num, page in enumerate(document.pages):
+            if "/Annots" in page:
+                for annot in page["/Annots"]:
+                    annot = annot.get_object()
+                    yield page_num, annot.get("/Contents"), annot.get("/Rect")
+
+    def load_overlay(self, packet):
+        return PdfReader(packet)
+
+    def merge_overlay(self, document, page_num, overlay):
+        document.pages[page_num].merge_page(overlay.pages[0])
+
+    def write(self, document):
+        writer = PdfWriter()
+        for page in document.pages:
+            writer.add_page(page)
+        output_pdf = io.BytesIO()
+        writer.write(output_pdf)
+        output_pdf.seek(0)
+        return output_pdf
+
+
+class PikePdfBackend(BasePdfBackend):
+    """
+    Backend on top of pikepdf (qpdf), the parsing and writing is done in C++.
+    """
+    name = "pikepdf"
+
+    def __init__(self):
+        try:
+            import pikepdf
+        except ImportError as e:
+            raise ImproperlyConfigured("PDF_BACKEND 'pikepdf' requires the pikepdf package.") from e
+        self.pikepdf = pikepdf
+
+    def open(self, input_pdf):
+        return self.pikepdf.Pdf.open(input_pdf)
+
+    def page_count(self, document):
+        return len(document.pages)
+
+    def page_size(self, document, page_num):
+        mediabox = document.pages[page_num].mediabox
+        return float(mediabox[2]), float(mediabox[3])
+
+    def iter_annotations(self, document):
+        for page_num, page in enumerate(document.pages):
+            annots = page.obj.get("/Annots")
+            if annots is None:
+                continue
+            for annot in annots:
+                contents = annot.get("/Contents")
+                rect = annot.get("/Rect")
+                yield (
+                    page_num,
+                    str(contents) if contents is not None else None,
+                    [float(coord) for coord in rect] if rect is not None else None,
+                )
+
+    def load_overlay(self, packet):
+        return self.pikepdf.Pdf.open(packet)
+
+    def merge_overlay(self, document, page_num, overlay):
+        overlay_page = overlay.pages[0]
+        document.pages[page_num].add_overlay(
+            overlay_page,
+            self.pikepdf.Rectangle(overlay_page.mediabox),
+        )
+
+    def write(self, document):
+        output_pdf = io.BytesIO()
+        # Copy existing streams as they are instead of decoding and
+        # recompressing them, that dominates the cost on scanned documents.
+        document.save(
+            output_pdf,
+            compress_streams=False,
+            stream_decode_level=self.pikepdf.StreamDecodeLevel.none,
+        )
+        output_pdf.seek(0)
+        return output_pdf
+
+
+PDF_BACKENDS = {
+    PyPDF2Backend.name: PyPDF2Backend,
+    PikePdfBackend.name: PikePdfBackend,
+}
+
+
+def get_pdf_backend(name=None):
+    name = name or settings.PDF_BACKEND
+    if name not in PDF_BACKENDS:
+        raise ImproperlyConfigured(f"Unknown PDF_BACKEND '{name}'.")
+    return PDF_BACKENDS[name]()
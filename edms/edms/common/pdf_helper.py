@@ -1,7 +1,9 @@
 import math
-import os
+from collections import Counter
+from pathlib import Path
 
-from PyPDF2 import PdfReader, PdfWriter
+import pypdfium2
+from PyPDF2 import PdfReader
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.colors import Color
@@ -11,21 +13,138 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.utils import simpleSplit
 import io
 from django.conf import settings
+from pyhanko.pdf_utils import generic
+from pyhanko.pdf_utils.generic import pdf_name
+from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+from pyhanko.pdf_utils.reader import PdfFileReader
 
+from edms.common.image_cache import SignatureAppearanceCache
+from edms.common.image_cache import SignatureImageCache
+from edms.common.pdf_backends import get_pdf_backend
+from edms.common.pdf_pool import PdfRenderPool
 
-def add_watermark_to_pdf(input_pdf, watermark_text, asset):
+FONT_DIR = Path(__file__).resolve().parent.parent / "static" / "fonts"
+
+
+def add_watermark_to_pdf(input_pdf, watermark_text, asset, backend_name=None):
     from edms.documents.models import Document
-    reader = PdfReader(input_pdf)
+    is_signature_file = asset.file_type == "signature_file"
+    show_unsigned_badge = (
+        is_signature_file and
+        asset.document.document_category == Document.SIGNING_DOCUMENT
+    )
+    output_data = PdfRenderPool.run(
+        render_watermarked_pdf,
+        pdf_data=input_pdf.getvalue(),
+        watermark_text=watermark_text,
+        show_unsigned_badge=show_unsigned_badge,
+        signature_fields=asset.signature_fields if is_signature_file else [],
+        stamp_images=get_signature_stamp_images(asset) if is_signature_file else {},
+        backend_name=backend_name or settings.PDF_BACKEND,
+        incremental=settings.PDF_INCREMENTAL_PREVIEW and has_embedded_signatures(asset),
+    )
+    return io.BytesIO(output_data)
+
+
+def render_watermarked_pdf(
+    pdf_data, watermark_text, show_unsigned_badge, signature_fields, stamp_images, backend_name, incremental
+):
+    backend = get_pdf_backend(backend_name)
+    if signature_fields is None:
+        signature_fields = extract_signature_fields(io.BytesIO(pdf_data), backend=backend)
+    pages_signatures_map = render_signature_stamps(signature_fields, stamp_images)
+
+    if incremental:
+        return add_incremental_overlays(pdf_data, watermark_text, pages_signatures_map).getvalue()
+
+    document = backend.open(io.BytesIO(pdf_data))
+    watermark_pdf = backend.load_overlay(
+        build_watermark_overlay(watermark_text, *backend.page_size(document, 0), show_unsigned_badge)
+    )
+
+    for page_num in range(backend.page_count(document)):
+        backend.merge_overlay(document, page_num, watermark_pdf)
+        pages_signatures = pages_signatures_map.get(page_num, [])
+        for pages_signature in pages_signatures:
+            backend.merge_overlay(document, page_num, backend.load_overlay(pages_signature))
+
+    return backend.write(document).getvalue()
+
+
+def has_embedded_signatures(asset):
+    from edms.documents.models import Document, DocumentSignature
+    return (
+        asset.file_type == "signature_file" and
+        asset.document.document_category in [
+            Document.IN_PROGRESS_SIGNING_DOCUMENT,
+            Document.COMPLETED_SIGNING_DOCUMENT,
+        ] and
+        asset.document.signatures.filter(signature_status=DocumentSignature.SIGNED).exists()
+    )
+
+
+def add_incremental_overlays(pdf_data, watermark_text, pages_signatures_map):
+    """
+    Watermark a signed PDF by appending an incremental update.
+
+    The original revisions are copied through byte for byte, so embedded
+    signatures stay intact. Only the overlay XObjects and the touched page
+    dictionaries are written.
+    """
+    writer = IncrementalPdfFileWriter(io.BytesIO(pdf_data))
+
+    watermark_ref = writer.import_page_as_xobject(
+        PdfFileReader(build_watermark_overlay(watermark_text, *get_incremental_page_size(writer, 0), False))
+    )
+    watermark_stream_ref = writer.add_object(
+        generic.StreamObject(stream_data=b"q /EdmsWatermark Do Q\n")
+    )
+
+    for page_num in range(int(writer.root["/Pages"]["/Count"])):
+        xobjects = {pdf_name("/EdmsWatermark"): watermark_ref}
+        stream_ref = watermark_stream_ref
+        pages_signatures = pages_signatures_map.get(page_num, [])
+        if pages_signatures:
+            stream_data = b"q /EdmsWatermark Do Q\n"
+            for index, packet in enumerate(pages_signatures):
+                xobjects[pdf_name(f"/EdmsStamp{index}")] = writer.import_page_as_xobject(PdfFileReader(packet))
+                stream_data += f"q /EdmsStamp{index} Do Q\n".encode()
+            stream_ref = writer.add_object(generic.StreamObject(stream_data=stream_data))
+        writer.add_stream_to_page(
+            page_num,
+            stream_ref,
+            resources=generic.DictionaryObject({
+                pdf_name("/XObject"): generic.DictionaryObject(xobjects),
+            }),
+        )
+
+    output_pdf = io.BytesIO()
+    writer.write(output_pdf)
+    output_pdf.seek(0)
+    return output_pdf
+
+
+def get_incremental_page_size(writer, page_num):
+    page_obj = writer.find_page_for_modification(page_num)[0].get_object()
+    while "/MediaBox" not in page_obj:
+        page_obj = page_obj["/Parent"]
+    mediabox = page_obj["/MediaBox"]
+    return float(mediabox[2]), float(mediabox[3])
+
 
-    font_dir = os.path.join(settings.BASE_DIR, 'edms', 'static', 'fonts')
-    pdfmetrics.registerFont(TTFont('DejaVu', f'{font_dir}/DejaVuSans.ttf'))
-    pdfmetrics.registerFont(TTFont('DejaVu-Bold', f'{font_dir}/DejaVuSans-Bold.ttf'))
+def register_fonts():
+    pdfmetrics.registerFont(TTFont('DejaVu', f'{FONT_DIR}/DejaVuSans.ttf'))
+    pdfmetrics.registerFont(TTFont('DejaVu-Bold', f'{FONT_DIR}/DejaVuSans-Bold.ttf'))
+
+
+def build_watermark_overlay(watermark_text, page_width, page_height, show_unsigned_badge):
+    register_fonts()
 
     packet = io.BytesIO()
     can = canvas.Canvas(packet, pagesize=letter)
 
     can.setFont("DejaVu", 40)
-    lines = split_text(watermark_text, "DejaVu", 40, get_diagonal(reader.pages[0]))
+    lines = split_text(watermark_text, "DejaVu", 40, get_diagonal(page_width, page_height))
 
     can.setFillColor(Color(0.5, 0.5, 0.5, alpha=0.3))
 
@@ -38,7 +157,7 @@ def add_watermark_to_pdf(input_pdf, watermark_text, asset):
         y_offset -= 40
     can.restoreState()
 
-    if asset.file_type == "signature_file" and asset.document.document_category == Document.SIGNING_DOCUMENT:
+    if show_unsigned_badge:
         rect_x, rect_y, rect_width, rect_height = 100, 300, 300, 100
         can.saveState()
         can.translate(rect_x + rect_width / 2, rect_y + rect_height / 2)
@@ -57,28 +176,10 @@ def add_watermark_to_pdf(input_pdf, watermark_text, asset):
     can.save()
 
     packet.seek(0)
-    watermark_pdf = PdfReader(packet)
-
-    writer = PdfWriter()
-    pages_signatures_map = stamp_signatures_to_pdf(asset, reader.pages)
-
-    for page_num in range(len(reader.pages)):
-        page = reader.pages[page_num]
-        page.merge_page(watermark_pdf.pages[0])
-        pages_signatures = pages_signatures_map.get(page_num, [])
-        for pages_signature in pages_signatures:
-            page.merge_page(pages_signature.pages[0])
-        writer.add_page(page)
-
-    output_pdf = io.BytesIO()
-    writer.write(output_pdf)
-    output_pdf.seek(0)
-    return output_pdf
+    return packet
 
 
-def get_diagonal(first_page):
-    width = float(first_page.mediabox.upper_right[0])
-    height = float(first_page.mediabox.upper_right[1])
+def get_diagonal(width, height):
     return math.sqrt(width**2 + height**2) * 0.9
 
 
@@ -95,52 +196,100 @@ def is_positive_integer(string):
     return string.isdigit() and int(string) > 0
 
 
-def stamp_signatures_to_pdf(asset, pages):
-    from edms.documents.models import Document, DocumentSignature
-    pages_signatures_map = {}
+def stamp_signatures_to_pdf(asset, document, backend=None):
+    backend = backend or get_pdf_backend()
     if asset.file_type != "signature_file":
-        return pages_signatures_map
-    document_signatures_map = get_signature_field_coordinates(pages)
-    for page_num, signers_dict in document_signatures_map.items():
-        page = pages[page_num]
-        page_width = float(page.mediabox.upper_right[0])
-        page_height = float(page.mediabox.upper_right[1])
-
-        for signer_position, coordinates in signers_dict.items():
-            document_signature = asset.document.signatures.filter(
-                order=signer_position
-            ).first()
-            if not document_signature:
-                continue
-
-            if asset.document.document_category in [
-                Document.SIGNING_DOCUMENT,
-            ] or (
-                asset.document.document_category in [
-                    Document.IN_PROGRESS_SIGNING_DOCUMENT,
-                    Document.COMPLETED_SIGNING_DOCUMENT,
-                ] and
-                document_signature.signature_status == DocumentSignature.SIGNED
-            ):
+        return {}
+    signature_fields = asset.signature_fields
+    if signature_fields is None:
+        signature_fields = extract_signature_fields(document=document, backend=backend)
+
+    pages_signatures_map = render_signature_stamps(signature_fields, get_signature_stamp_images(asset))
+    return {
+        page_num: [backend.load_overlay(packet) for packet in packets]
+        for page_num, packets in pages_signatures_map.items()
+    }
+
+
+def get_signature_stamp_images(asset):
+    """
+    Return the stamp image of every signer who should appear on ``asset``.
+
+    Keys are (order, stage_index): signers sharing an order form a parallel
+    stage, see assign_signature_fields. Signers whose stamp is not shown map
+    to None, so the keys also give the size of every stage.
+    """
+    from edms.documents.models import Document, DocumentSignature
+    stamp_images = {}
+    signer_images = {}
+    stage_sizes = {}
+    for document_signature in asset.document.signatures.select_related("signer").order_by("order", "id"):
+        stage_index = stage_sizes.get(document_signature.order, 0)
+        stage_sizes[document_signature.order] = stage_index + 1
+
+        if asset.document.document_category in [
+            Document.SIGNING_DOCUMENT,
+        ] or (
+            asset.document.document_category in [
+                Document.IN_PROGRESS_SIGNING_DOCUMENT,
+                Document.COMPLETED_SIGNING_DOCUMENT,
+            ] and
+            document_signature.signature_status == DocumentSignature.SIGNED
+        ):
+            if document_signature.signer_id not in signer_images:
                 user_signature = document_signature.signer.user_signature_entries.filter(is_default=True).first()
-                if user_signature:
-                    stamp_image = user_signature.signature_image.file.url
-                    for coords in coordinates:
-                        coords = convert_float_objects_to_floats(coords)
-                        if page_num not in pages_signatures_map:
-                            pages_signatures_map[page_num] = []
-                        pages_signatures_map[page_num].append(
-                            add_image_stamp_to_pdf(
-                                stamp_image=stamp_image,
-                                coords=coords,
-                                page_width=page_width,
-                                page_height=page_height
-                            )
-                        )
+                signer_images[document_signature.signer_id] = (
+                    SignatureImageCache.get_image(user_signature.signature_image) if user_signature else None
+                )
+            stamp_images[(document_signature.order, stage_index)] = signer_images[document_signature.signer_id]
+        else:
+            stamp_images[(document_signature.order, stage_index)] = None
+    return stamp_images
+
+
+def assign_signature_fields(signature_fields, stage_sizes):
+    """
+    Yield every signature field with the stage index of the signer it belongs to.
+
+    Every field of an order belongs to the signers of that order: the k-th
+    signer of a stage takes the k-th field and the last one keeps the extra
+    fields, as a single signer always kept all of them. ``stage_sizes`` maps
+    an order to its number of signers.
+    """
+    field_counts = {}
+    for signature_field in signature_fields:
+        order = signature_field["order"]
+        field_index = field_counts.get(order, 0)
+        field_counts[order] = field_index + 1
+        yield signature_field, min(field_index, stage_sizes.get(order, 1) - 1)
+
+
+def render_signature_stamps(signature_fields, stamp_images):
+    pages_signatures_map = {}
+    stage_sizes = Counter(order for order, _ in stamp_images)
+    for signature_field, stage_index in assign_signature_fields(signature_fields, stage_sizes):
+        page_num = signature_field["page"]
+        stamp_image = stamp_images.get((signature_field["order"], stage_index))
+        if stamp_image:
+            if page_num not in pages_signatures_map:
+                pages_signatures_map[page_num] = []
+            pages_signatures_map[page_num].append(
+                render_image_stamp(
+                    stamp_image=stamp_image,
+                    coords=signature_field["rect"],
+                    page_width=signature_field["page_width"],
+                    page_height=signature_field["page_height"],
+                )
+            )
     return pages_signatures_map
 
 
-def add_image_stamp_to_pdf(stamp_image, coords, page_width, page_height):
+def add_image_stamp_to_pdf(stamp_image, coords, page_width, page_height, backend=None):
+    backend = backend or get_pdf_backend()
+    return backend.load_overlay(render_image_stamp(stamp_image, coords, page_width, page_height))
+
+
+def render_image_stamp(stamp_image, coords, page_width, page_height):
     packet = io.BytesIO()
     can = canvas.Canvas(packet, pagesize=(page_width, page_height))
 
@@ -150,7 +299,7 @@ def add_image_stamp_to_pdf(stamp_image, coords, page_width, page_height):
 
     can.save()
     packet.seek(0)
-    return PdfReader(packet)
+    return packet
 
 
 def get_signature_field_coordinates(pages, input_pdf=None):
@@ -171,6 +320,55 @@ def get_signature_field_coordinates(pages, input_pdf=None):
     return coordinates_dict
 
 
+def extract_signature_fields(input_pdf=None, document=None, backend=None):
+    backend = backend or get_pdf_backend()
+    if input_pdf:
+        document = backend.open(input_pdf)
+    signature_fields = []
+    page_sizes = {}
+    for page_num, signer_num, rect in backend.iter_annotations(document):
+        if signer_num and is_positive_integer(signer_num):
+            if page_num not in page_sizes:
+                page_sizes[page_num] = backend.page_size(document, page_num)
+            page_width, page_height = page_sizes[page_num]
+            signature_fields.append({
+                "page": page_num,
+                "order": int(signer_num),
+                "rect": convert_float_objects_to_floats(rect),
+                "page_width": page_width,
+                "page_height": page_height,
+            })
+    return signature_fields
+
+
+def read_signature_fields(pdf_data, backend_name):
+    return extract_signature_fields(io.BytesIO(pdf_data), backend=get_pdf_backend(backend_name))
+
+
+def get_signature_fields(input_pdf):
+    pdf_data = input_pdf.read()
+    input_pdf.seek(0)
+    return PdfRenderPool.run(read_signature_fields, pdf_data, settings.PDF_BACKEND)
+
+
+def get_default_signature_image(user):
+    user_signature = user.user_signature_entries.filter(is_default=True).first()
+    return SignatureImageCache.get_image(user_signature.signature_image) if user_signature else None
+
+
+def get_default_signature_appearance(user):
+    user_signature = user.user_signature_entries.filter(is_default=True).first()
+    return SignatureAppearanceCache.get_appearance(user_signature.signature_image) if user_signature else None
+
+
+def find_signature_field(signature_fields, order, stage_index=0, stage_size=1):
+    found_field = None
+    for signature_field, field_stage_index in assign_signature_fields(signature_fields, {int(order): stage_size}):
+        if signature_field["order"] == int(order) and field_stage_index == stage_index:
+            found_field = signature_field
+    return found_field
+
+
 def get_signature_box(rect, page_width, page_height, width_ratio, height_ratio):
     x1, y1, x2, y2 = rect
 
@@ -188,26 +386,67 @@ def get_signature_box(rect, page_width, page_height, width_ratio, height_ratio):
     return new_x1, new_y1, new_x2, new_y2
 
 
-def get_positions_signature(input_pdf, document_signature):
-    reader = PdfReader(input_pdf)
-    pages = reader.pages
-    sigpage = None
-    coords = None
-    user_signature = document_signature.signer.user_signature_entries.filter(is_default=True).first()
-    signature_img = user_signature.signature_image.file.url
-    for page_num, page in enumerate(pages):
-        if "/Annots" in page:
-            for annot in page["/Annots"]:
-                if str(document_signature.order) == annot.get_object().get("/Contents"):
-                    sigpage = page_num
-                    coords = convert_float_objects_to_floats(annot.get_object().get("/Rect"))
-                    break
-
-    if sigpage and coords and signature_img:
-        page = pages[sigpage]
-        page_width = float(page.mediabox.upper_right[0])
-        page_height = float(page.mediabox.upper_right[1])
-        signature_box = get_signature_box(coords, page_width, page_height, 0.2, 0.1)
-        return sigpage, signature_box, signature_img
+def get_positions_signature(input_pdf, document_signature, signature_fields=None, signature_img=None, stage_index=0, stage_size=1):
+    if signature_fields is None:
+        signature_fields = get_signature_fields(input_pdf)
+    if signature_img is None:
+        signature_img = get_default_signature_image(document_signature.signer)
+    signature_field = find_signature_field(signature_fields, document_signature.order, stage_index, stage_size)
+
+    if signature_field and signature_img:
+        signature_box = get_signature_box(
+            signature_field["rect"],
+            signature_field["page_width"],
+            signature_field["page_height"],
+            0.2,
+            0.1
+        )
+        return signature_field["page"], signature_box, signature_img
     else:
         raise ValueError("Not found sign")
+
+
+def render_thumbnails(pdf_data, pages, width, quality):
+    """Rasterize the first ``pages`` pages to WebP images ``width`` pixels wide."""
+    thumbnails = []
+    document = pypdfium2.PdfDocument(pdf_data)
+    try:
+        for page_num in range(min(pages, len(document))):
+            page = document[page_num]
+            image = page.render(scale=width / page.get_width()).to_pil()
+            output = io.BytesIO()
+            image.save(output, format="WEBP", quality=quality)
+            thumbnails.append(output.getvalue())
+            page.close()
+    finally:
+        document.close()
+    return thumbnails
+
+
+def extract_text(pdf_data, max_chars):
+    """
+    Extract the text of a PDF page by page.
+
+    Stops once ``max_chars`` characters are collected, returns the text, the
+    number of pages read and whether the text was cut short.
+    """
+    parts = []
+    length = 0
+    truncated = False
+    document = pypdfium2.PdfDocument(pdf_data)
+    try:
+        for page_num in range(len(document)):
+            page = document[page_num]
+            text_page = page.get_textpage()
+            text = text_page.get_text_bounded()
+            text_page.close()
+            page.close()
+            if length + len(text) > max_chars:
+                parts.append(text[:max_chars - length])
+                truncated = True
+                break
+            parts.append(text)
+            length += len(text)
+    finally:
+        document.close()
+    return "\n".join(parts), len(parts), truncated
@@ -0,0 +1,100 @@
+import io
+import logging
+
+import pikepdf
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+DOWNSAMPLE_COLORSPACES = {"/DeviceGray": "L", "/DeviceRGB": "RGB"}
+
+
+def optimize_pdf(pdf_data, max_dpi, jpeg_quality):
+    """
+    Recompress a PDF for storage and web viewing.
+
+    Runs as a PdfRenderPool job. Embedded 8-bit gray and RGB images above
+    ``max_dpi`` are downsampled and stored as JPEG, the file is written with
+    object streams and linearized. An image is assumed to cover at most the
+    page it is drawn on, so its real resolution is never pushed below the
+    budget. Returns None for a digitally signed PDF, rewriting it would
+    invalidate its signatures.
+    """
+    with pikepdf.open(io.BytesIO(pdf_data)) as pdf:
+        if has_digital_signatures(pdf):
+            return None
+        seen = set()
+        for page in pdf.pages:
+            mediabox = page.mediabox
+            page_width = float(mediabox[2]) - float(mediabox[0])
+            page_height = float(mediabox[3]) - float(mediabox[1])
+            for image in page.images.values():
+                if image.objgen in seen:
+                    continue
+                seen.add(image.objgen)
+                try:
+                    downsample_image(image, page_width, page_height, max_dpi, jpeg_quality)
+                except Exception as e:
+                    logger.error("Error: %s", e)
+
+        output_pdf = io.BytesIO()
+        pdf.save(
+            output_pdf,
+            linearize=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate,
+            compress_streams=True,
+        )
+    return output_pdf.getvalue()
+
+
+def has_digital_signatures(pdf):
+    """Whether the form of ``pdf`` declares signatures or has a signature field."""
+    acroform = pdf.Root.get("/AcroForm")
+    if acroform is None:
+        return False
+    if int(acroform.get("/SigFlags", 0)):
+        return True
+
+    fields = list(acroform.get("/Fields", []))
+    seen = set()
+    while fields:
+        field = fields.pop()
+        if field.objgen in seen:
+            continue
+        seen.add(field.objgen)
+        if field.get("/FT") == pikepdf.Name.Sig:
+            return True
+        fields.extend(field.get("/Kids", []))
+    return False
+
+
+def downsample_image(image, page_width, page_height, max_dpi, jpeg_quality):
+    if (
+        image.get("/SMask") is not None or
+        image.get("/ImageMask", False) or
+        image.get("/BitsPerComponent") != 8 or
+        str(image.get("/ColorSpace")) not in DOWNSAMPLE_COLORSPACES
+    ):
+        return
+
+    width, height = int(image.Width), int(image.Height)
+    dpi = min(width * 72 / page_width, height * 72 / page_height)
+    if dpi <= max_dpi:
+        return
+
+    scale = max_dpi / dpi
+    pil_image = pikepdf.PdfImage(image).as_pil_image().convert(DOWNSAMPLE_COLORSPACES[str(image.ColorSpace)])
+    pil_image = pil_image.resize(
+        (max(1, round(width * scale)), max(1, round(height * scale))),
+        Image.LANCZOS,
+    )
+    output = io.BytesIO()
+    pil_image.save(output, format="JPEG", quality=jpeg_quality, optimize=True)
+    if output.tell() >= len(image.read_raw_bytes()):
+        return
+
+    image.write(output.getvalue(), filter=pikepdf.Name.DCTDecode)
+    image.Width = pil_image.width
+    image.Height = pil_image.height
+    if "/DecodeParms" in image:
+        del image.DecodeParms
@@ -0,0 +1,164 @@
+import logging
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+JOB_CHECK_INTERVAL = 0.5
+
+
+class PdfJobError(Exception):
+    pass
+
+
+class PdfJobTimeout(PdfJobError):
+    pass
+
+
+class PdfPoolBusy(PdfJobError):
+    pass
+
+
+def get_rss():
+    """Return the resident memory of the current process in bytes."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def _run_job(func, args, kwargs, timeout, max_memory):
+    deadline = time.monotonic() + timeout
+
+    def on_tick(signum, frame):
+        if time.monotonic() >= deadline:
+            raise PdfJobTimeout(f"The PDF job exceeded {timeout} seconds.")
+        if max_memory and get_rss() > max_memory:
+            raise PdfJobError("The PDF job exceeded its memory limit.")
+
+    signal.signal(signal.SIGALRM, on_tick)
+    signal.setitimer(signal.ITIMER_REAL, JOB_CHECK_INTERVAL, JOB_CHECK_INTERVAL)
+    try:
+        result = func(*args, **kwargs)
+    except MemoryError as e:
+        raise PdfJobError("The PDF job exceeded its memory limit.") from e
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    return result, get_rss()
+
+
+class PdfRenderPool:
+    """
+    Bounded process pool for CPU heavy PDF work.
+
+    Jobs are module level functions taking and returning picklable values,
+    workers are spawned (not forked) so they never share database or Redis
+    connections with the web process. Each job gets a wall-clock limit,
+    enforced inside the worker and again by the caller. Memory is bounded by
+    resident size rather than address space, which pikepdf and the image
+    libraries reserve far beyond what they touch: a job is stopped once its
+    worker grows past ``PDF_POOL_MAX_MEMORY``, and workers still holding more
+    than ``PDF_POOL_RECYCLE_MEMORY`` after a job are replaced, as are all
+    workers after ``PDF_POOL_MAX_TASKS_PER_CHILD`` jobs. At most
+    ``PDF_POOL_MAX_WORKERS`` jobs run and ``PDF_POOL_MAX_QUEUE`` wait, further
+    callers fail with ``PdfPoolBusy``.
+    """
+    _executor = None
+    _queue_slots = None
+    _worker_slots = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls):
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = futures.ProcessPoolExecutor(
+                    max_workers=settings.PDF_POOL_MAX_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    max_tasks_per_child=settings.PDF_POOL_MAX_TASKS_PER_CHILD,
+                )
+            if cls._queue_slots is None:
+                cls._queue_slots = threading.BoundedSemaphore(
+                    settings.PDF_POOL_MAX_WORKERS + settings.PDF_POOL_MAX_QUEUE
+                )
+                cls._worker_slots = threading.BoundedSemaphore(settings.PDF_POOL_MAX_WORKERS)
+            return cls._executor
+
+    @classmethod
+    def reset(cls, executor, cancel_futures=True, terminate=False):
+        """
+        Replace ``executor`` with a fresh pool for the next jobs.
+
+        Pending jobs of ``executor`` are cancelled unless ``cancel_futures``
+        is unset, running ones finish or hit their limit inside the worker.
+        With ``terminate`` set its workers are killed instead, a job stuck in
+        C code never checks its limit and would hold its worker forever.
+        """
+        with cls._lock:
+            if cls._executor is executor:
+                cls._executor = None
+        # Read before the shutdown, which drops the reference of the executor to its workers
+        processes = list((executor._processes or {}).values()) if terminate else []
+        executor.shutdown(wait=False, cancel_futures=cancel_futures)
+        for process in processes:
+            process.terminate()
+        cls.get_executor()
+
+    @classmethod
+    def shutdown(cls):
+        """Stop the workers of the pool, the next job starts a new one."""
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    @classmethod
+    def run(cls, func, *args, timeout=None, wait=False, **kwargs):
+        """
+        Run ``func`` in the pool and return its result.
+
+        Fails at once with PdfPoolBusy when the queue is full, unless ``wait``
+        is set, background work then waits PDF_POOL_QUEUE_TIMEOUT seconds for
+        a place in the queue like it does for a worker.
+        """
+        if not settings.PDF_POOL_ENABLED:
+            return func(*args, **kwargs)
+
+        timeout = timeout or settings.PDF_POOL_JOB_TIMEOUT
+        cls.get_executor()
+        if wait:
+            queued = cls._queue_slots.acquire(timeout=settings.PDF_POOL_QUEUE_TIMEOUT)
+        else:
+            queued = cls._queue_slots.acquire(blocking=False)
+        if not queued:
+            raise PdfPoolBusy("The PDF service is busy, please try again later.")
+        try:
+            if not cls._worker_slots.acquire(timeout=settings.PDF_POOL_QUEUE_TIMEOUT):
+                raise PdfPoolBusy("The PDF service is busy, please try again later.")
+            executor = cls.get_executor()
+            try:
+                future = executor.submit(_run_job, func, args, kwargs, timeout, settings.PDF_POOL_MAX_MEMORY)
+                result, rss = future.result(timeout=timeout + 5)
+            except futures.TimeoutError as e:
+                logger.error(f"PDF job {func.__name__} did not finish, restarting the pool")
+                cls.reset(executor, terminate=True)
+                raise PdfJobTimeout(f"The PDF job exceeded {timeout} seconds.") from e
+            except BrokenProcessPool as e:
+                logger.error(f"PDF worker died while running {func.__name__}, restarting the pool")
+                cls.reset(executor)
+                raise PdfJobError("The PDF worker stopped unexpectedly.") from e
+            finally:
+                cls._worker_slots.release()
+        finally:
+            cls._queue_slots.release()
+
+        if rss > settings.PDF_POOL_RECYCLE_MEMORY:
+            # Freed memory is rarely given back to the system, running jobs finish on the old workers
+            logger.warning(f"PDF worker holds {rss} bytes after {func.__name__}, recycling the pool")
+            cls.reset(executor, cancel_futures=False)
+        return result
@@ -44,7 +44,9 @@ class S3FileManager:
         try:
             # Upload the file
             if is_object:
-                s3_client.upload_fileobj(io.BytesIO(data), bucket_name, s3_object_name)
+                # File objects are streamed as they are, bytes are wrapped without a copy
+                fileobj = data if hasattr(data, "read") else io.BytesIO(data)
+                s3_client.upload_fileobj(fileobj, bucket_name, s3_object_name)
             else:
                 s3_client.upload_file(data, bucket_name, s3_object_name)
             logger.info(f"File uploaded successfully to {bucket_name}/{s3_object_name}")
@@ -118,6 +120,14 @@ class S3FileManager:
         except Exception as e:
             raise Exception(f"Error downloading file from S3: {str(e)}")
 
+    @staticmethod
+    def get_object_data(bucket_name, file_key, s3_client):
+        """Read an object into a single bytes buffer, sized from the response."""
+        try:
+            return s3_client.get_object(Bucket=bucket_name, Key=file_key)["Body"].read()
+        except Exception as e:
+            raise Exception(f"Error downloading file from S3: {str(e)}")
+
     @staticmethod
     def download_pdf_from_s3(bucket_name, file_key, s3_client):
         try:
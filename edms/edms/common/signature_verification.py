@@ -0,0 +1,51 @@
+import logging
+from io import BytesIO
+
+from asn1crypto import x509 as asn1_x509
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.validation import async_validate_pdf_signature
+from pyhanko_certvalidator import ValidationContext
+
+from edms.common.event_loop import run_sync
+
+logger = logging.getLogger(__name__)
+
+
+def verify_signatures_job(pdf_data, trust_roots, allow_fetching):
+    """
+    Process pool entry point for SignatureVerifier.verify.
+
+    Validates every embedded signature of ``pdf_data`` against the DER encoded
+    ``trust_roots`` and returns one plain dict per signature. Kept free of
+    Django imports, the pool workers never set up the apps.
+    """
+    validation_context = ValidationContext(
+        trust_roots=[asn1_x509.Certificate.load(der) for der in trust_roots],
+        allow_fetching=allow_fetching,
+    )
+    signatures = []
+    for embedded_signature in PdfFileReader(BytesIO(pdf_data)).embedded_signatures:
+        try:
+            status = run_sync(async_validate_pdf_signature(embedded_signature, validation_context))
+        except Exception as e:
+            logger.error("Error: %s", e)
+            signatures.append({
+                "field_name": embedded_signature.field_name,
+                "bottom_line": False,
+                "error": str(e),
+            })
+            continue
+        signatures.append({
+            "field_name": embedded_signature.field_name,
+            "signer": status.signing_cert.subject.human_friendly,
+            "signing_time": status.signer_reported_dt.isoformat() if status.signer_reported_dt else None,
+            "intact": status.intact,
+            "valid": status.valid,
+            "trusted": status.trusted,
+            "revoked": status.revoked,
+            "coverage": status.coverage.name if status.coverage else None,
+            "modification_level": status.modification_level.name if status.modification_level else None,
+            "bottom_line": status.bottom_line,
+            "summary": status.summary(),
+        })
+    return signatures
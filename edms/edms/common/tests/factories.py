@@ -0,0 +1,75 @@
+import datetime
+import io
+
+from asn1crypto import keys
+from asn1crypto import x509 as asn1_x509
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+from pyhanko.sign import signers
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+
+def make_pdf(pages=1, signature_fields=(), text="Page {page}"):
+    """
+    Build a small PDF in memory.
+
+    ``signature_fields`` are (page, order) pairs, each placeholder is a text
+    annotation whose contents is the signer order, like uploaded signature
+    files. Every page shows ``text`` formatted with its 1-based number.
+    """
+    page_width, page_height = A4
+    packet = io.BytesIO()
+    can = canvas.Canvas(packet, pagesize=A4)
+    for page_num in range(pages):
+        can.setFont("Helvetica", 12)
+        can.drawString(50, page_height - 60, text.format(page=page_num + 1))
+        for index, (field_page, order) in enumerate(signature_fields):
+            if field_page == page_num:
+                x = 40 + index * 120
+                can.textAnnotation(str(order), Rect=(x, 80, x + 100, 120), relative=0)
+        can.showPage()
+    can.save()
+    return packet.getvalue()
+
+
+def make_signer():
+    """A pyhanko signer with a self-signed certificate."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "EDMS Test Signer")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return signers.SimpleSigner(
+        signing_cert=asn1_x509.Certificate.load(certificate.public_bytes(serialization.Encoding.DER)),
+        signing_key=keys.PrivateKeyInfo.load(key.private_bytes(
+            serialization.Encoding.DER,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )),
+        cert_registry=None,
+    )
+
+
+def sign_pdf(pdf_data, field_name="Signature1"):
+    """Sign ``pdf_data`` in an incremental update, like a MySign signature."""
+    output = io.BytesIO()
+    signers.sign_pdf(
+        IncrementalPdfFileWriter(io.BytesIO(pdf_data)),
+        signers.PdfSignatureMetadata(field_name=field_name),
+        signer=make_signer(),
+        output=output,
+    )
+    return output.getvalue()
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from edms.common.asset_cache import LocalAssetCache
+
+
+@pytest.fixture()
+def asset_cache(monkeypatch, settings, tmp_path):
+    """An empty cache of 100 bytes, counting the scans of its directory."""
+    settings.ASSET_CACHE_DIR = str(tmp_path)
+    settings.ASSET_CACHE_MAX_BYTES = 100
+    monkeypatch.setattr(LocalAssetCache, "_sizes", {})
+    scans = []
+    scan = LocalAssetCache.scan
+    monkeypatch.setattr(LocalAssetCache, "scan", staticmethod(lambda root: scans.append(root) or scan(root)))
+    return scans
+
+
+def put(content_hash, data, mtime):
+    LocalAssetCache.put(content_hash, data)
+    os.utime(LocalAssetCache.get_path(content_hash), (mtime, mtime))
+
+
+def test_entry_is_read_back(asset_cache):
+    LocalAssetCache.put("aa11", b"data")
+
+    assert LocalAssetCache.get("aa11") == b"data"
+    assert LocalAssetCache.get("bb22") is None
+
+
+def test_directory_is_scanned_once_below_the_limit(asset_cache):
+    for index in range(5):
+        LocalAssetCache.put(f"{index:02d}", b"x" * 10)
+    # An existing entry is not counted again
+    LocalAssetCache.put("00", b"x" * 10)
+
+    assert len(asset_cache) == 1
+    assert list(LocalAssetCache._sizes.values()) == [50]
+
+
+def test_least_recently_used_entries_are_evicted(asset_cache, tmp_path):
+    put("aa", b"x" * 40, 1000)
+    put("bb", b"x" * 40, 3000)
+    put("cc", b"x" * 10, 2000)
+    assert LocalAssetCache.get("aa")
+
+    LocalAssetCache.put("dd", b"x" * 40)
+
+    # Evicted down to 90 bytes, "aa" was read after "bb" and "cc" were written
+    assert sorted(path.name for path in tmp_path.glob("*/*")) == ["aa", "dd"]
+    assert list(LocalAssetCache._sizes.values()) == [80]
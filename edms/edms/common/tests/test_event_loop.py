@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+import pytest
+
+from edms.common.event_loop import get_event_loop
+from edms.common.event_loop import run_sync
+
+
+async def current_loop():
+    return asyncio.get_running_loop()
+
+
+def test_loop_is_reused_by_the_same_thread():
+    loop = run_sync(current_loop())
+
+    assert run_sync(current_loop()) is loop
+    assert not loop.is_closed()
+
+
+def test_each_thread_has_its_own_loop():
+    loops = []
+    thread = threading.Thread(target=lambda: loops.append(run_sync(current_loop())))
+    thread.start()
+    thread.join()
+
+    assert loops[0] is not run_sync(current_loop())
+
+
+def test_closed_loop_is_replaced():
+    get_event_loop().close()
+
+    assert not run_sync(current_loop()).is_closed()
+
+
+def test_run_sync_refuses_a_running_loop():
+    async def nested():
+        coroutine = current_loop()
+        with pytest.raises(RuntimeError):
+            run_sync(coroutine)
+        # The coroutine was closed, so it is never left unawaited
+        return coroutine.cr_frame
+
+    assert asyncio.run(nested()) is None
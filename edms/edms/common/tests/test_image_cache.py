@@ -0,0 +1,83 @@
+import io
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image
+
+from edms.assets.models import Asset
+from edms.common.image_cache import SignatureAppearanceCache
+from edms.common.image_cache import SignatureImageCache
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    cache.clear()
+    SignatureImageCache.clear()
+    SignatureAppearanceCache.clear()
+
+
+@pytest.fixture()
+def reads(monkeypatch):
+    """Record the signature images read from storage."""
+    calls = []
+    read_image_data = SignatureImageCache.read_image_data
+
+    def record(asset):
+        calls.append(asset.id)
+        return read_image_data(asset)
+
+    monkeypatch.setattr(SignatureImageCache, "read_image_data", staticmethod(record))
+    return calls
+
+
+def make_signature_image(mode="RGBA"):
+    output = io.BytesIO()
+    Image.new(mode, (40, 20)).save(output, format="PNG")
+    return Asset.objects.create(
+        file=ContentFile(output.getvalue(), name="signature.png"),
+        size=len(output.getvalue()),
+        mime_type="image/png",
+        asset_name="signature.png",
+        file_type=Asset.SIGNATURE_IMAGE,
+    )
+
+
+def test_image_is_read_once(reads):
+    asset = make_signature_image()
+
+    image = SignatureImageCache.get_image(asset)
+
+    assert SignatureImageCache.get_image(asset) is image
+    # Another process finds the raw bytes in the shared cache
+    SignatureImageCache.clear()
+    assert SignatureImageCache.get_image(asset).size == (40, 20)
+    assert reads == [asset.id]
+
+
+def test_replaced_image_is_read_again(reads):
+    asset = make_signature_image()
+    SignatureImageCache.get_image(asset)
+
+    asset.updated_at += timedelta(seconds=1)
+    SignatureImageCache.get_image(asset)
+
+    assert reads == [asset.id, asset.id]
+
+
+@pytest.mark.parametrize(("mode", "color_space", "has_smask"), [("RGBA", "DeviceRGB", True), ("L", "DeviceGray", False)])
+def test_appearance_is_built_once_per_image(reads, mode, color_space, has_smask):
+    asset = make_signature_image(mode)
+
+    appearance = SignatureAppearanceCache.get_appearance(asset)
+    SignatureAppearanceCache.clear()
+    SignatureImageCache.clear()
+
+    assert SignatureAppearanceCache.get_appearance(asset) == appearance
+    assert (appearance["width"], appearance["height"]) == (40, 20)
+    assert appearance["color_space"] == color_space
+    assert (appearance["smask"] is not None) is has_smask
+    assert reads == [asset.id]
@@ -0,0 +1,82 @@
+import os
+import sys
+import time
+
+import pytest
+
+from edms.common import office_converter
+from edms.common.pdf_pool import PdfJobError
+
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+FAKE_SOFFICE = """#!{python}
+import pathlib, subprocess, sys, time
+args = sys.argv[1:]
+output_dir = pathlib.Path(args[args.index("--outdir") + 1])
+input_path = pathlib.Path(args[-1])
+behaviour = input_path.read_bytes()
+if behaviour == b"hang":
+    # A helper process, killed with the session
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+    pathlib.Path("{pid_file}").write_text(str(child.pid))
+    time.sleep(60)
+if behaviour == b"fail":
+    sys.exit(81)
+output_dir.mkdir()
+(output_dir / (input_path.stem + ".pdf")).write_bytes(b"%PDF-" + behaviour)
+"""
+
+
+@pytest.fixture()
+def soffice(tmp_path):
+    """A stand-in for LibreOffice, the input file tells it how to behave."""
+    binary = tmp_path / "soffice"
+    binary.write_text(FAKE_SOFFICE.format(python=sys.executable, pid_file=tmp_path / "child.pid"))
+    binary.chmod(0o755)
+    return binary
+
+
+def is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_document_is_converted(soffice):
+    assert office_converter.convert_to_pdf(b"1.7", DOCX, str(soffice), timeout=30, max_rss=1024 ** 3) == b"%PDF-1.7"
+
+
+def test_failed_conversion_raises(soffice):
+    with pytest.raises(PdfJobError, match="could not be converted"):
+        office_converter.convert_to_pdf(b"fail", DOCX, str(soffice), timeout=30, max_rss=1024 ** 3)
+
+
+def test_missing_binary_raises(tmp_path):
+    with pytest.raises(PdfJobError, match="could not be converted"):
+        office_converter.convert_to_pdf(b"1.7", DOCX, str(tmp_path / "missing"), timeout=30, max_rss=1024 ** 3)
+
+
+def test_session_past_its_timeout_is_killed(soffice, tmp_path):
+    started = time.monotonic()
+
+    with pytest.raises(PdfJobError, match="exceeded 2 seconds"):
+        office_converter.convert_to_pdf(b"hang", DOCX, str(soffice), timeout=2, max_rss=1024 ** 3)
+
+    assert time.monotonic() - started < 10
+    # The helper process of the session is gone too
+    pid = int((tmp_path / "child.pid").read_text())
+    deadline = time.monotonic() + 5
+    while is_running(pid) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not is_running(pid)
+
+
+def test_session_past_its_memory_limit_is_killed(soffice):
+    with pytest.raises(PdfJobError, match="memory limit"):
+        office_converter.convert_to_pdf(b"hang", DOCX, str(soffice), timeout=30, max_rss=1)
+
+
+def test_session_rss_counts_the_current_process():
+    assert office_converter.get_session_rss(os.getsid(0)) > 0
@@ -0,0 +1,61 @@
+import pypdfium2
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+
+from edms.common import pdf_helper
+from edms.common.pdf_backends import PikePdfBackend
+from edms.common.pdf_backends import PyPDF2Backend
+from edms.common.pdf_backends import get_pdf_backend
+from edms.common.tests.factories import make_pdf
+
+BACKENDS = [PyPDF2Backend.name, PikePdfBackend.name]
+
+
+def read_page_texts(pdf_data):
+    document = pypdfium2.PdfDocument(pdf_data)
+    try:
+        return [document[page_num].get_textpage().get_text_bounded() for page_num in range(len(document))]
+    finally:
+        document.close()
+
+
+@pytest.mark.parametrize(("name", "backend_class"), [("pypdf2", PyPDF2Backend), ("pikepdf", PikePdfBackend)])
+def test_backend_follows_the_setting(settings, name, backend_class):
+    settings.PDF_BACKEND = name
+
+    assert isinstance(get_pdf_backend(), backend_class)
+
+
+def test_unknown_backend_is_rejected(settings):
+    settings.PDF_BACKEND = "unknown"
+
+    with pytest.raises(ImproperlyConfigured):
+        get_pdf_backend()
+
+
+def test_backends_read_the_same_signature_fields():
+    pdf_data = make_pdf(pages=2, signature_fields=[(0, 1), (1, 2), (1, 1)])
+
+    signature_fields = [pdf_helper.read_signature_fields(pdf_data, name) for name in BACKENDS]
+
+    assert signature_fields[0] == signature_fields[1]
+    assert len(signature_fields[0]) == 3
+
+
+@pytest.mark.parametrize("name", BACKENDS)
+def test_watermark_is_drawn_on_every_page(name):
+    pdf_data = make_pdf(pages=3)
+
+    output_data = pdf_helper.render_watermarked_pdf(
+        pdf_data,
+        watermark_text="Confidential",
+        show_unsigned_badge=False,
+        signature_fields=[],
+        stamp_images={},
+        backend_name=name,
+        incremental=False,
+    )
+
+    page_texts = read_page_texts(output_data)
+    assert len(page_texts) == 3
+    assert all(f"Page {page_num + 1}" in text and "Confidential" in text for page_num, text in enumerate(page_texts))
@@ -0,0 +1,111 @@
+import io
+
+import pikepdf
+import pypdfium2
+import pytest
+from PIL import Image
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.validation import async_validate_pdf_signature
+
+from edms.common import pdf_helper
+from edms.common.event_loop import run_sync
+from edms.common.tests.factories import make_pdf
+from edms.common.tests.factories import sign_pdf
+
+
+def make_field(order, name, page=0):
+    return {
+        "order": order,
+        "name": name,
+        "page": page,
+        "rect": [0, 0, 100, 50],
+        "page_width": 595,
+        "page_height": 842,
+    }
+
+
+def read_page_texts(pdf_data):
+    document = pypdfium2.PdfDocument(pdf_data)
+    try:
+        return [document[page_num].get_textpage().get_text_bounded() for page_num in range(len(document))]
+    finally:
+        document.close()
+
+
+SIGNATURE_FIELDS = [make_field(1, "a"), make_field(1, "b"), make_field(2, "c"), make_field(1, "d", page=1)]
+
+
+@pytest.mark.parametrize(
+    ("stage_index", "stage_size", "expected"),
+    [
+        # A single signer owns every field of its order and signs the last one
+        (0, 1, "d"),
+        (0, 2, "a"),
+        # The last signer of a stage keeps the extra fields
+        (1, 2, "d"),
+        (3, 3, None),
+    ],
+)
+def test_find_signature_field(stage_index, stage_size, expected):
+    signature_field = pdf_helper.find_signature_field(SIGNATURE_FIELDS, 1, stage_index, stage_size)
+
+    assert (signature_field["name"] if signature_field else None) == expected
+
+
+def test_every_field_of_an_order_is_stamped(monkeypatch):
+    monkeypatch.setattr(pdf_helper, "render_image_stamp", lambda stamp_image, **kwargs: stamp_image)
+
+    pages_signatures_map = pdf_helper.render_signature_stamps(
+        SIGNATURE_FIELDS,
+        {(1, 0): "first", (1, 1): "second", (2, 0): None},
+    )
+
+    assert pages_signatures_map == {0: ["first", "second"], 1: ["second"]}
+
+
+def test_get_signature_fields_reads_every_page():
+    input_pdf = io.BytesIO(make_pdf(pages=2, signature_fields=[(0, 1), (1, 2)]))
+
+    signature_fields = pdf_helper.get_signature_fields(input_pdf)
+
+    assert [(field["page"], field["order"]) for field in signature_fields] == [(0, 1), (1, 2)]
+    assert signature_fields[0]["rect"] == [40.0, 80.0, 140.0, 120.0]
+    # The upload is saved afterwards, the stream is rewound
+    assert input_pdf.tell() == 0
+
+
+def test_incremental_watermark_keeps_the_signature_intact():
+    signed_data = sign_pdf(make_pdf(pages=2))
+
+    output_data = pdf_helper.render_watermarked_pdf(
+        signed_data,
+        watermark_text="Confidential",
+        show_unsigned_badge=False,
+        signature_fields=[make_field(1, "a", page=1)],
+        stamp_images={(1, 0): Image.new("RGB", (40, 20))},
+        backend_name="pypdf2",
+        incremental=True,
+    )
+
+    # Only appended to, the signed revision is copied byte for byte
+    assert output_data.startswith(signed_data)
+    [embedded_signature] = PdfFileReader(io.BytesIO(output_data)).embedded_signatures
+    assert run_sync(async_validate_pdf_signature(embedded_signature)).intact
+    assert all("Confidential" in text for text in read_page_texts(output_data))
+    with pikepdf.open(io.BytesIO(output_data)) as pdf:
+        assert ["/EdmsStamp0" in page.Resources.XObject for page in pdf.pages] == [False, True]
+
+
+@pytest.mark.parametrize(
+    ("max_chars", "expected_text", "page_count", "truncated"),
+    [
+        (1000, "Page 1\nPage 2\nPage 3", 3, False),
+        # Stops in the second page
+        (9, "Page 1\nPag", 2, True),
+    ],
+)
+def test_extract_text(max_chars, expected_text, page_count, truncated):
+    text, pages, is_truncated = pdf_helper.extract_text(make_pdf(pages=3), max_chars)
+
+    assert text == expected_text
+    assert (pages, is_truncated) == (page_count, truncated)
@@ -0,0 +1,47 @@
+import os
+import signal
+import time
+from pathlib import Path
+
+import pytest
+
+from edms.common.pdf_pool import PdfJobTimeout
+
+
+def add(a, b):
+    return a + b
+
+
+def block(pid_file):
+    """Ignore the limit of the worker, like a job stuck in C code."""
+    Path(pid_file).write_text(str(os.getpid()))
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+    time.sleep(60)
+
+
+def is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+def test_job_runs_in_a_worker(pdf_pool):
+    assert pdf_pool.run(add, 2, b=3) == 5
+    assert pdf_pool.run(os.getpid) != os.getpid()
+
+
+def test_worker_of_a_job_past_its_timeout_is_terminated(pdf_pool, tmp_path):
+    pid_file = tmp_path / "pid"
+
+    with pytest.raises(PdfJobTimeout):
+        pdf_pool.run(block, str(pid_file), timeout=1)
+
+    pid = int(pid_file.read_text())
+    deadline = time.monotonic() + 10
+    while is_running(pid) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not is_running(pid)
+    # The next job gets a fresh pool
+    assert pdf_pool.run(add, 2, 3) == 5
@@ -1,5 +1,6 @@
 import pytest
 
+from edms.common.pdf_pool import PdfRenderPool
 from edms.users.models import User
 from edms.users.tests.factories import UserFactory
 
@@ -12,3 +13,11 @@ def _media_storage(settings, tmpdir) -> None:
 @pytest.fixture()
 def user(db) -> User:
     return UserFactory()
+
+
+@pytest.fixture()
+def pdf_pool(settings):
+    """Run PDF jobs in the process pool, the test settings run them in-process."""
+    settings.PDF_POOL_ENABLED = True
+    yield PdfRenderPool
+    PdfRenderPool.shutdown()
@@ -0,0 +1,118 @@
+import logging
+import threading
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import LockError
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentLocked(ValueError):
+    """The lock of a document is held by someone else, trying again later may succeed."""
+
+
+class DocumentLock:
+    """
+    Per-document lock shared by the web and worker processes.
+
+    Taken around the preparation and the finalization of a signature, so two
+    signers never work from the same revision of the signature file. It is
+    held in Redis with a short lease, a crashed holder blocks the document for
+    SIGNING_LOCK_TIMEOUT seconds at most. Holders extend the lease before they
+    commit, and a lease that ran out fails the work done under it. Caches
+    without locking support, such as the local memory cache of the tests,
+    fall back to a process-local lock.
+    """
+    _local_locks = {}
+    _local_locks_lock = threading.Lock()
+
+    @staticmethod
+    def get_key(document_id):
+        return f"document:signing-lock:{document_id}"
+
+    @classmethod
+    def get_lock(cls, document_id, timeout=None):
+        if hasattr(cache, "lock"):
+            return cache.lock(
+                cls.get_key(document_id),
+                timeout=timeout or settings.SIGNING_LOCK_TIMEOUT,
+                blocking_timeout=settings.SIGNING_LOCK_WAIT,
+            )
+        with cls._local_locks_lock:
+            return cls._local_locks.setdefault(document_id, threading.Lock())
+
+    @classmethod
+    @contextmanager
+    def acquire(cls, document_id, timeout=None):
+        """
+        Hold the lock of ``document_id`` for a lease of ``timeout`` seconds.
+
+        Yields the lock, see extend. Raises DocumentLocked when the lock is
+        not taken within SIGNING_LOCK_WAIT seconds, and ValueError when the
+        lease ran out before the block was done.
+        """
+        lock = cls.get_lock(document_id, timeout=timeout)
+        if hasattr(cache, "lock"):
+            acquired = lock.acquire()
+        else:
+            acquired = lock.acquire(timeout=settings.SIGNING_LOCK_WAIT)
+        if not acquired:
+            raise DocumentLocked("The document is being signed by someone else. Please try again.")
+        try:
+            yield lock
+        except BaseException:
+            cls.release(lock, document_id, strict=False)
+            raise
+        cls.release(lock, document_id)
+
+    @staticmethod
+    def release(lock, document_id, strict=True):
+        try:
+            lock.release()
+        except LockError as e:
+            logger.error("Error: %s", e)
+            if strict:
+                # Someone else may have worked on the document in the meantime
+                raise ValueError(f"The lock of document {document_id} expired before the signing was done.") from e
+
+    @staticmethod
+    def extend(*locks):
+        """
+        Renew the lease of ``locks`` for SIGNING_LOCK_TIMEOUT seconds.
+
+        Called before a commit, raises ValueError when a lease already ran
+        out so the work done under it is rolled back.
+        """
+        for lock in locks:
+            if not hasattr(lock, "extend"):
+                continue
+            try:
+                lock.extend(settings.SIGNING_LOCK_TIMEOUT, replace_ttl=True)
+            except LockError as e:
+                logger.error("Error: %s", e)
+                raise ValueError("The document lock expired before the signing was done.") from e
+
+    @classmethod
+    @contextmanager
+    def acquire_many(cls, document_ids):
+        """
+        Lock every document of ``document_ids`` that can be locked.
+
+        Yields the locks taken by document id, and the ids that were not
+        locked with their error message. Locks are taken in id order so two
+        batches never wait on each other. The lease grows with the batch, as
+        every document is prepared before any of them is committed.
+        """
+        document_ids = sorted(set(document_ids))
+        timeout = settings.SIGNING_LOCK_TIMEOUT * max(len(document_ids), 1)
+        locks = {}
+        errors = {}
+        with ExitStack() as stack:
+            for document_id in document_ids:
+                try:
+                    locks[document_id] = stack.enter_context(cls.acquire(document_id, timeout=timeout))
+                except ValueError as e:
+                    errors[document_id] = str(e)
+            yield locks, errors
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.8 on 2026-10-19 14:10
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_alter_document_document_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SigningJob',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('queued', 'queued'), ('processing', 'processing'), ('submitted', 'submitted'), ('signed', 'signed'), ('failed', 'failed')], default='queued', max_length=50)),
+                ('transaction_id', models.CharField(blank=True, db_index=True, max_length=255, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='created_%(class)ss', to=settings.AUTH_USER_MODEL)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signing_jobs', to='documents.document')),
+                ('document_signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signing_jobs', to='documents.documentsignature')),
+                ('updated_by', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='updated_%(class)ss', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
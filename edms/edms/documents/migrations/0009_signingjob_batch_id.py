@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_signingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='signingjob',
+            name='batch_id',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.8 on 2026-10-19 15:40
+
+import django.db.models.deletion
+import edms.documents.models
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_signingjob_batch_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SigningSession',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, null=True)),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('transaction_id', models.CharField(db_index=True, max_length=255)),
+                ('index', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'pending'), ('completed', 'completed'), ('expired', 'expired')], default='pending', max_length=50)),
+                ('state', models.BinaryField()),
+                ('signed_attrs', models.BinaryField()),
+                ('cert', models.TextField()),
+                ('prepared_file', models.FileField(blank=True, default=None, null=True, upload_to=edms.documents.models.get_signing_session_path)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('created_by', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='created_%(class)ss', to=settings.AUTH_USER_MODEL)),
+                ('document_signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signing_sessions', to='documents.documentsignature')),
+                ('updated_by', models.ForeignKey(blank=True, default=None, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='updated_%(class)ss', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['index'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.8 on 2026-10-19 16:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_signingwebhookevent'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentsignature',
+            index=models.Index(fields=['signature_status', 'updated_at'], name='docsig_status_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-19 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_documentsignature_docsig_status_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='signingsession',
+            name='asset_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.8 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0014_documentrevision_document_current_revision'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='signingjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'processing'])), fields=('document_signature',), name='signingjob_active_signature_uniq'),
+        ),
+    ]
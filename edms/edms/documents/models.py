@@ -1,19 +1,30 @@
-from django.db import models, transaction
+from datetime import timedelta
+import hashlib
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F, Max, Q
 from django.utils.timezone import now
 
 from edms.assets.models import Asset
 from edms.common import pdf_helper
+from edms.common.asset_cache import LocalAssetCache
 from edms.common.basemodels import BaseModel
-from edms.common.s3_helper import S3FileManager
 from edms.core.models import SoftDeleteModel
-from edms.documents.signing_utils import MySignHelper
+from edms.common.pdf_pool import PdfRenderPool
+from edms.common.s3_helper import S3FileManager
+from edms.documents.locks import DocumentLock
+from edms.documents.signing_utils import MySignHelper, prepare_document_job
 from edms.notifications.services import NotificationService
 from edms.users.models import User
 import mimetypes
-from django.core.cache import cache
-from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+import logging
 import pickle
-import copy
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
 
 
 # Create your models here.
@@ -66,6 +77,13 @@ class Document(SoftDeleteModel, BaseModel):
         related_name="attached_documents",
         symmetrical=False
     )
+    current_revision = models.ForeignKey(
+        "documents.DocumentRevision",
+        related_name="+",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+    )
 
     def update_fields(self, **kwargs):
         for field, value in kwargs.items():
@@ -74,12 +92,13 @@ class Document(SoftDeleteModel, BaseModel):
 
         self.save()
 
-    def associate_assets(self, files, file_type):
-        Asset.objects.bulk_create(
+    def associate_assets(self, files, file_type, signature_fields=None):
+        assets = Asset.objects.bulk_create(
             [
                 Asset(
                     document=self,
                     file_type=file_type,
+                    signature_fields=signature_fields,
                     file=file,
                     size=file.size,
                     asset_name=file.name,
@@ -93,6 +112,7 @@ class Document(SoftDeleteModel, BaseModel):
                 for file in files
             ],
         )
+        Asset.schedule_processing(assets, optimize=settings.PDF_OPTIMIZE_ON_UPLOAD)
 
     def associate_receivers(self, receivers):
         DocumentReceiver.objects.bulk_create(
@@ -214,7 +234,7 @@ class Document(SoftDeleteModel, BaseModel):
             # TODO Noti to signer
             NotificationService.send_notification_to_users(
                 sender=request.user,
-                receivers=[self.signatures.filter(order=1).first().signer],
+                receivers=self.get_stage_signers(self.signatures.aggregate(models.Min("order"))["order__min"]),
                 title="Yêu cầu ký tài liệu",
                 body=f"Tài liệu {self.document_title} cần được ký. Vui lòng kiểm tra và hoàn tất.",
                 image=None,
@@ -226,12 +246,14 @@ class Document(SoftDeleteModel, BaseModel):
         except Exception as e:
             raise ValueError(f"Failed to update document state: {e}")
 
-    def sign(self, request, client_id, client_secret, base_url, profile_id, access_key, secret_key, region_name, bucket_name):
+    def get_signature_to_sign(self, user):
         if self.document_category != Document.IN_PROGRESS_SIGNING_DOCUMENT:
             raise ValueError(
                 "The document cannot be signed because it is not categorized as a in progress signing document."
             )
-        document_signature = self.signatures.filter(signer=request.user).first()
+        document_signature = self.signatures.filter(signer=user).first()
+        if not document_signature:
+            raise ValueError("No unsigned signer or signature files available.")
 
         if document_signature.signature_status in [DocumentSignature.SIGNED, DocumentSignature.PENDING, DocumentSignature.REJECTED]:
             raise ValueError("You have SIGNED/PENDING/REJECTED the signing.")
@@ -247,88 +269,258 @@ class Document(SoftDeleteModel, BaseModel):
                 "The signing process cannot proceed because a previous signer has not completed their signature"
             )
 
-        signature_file = Asset.objects.filter(
-            file_type=Asset.SIGNATURE_FILE,
-            document_id=self.id,
-        ).first()
-        if document_signature and signature_file:
-            cert_list, access_token = MySignHelper.get_all_certificates(
-                user_id=document_signature.signer.external_user_id,
-                base_url=base_url,
-                client_id=client_id,
-                client_secret=client_secret,
-                profile_id=profile_id
-            )
+        # Only one signature may be pending on a field, the rest of a parallel stage signs meanwhile
+        field_name = document_signature.get_field_name(document_signature.get_stage_index())
+        if any(
+            signature.get_field_name(signature.get_stage_index()) == field_name
+            for signature in self.signatures.filter(
+                order=document_signature.order,
+                signature_status=DocumentSignature.PENDING,
+            ).exclude(id=document_signature.id)
+        ):
+            raise ValueError("Another signer is signing this field. Please try again once they have finished.")
+        return document_signature
 
-            if cert_list:
-                signature_file_input = signature_file.get_asset_file(
-                    access_key=access_key,
-                    secret_key=secret_key,
-                    region_name=region_name,
-                    bucket_name=bucket_name
-                )
+    def get_stage_signers(self, order):
+        return [signature.signer for signature in self.signatures.select_related("signer").filter(order=order)]
 
-                origin_file_input = copy.deepcopy(signature_file_input)
+    def sign(self, user, client_id, client_secret, base_url, profile_id, access_key, secret_key, region_name, bucket_name):
+        sign_hash_response, errors = Document.sign_documents(
+            documents=[self],
+            user=user,
+            client_id=client_id,
+            client_secret=client_secret,
+            base_url=base_url,
+            profile_id=profile_id,
+            access_key=access_key,
+            secret_key=secret_key,
+            region_name=region_name,
+            bucket_name=bucket_name,
+        )
+        if errors:
+            raise ValueError(errors[self.id])
+        return sign_hash_response
 
-                sigpage, signature_box, signature_img = pdf_helper.get_positions_signature(
-                    input_pdf=signature_file_input,
-                    document_signature=document_signature
-                )
+    @staticmethod
+    def sign_documents(documents, user, client_id, client_secret, base_url, profile_id, access_key, secret_key, region_name, bucket_name):
+        """
+        Sign every document in ``documents`` as ``user`` in one MySign transaction.
 
-                cert = MySignHelper.get_cert509(cert_list[list(cert_list.keys())[0]]['certificates'][0])
+        The digests are prepared in parallel and submitted in a single signHash
+        call, so the signer confirms the whole batch once. Returns the signHash
+        response and a mapping of document id to error message for the
+        documents that were left out of the transaction.
+        """
+        cert_list, access_token = MySignHelper.get_all_certificates(
+            user_id=user.external_user_id,
+            base_url=base_url,
+            client_id=client_id,
+            client_secret=client_secret,
+            profile_id=profile_id
+        )
+        if not cert_list:
+            raise ValueError("No certificates found for the signer.")
 
-                signature_img = S3FileManager.download_image_from_s3(signature_img)
+        credential_id = list(cert_list.keys())[0]
+        cert_data = cert_list[credential_id]['certificates'][0]
+        signature_appearance = pdf_helper.get_default_signature_appearance(user)
+        if not signature_appearance:
+            raise ValueError("Not found sign")
 
-                prep_digest, psi, signed_attrs, output = MySignHelper.prepare_document(
-                    file_data=IncrementalPdfFileWriter(origin_file_input),
-                    sig_name=f"Signature{document_signature.order}",
-                    sigpage=sigpage,
-                    signature_box=signature_box,
-                    signature_img=signature_img,
-                    cert=cert,
-                    signer=document_signature.signer,
+        # Held while the signatures are prepared, so a finalization never
+        # replaces the file a signature is being prepared from
+        with DocumentLock.acquire_many([document.id for document in documents]) as (locks, lock_errors):
+            with transaction.atomic():
+                prepared, errors = Document.prepare_signatures(
+                    [document for document in documents if document.id in locks],
+                    user, cert_data, signature_appearance, access_key, secret_key, region_name, bucket_name
                 )
+                # Committed only while every lease still holds
+                DocumentLock.extend(*locks.values())
+        errors = {**lock_errors, **errors}
+        if not prepared:
+            return None, errors
 
-                hash_list = [MySignHelper.generate_base64_sha256(signed_attrs.dump())]
-
-                sign_hash_response = MySignHelper.sign_hash(
-                    hash_list=hash_list,
-                    document_id=self.document_code,
-                    document_name=MySignHelper.convert_string2base64(self.document_title),
-                    client_id=client_id,
-                    client_secret=client_secret,
-                    credential_id=list(cert_list.keys())[0],
-                    base_url=base_url,
-                    access_token=access_token
-                )
+        # No lock or transaction is held while MySign answers, a slow call stalls no other signer
+        sign_hash_response = MySignHelper.sign_hash(
+            hash_list=[MySignHelper.generate_base64_sha256(data['signed_attrs']) for _, _, data in prepared],
+            document_id=None,
+            document_name=None,
+            client_id=client_id,
+            client_secret=client_secret,
+            credential_id=credential_id,
+            base_url=base_url,
+            access_token=access_token,
+            documents=[
+                {
+                    "document_id": document.document_code,
+                    "document_name": MySignHelper.convert_string2base64(document.document_title),
+                }
+                for document, _, _ in prepared
+            ],
+        )
 
-                if not sign_hash_response:
-                    raise ValueError("Failed to sign the document.")
+        if not sign_hash_response:
+            # The cached token or certificate may be stale, fetch them again next time
+            MySignHelper.invalidate_user_cache(user.external_user_id, profile_id)
+            raise ValueError("Failed to sign the document.")
 
-                try:
-                    document_signature.update_fields(
+        try:
+            with transaction.atomic():
+                for index, (document, document_signature, data) in enumerate(prepared):
+                    # Another request of the signer may have submitted it in the meantime
+                    if not DocumentSignature.objects.filter(id=document_signature.id).exclude(
+                        signature_status__in=[DocumentSignature.SIGNED, DocumentSignature.PENDING, DocumentSignature.REJECTED],
+                    ).update(
                         transaction_id=sign_hash_response.get("transactionId"),
                         signature_status=DocumentSignature.PENDING,
-                        updated_by=request.user,
+                        updated_by=user,
+                        updated_at=now(),
+                    ):
+                        errors[document.id] = "You have SIGNED/PENDING/REJECTED the signing."
+                        continue
+                    # The signatures of the transaction come back in the order of the hash list
+                    SigningSession.open(
+                        document_signature=document_signature,
+                        transaction_id=sign_hash_response.get("transactionId"),
+                        index=index,
+                        prepared=data,
+                        cert_data=cert_data,
+                        user=user,
                     )
+        except Exception as e:
+            raise ValueError(f"Failed to update document state: {e}")
+        return sign_hash_response, errors
+
+    @staticmethod
+    def prepare_signatures(documents, user, cert_data, signature_appearance, access_key, secret_key, region_name, bucket_name):
+        """
+        Prepare the signature of ``user`` on every document of ``documents``.
+
+        Returns the prepared documents with their signature and prepared
+        state, and a mapping of document id to error message for the others.
+        """
+        errors = {}
+        targets = []
+        for document in documents:
+            try:
+                document_signature = document.get_signature_to_sign(user)
+                document_signature.stage_index = document_signature.get_stage_index()
+                document_signature.stage_size = document_signature.get_stage_size()
+                signature_file = Asset.objects.filter(
+                    file_type=Asset.SIGNATURE_FILE,
+                    document_id=document.id,
+                ).first()
+                if not signature_file:
+                    raise ValueError("No unsigned signer or signature files available.")
+                # Read under the document lock, the revision the signature is prepared from
+                document.refresh_from_db(fields=["current_revision"])
+                revision = document.current_revision
+                # Everything the preparation needs is read here, its threads never query the database
+                targets.append((document, document_signature, signature_file, {
+                    "asset_version": signature_file.version,
+                    "file_key": revision.file.name if revision else signature_file.file.name,
+                    "content_hash": revision.content_hash if revision else None,
+                    "signature_fields": signature_file.signature_fields,
+                    "stage_index": document_signature.stage_index,
+                    "stage_size": document_signature.stage_size,
+                }))
+            except ValueError as e:
+                errors[document.id] = str(e)
 
-                    cache_key = f"signature:{self.document_code}:{document_signature.id}"
-                    cache_data = {
-                        'prep_digest': prep_digest,
-                        'signed_attrs': signed_attrs.dump(),
-                        'psi': psi,
-                        'output_handle': output.getbuffer().tobytes(),
-                        'cert': cert_list[list(cert_list.keys())[0]]['certificates'][0]
-                    }
-                    cache.set(cache_key, pickle.dumps(cache_data), timeout=3600)
+        if not targets:
+            return [], errors
 
+        def prepare(document_signature, target):
+            try:
+                pdf_data = DocumentRevision.read_data(
+                    file_key=target["file_key"],
+                    content_hash=target["content_hash"],
+                    access_key=access_key,
+                    secret_key=secret_key,
+                    region_name=region_name,
+                    bucket_name=bucket_name
+                )
+                # The uploaded file is hashed once, it becomes revision 0
+                original = None if target["content_hash"] else DocumentRevision.cache_data(pdf_data)
+                prepared = Document.prepare_signature(
+                    document_signature=document_signature,
+                    signer=user,
+                    pdf_data=pdf_data,
+                    signature_fields=target["signature_fields"],
+                    signature_appearance=signature_appearance,
+                    cert_data=cert_data,
+                    stage_index=target["stage_index"],
+                    stage_size=target["stage_size"],
+                    wait=True,
+                )
+                return {**prepared, 'asset_version': target["asset_version"], 'original': original}
+            finally:
+                connections.close_all()
+
+        prepared = []
+        with ThreadPoolExecutor(max_workers=settings.SIGNING_PREPARE_WORKERS) as executor:
+            futures = [
+                (document, signature_file, document_signature, executor.submit(prepare, document_signature, target))
+                for document, document_signature, signature_file, target in targets
+            ]
+            for document, signature_file, document_signature, future in futures:
+                try:
+                    data = future.result()
+                    if data['original']:
+                        # First signature, the uploaded file becomes revision 0
+                        DocumentRevision.record_original(document, signature_file, *data['original'], user=user)
+                    prepared.append((document, document_signature, data))
                 except Exception as e:
-                    raise ValueError(f"Failed to update document state: {e}")
-                return sign_hash_response
-            else:
-                raise ValueError("No certificates found for the signer.")
-        else:
-            raise ValueError("No unsigned signer or signature files available.")
+                    logger.error("Error: %s", e)
+                    errors[document.id] = str(e)
+
+        return prepared, errors
+
+    @staticmethod
+    def prepare_signature(document_signature, signer, pdf_data, signature_fields, signature_appearance, cert_data, stage_index=0, stage_size=1, wait=False):
+        """
+        Prepare the signature of ``pdf_data`` and return the state kept until MySign answers.
+
+        ``pdf_data`` is the only copy of the file in this process, the field
+        lookup and the pyhanko writer both read from it. ``signature_appearance``
+        is the pre-built stamp of the signer, see SignatureAppearanceCache.
+        Only loaded fields of ``document_signature`` and ``signer`` are read,
+        so it can run outside the thread of the request. With ``wait`` set a
+        busy PDF pool is waited for instead of failing the preparation.
+        """
+        if not signature_appearance:
+            raise ValueError("Not found sign")
+        if signature_fields is None:
+            signature_fields = PdfRenderPool.run(pdf_helper.read_signature_fields, pdf_data, settings.PDF_BACKEND, wait=wait)
+
+        sigpage, signature_box, signature_appearance = pdf_helper.get_positions_signature(
+            input_pdf=None,
+            document_signature=document_signature,
+            signature_fields=signature_fields,
+            signature_img=signature_appearance,
+            stage_index=stage_index,
+            stage_size=stage_size,
+        )
+
+        prep_digest, psi, signed_attrs, output = PdfRenderPool.run(
+            prepare_document_job,
+            pdf_data=pdf_data,
+            sig_name=document_signature.get_field_name(stage_index),
+            sigpage=sigpage,
+            signature_box=signature_box,
+            signature_appearance=signature_appearance,
+            cert_data=cert_data,
+            signer_name=signer.name,
+            signer_email=signer.email,
+            wait=wait,
+        )
+        return {
+            'prep_digest': prep_digest,
+            'signed_attrs': signed_attrs,
+            'psi': psi,
+            'output_handle': output,
+        }
 
 
 class DocumentReceiver(BaseModel):
@@ -394,6 +586,76 @@ class DocumentSignature(BaseModel):
 
     class Meta:
         ordering = ['order']
+        indexes = [
+            models.Index(fields=["signature_status", "updated_at"], name="docsig_status_updated_idx"),
+        ]
+
+    def get_stage_index(self):
+        """Position of this signer among the signers sharing its order."""
+        return self.document.signatures.filter(order=self.order, id__lt=self.id).count()
+
+    def get_stage_size(self):
+        """Number of signers sharing the order of this signer."""
+        return self.document.signatures.filter(order=self.order).count()
+
+    def get_field_name(self, stage_index=0):
+        if stage_index:
+            return f"Signature{self.order}_{stage_index + 1}"
+        return f"Signature{self.order}"
+
+    def update_fields(self, **kwargs):
+        for field, value in kwargs.items():
+            if hasattr(self, field):
+                setattr(self, field, value)
+
+        self.save()
+
+
+class SigningJob(BaseModel):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    SUBMITTED = "submitted"
+    SIGNED = "signed"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, QUEUED),
+        (PROCESSING, PROCESSING),
+        (SUBMITTED, SUBMITTED),
+        (SIGNED, SIGNED),
+        (FAILED, FAILED),
+    ]
+    ACTIVE_STATUSES = [QUEUED, PROCESSING]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document = models.ForeignKey(
+        "documents.Document",
+        related_name="signing_jobs",
+        on_delete=models.CASCADE,
+    )
+    document_signature = models.ForeignKey(
+        "documents.DocumentSignature",
+        related_name="signing_jobs",
+        on_delete=models.CASCADE,
+    )
+    status = models.CharField(
+        max_length=50,
+        choices=STATUS_CHOICES,
+        default=QUEUED,
+    )
+    transaction_id = models.CharField(max_length=255, null=True, blank=True, db_index=True)
+    batch_id = models.UUIDField(null=True, blank=True, db_index=True)
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            # One queued or running job per signature, concurrent submits lose at insert time
+            models.UniqueConstraint(
+                fields=["document_signature"],
+                condition=Q(status__in=["queued", "processing"]),
+                name="signingjob_active_signature_uniq",
+            ),
+        ]
 
     def update_fields(self, **kwargs):
         for field, value in kwargs.items():
@@ -401,3 +663,410 @@ class DocumentSignature(BaseModel):
                 setattr(self, field, value)
 
         self.save()
+
+    @classmethod
+    def submit(cls, document, user):
+        """
+        Queue the signature of ``user`` on ``document``.
+
+        The checks that do not need MySign run here, the rest of the signing
+        flow runs in the sign_document task once the transaction commits.
+        """
+        from edms.documents.tasks import sign_document
+        document_signature = document.get_signature_to_sign(user)
+        if cls.objects.filter(
+            document_signature=document_signature,
+            status__in=cls.ACTIVE_STATUSES,
+        ).exists():
+            raise ValueError("The signing of this document is already in progress.")
+
+        try:
+            with transaction.atomic():
+                job = cls.objects.create(
+                    document=document,
+                    document_signature=document_signature,
+                    created_by=user,
+                )
+        except IntegrityError:
+            raise ValueError("The signing of this document is already in progress.")
+        transaction.on_commit(lambda: sign_document.delay(str(job.id)))
+        return job
+
+    @classmethod
+    def submit_batch(cls, documents, user):
+        """
+        Queue the signature of ``user`` on every document of ``documents``.
+
+        All documents are validated before anything is queued. The jobs share
+        a batch id and are signed together in the sign_document_batch task,
+        so MySign asks the signer to confirm once.
+        """
+        from edms.documents.tasks import sign_document_batch
+        document_signatures = []
+        for document in documents:
+            try:
+                document_signature = document.get_signature_to_sign(user)
+                if cls.objects.filter(
+                    document_signature=document_signature,
+                    status__in=cls.ACTIVE_STATUSES,
+                ).exists():
+                    raise ValueError("The signing of this document is already in progress.")
+            except ValueError as e:
+                raise ValueError(f"{document.document_code}: {e}")
+            document_signatures.append((document, document_signature))
+
+        batch_id = uuid.uuid4()
+        try:
+            with transaction.atomic():
+                jobs = cls.objects.bulk_create([
+                    cls(
+                        document=document,
+                        document_signature=document_signature,
+                        batch_id=batch_id,
+                        created_by=user,
+                    )
+                    for document, document_signature in document_signatures
+                ])
+        except IntegrityError:
+            raise ValueError("The signing of some of these documents is already in progress.")
+        transaction.on_commit(lambda: sign_document_batch.delay(str(batch_id)))
+        return batch_id, jobs
+
+    @classmethod
+    def recover_stale_jobs(cls):
+        """
+        Recover the jobs left queued or running for SIGNING_JOB_STALE_AFTER seconds.
+
+        A queued job whose task was lost is queued again, the claim in the
+        task keeps a duplicate delivery harmless. A running job outlived the
+        task time limit, its worker died: it is failed so the signer can
+        submit again. Returns how many jobs were requeued and failed.
+        """
+        from edms.documents.tasks import sign_document, sign_document_batch
+        stale_before = now() - timedelta(seconds=settings.SIGNING_JOB_STALE_AFTER)
+
+        failed = cls.objects.filter(status=cls.PROCESSING, updated_at__lt=stale_before).update(
+            status=cls.FAILED,
+            error="The signing job was interrupted. Please try again.",
+            updated_at=now(),
+        )
+
+        requeued = 0
+        batch_ids = set()
+        for job in cls.objects.filter(status=cls.QUEUED, updated_at__lt=stale_before).iterator():
+            if not cls.objects.filter(id=job.id, status=cls.QUEUED).update(updated_at=now()):
+                continue
+            requeued += 1
+            if job.batch_id:
+                batch_ids.add(job.batch_id)
+            else:
+                sign_document.delay(str(job.id))
+        for batch_id in batch_ids:
+            sign_document_batch.delay(str(batch_id))
+        return requeued, failed
+
+
+def get_signing_session_path(instance, filename):
+    return f"signing-sessions/{instance.transaction_id}/{filename}"
+
+
+class SigningSession(BaseModel):
+    """
+    State of a signature waiting for the MySign confirmation.
+
+    The pyhanko digest and post-sign instructions are kept in the database,
+    the prepared PDF in the file storage, written when the session commits.
+    A session is closed, and its PDF deleted, once the webhook finalizes the
+    signature or when it expires.
+    """
+    PENDING = "pending"
+    COMPLETED = "completed"
+    EXPIRED = "expired"
+    STATUS_CHOICES = [
+        (PENDING, PENDING),
+        (COMPLETED, COMPLETED),
+        (EXPIRED, EXPIRED),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    document_signature = models.ForeignKey(
+        "documents.DocumentSignature",
+        related_name="signing_sessions",
+        on_delete=models.CASCADE,
+    )
+    transaction_id = models.CharField(max_length=255, db_index=True)
+    index = models.PositiveIntegerField(default=0)
+    status = models.CharField(
+        max_length=50,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    state = models.BinaryField()
+    signed_attrs = models.BinaryField()
+    cert = models.TextField()
+    asset_version = models.PositiveIntegerField(default=0)
+    prepared_file = models.FileField(
+        upload_to=get_signing_session_path,
+        blank=True,
+        null=True,
+        default=None,
+    )
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['index']
+
+    def update_fields(self, **kwargs):
+        for field, value in kwargs.items():
+            if hasattr(self, field):
+                setattr(self, field, value)
+
+        self.save()
+
+    @classmethod
+    def open(cls, document_signature, transaction_id, index, prepared, cert_data, user):
+        session = cls(
+            document_signature=document_signature,
+            transaction_id=transaction_id,
+            index=index,
+            asset_version=prepared['asset_version'],
+            state=pickle.dumps({
+                'prep_digest': prepared['prep_digest'],
+                'psi': prepared['psi'],
+            }),
+            signed_attrs=prepared['signed_attrs'],
+            cert=cert_data,
+            expires_at=now() + timedelta(seconds=settings.SIGNING_SESSION_TIMEOUT),
+            created_by=user,
+        )
+        # Written once the session is committed, a rolled back signing leaves no file behind
+        session.prepared_file.name = get_signing_session_path(session, f"{index}.pdf")
+        session.save()
+        transaction.on_commit(lambda: session.store_prepared_file(prepared['output_handle']))
+        return session
+
+    def store_prepared_file(self, output):
+        name = self.prepared_file.storage.save(self.prepared_file.name, ContentFile(output))
+        if name != self.prepared_file.name:
+            self.prepared_file.name = name
+            SigningSession.objects.filter(pk=self.pk).update(prepared_file=name)
+
+    def get_signature_data(self):
+        with self.prepared_file.open("rb") as prepared_file:
+            output = prepared_file.read()
+        return {
+            **pickle.loads(self.state),
+            'signed_attrs': bytes(self.signed_attrs),
+            'output_handle': output,
+            'cert': self.cert,
+        }
+
+    def close(self, status=COMPLETED):
+        if self.prepared_file:
+            self.prepared_file.delete(save=False)
+        self.update_fields(status=status)
+
+    @classmethod
+    def expire_sessions(cls):
+        """Close the sessions whose confirmation never came. Returns how many were expired."""
+        expired = 0
+        for session in cls.objects.filter(status=cls.PENDING, expires_at__lte=now()).iterator():
+            try:
+                session.close(status=cls.EXPIRED)
+                expired += 1
+            except Exception as e:
+                logger.error("Error: %s", e)
+        return expired
+
+
+class SigningWebhookEvent(BaseModel):
+    """
+    A MySign webhook delivery, one per transaction.
+
+    The transaction id is the idempotency key: deliveries of a transaction
+    that is queued, being finalized or already finalized are dropped, a
+    failed one is queued again.
+    """
+    RECEIVED = "received"
+    PROCESSING = "processing"
+    PROCESSED = "processed"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (RECEIVED, RECEIVED),
+        (PROCESSING, PROCESSING),
+        (PROCESSED, PROCESSED),
+        (FAILED, FAILED),
+    ]
+
+    transaction_id = models.CharField(max_length=255, unique=True)
+    status = models.CharField(
+        max_length=50,
+        choices=STATUS_CHOICES,
+        default=RECEIVED,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+
+    def update_fields(self, **kwargs):
+        for field, value in kwargs.items():
+            if hasattr(self, field):
+                setattr(self, field, value)
+
+        self.save()
+
+    @classmethod
+    def claim(cls, event_id):
+        """
+        Claim a received event for finalization, returns whether it was claimed.
+
+        An event left processing for SIGNING_WEBHOOK_PROCESSING_TIMEOUT seconds
+        belonged to a worker that died and can be claimed again.
+        """
+        stale_before = now() - timedelta(seconds=settings.SIGNING_WEBHOOK_PROCESSING_TIMEOUT)
+        return bool(cls.objects.filter(
+            Q(status=cls.RECEIVED) | Q(status=cls.PROCESSING, updated_at__lt=stale_before),
+            id=event_id,
+        ).update(status=cls.PROCESSING, attempts=F("attempts") + 1, updated_at=now()))
+
+    @classmethod
+    def requeue_stale_events(cls):
+        """Queue again the events whose task was lost or whose worker died. Returns how many were queued."""
+        from edms.documents.tasks import finalize_signing_transaction
+        stale_before = now() - timedelta(seconds=settings.SIGNING_WEBHOOK_PROCESSING_TIMEOUT)
+        event_ids = list(cls.objects.filter(
+            status__in=[cls.RECEIVED, cls.PROCESSING],
+            updated_at__lt=stale_before,
+        ).values_list("id", flat=True))
+        for event_id in event_ids:
+            finalize_signing_transaction.delay(event_id)
+        return len(event_ids)
+
+    @classmethod
+    def record(cls, transaction_id, user):
+        from edms.documents.tasks import finalize_signing_transaction
+        event, created = cls.objects.get_or_create(
+            transaction_id=transaction_id,
+            defaults={"created_by": user},
+        )
+        if not created and not cls.objects.filter(id=event.id, status=cls.FAILED).update(status=cls.RECEIVED):
+            logger.info(f"Duplicate webhook for transaction {transaction_id} ignored")
+            return event
+
+        transaction.on_commit(lambda: finalize_signing_transaction.delay(event.id))
+        return event
+
+
+def get_revision_path(instance, filename):
+    return f"revisions/document-{instance.document_id}/{filename}"
+
+
+class DocumentRevision(BaseModel):
+    """
+    An immutable revision of the signature file of a document.
+
+    Revision 0 is the uploaded file, each signature stores the signed PDF as
+    the next revision under its own key instead of overwriting the previous
+    one, so the whole signing history stays available. The bytes are kept in
+    the local asset cache by content hash, the next signer prepares from there
+    without downloading the file again.
+    """
+    document = models.ForeignKey(
+        "documents.Document",
+        related_name="revisions",
+        on_delete=models.CASCADE,
+    )
+    asset = models.ForeignKey(
+        "assets.Asset",
+        related_name="revisions",
+        on_delete=models.CASCADE,
+    )
+    document_signature = models.ForeignKey(
+        "documents.DocumentSignature",
+        related_name="revisions",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+    )
+    number = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to=get_revision_path, max_length=500)
+    content_hash = models.CharField(max_length=64, db_index=True)
+    size = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['number']
+        constraints = [
+            models.UniqueConstraint(fields=["document", "number"], name="docrevision_document_number_uniq"),
+        ]
+
+    @staticmethod
+    def cache_data(data):
+        """Keep ``data`` in the local asset cache, returns its content hash and size."""
+        with memoryview(data) as view:
+            content_hash = hashlib.sha256(view).hexdigest()
+            LocalAssetCache.put(content_hash, view)
+            return content_hash, view.nbytes
+
+    @classmethod
+    def record_original(cls, document, asset, content_hash, size, user):
+        revision, _ = cls.objects.get_or_create(
+            document=document,
+            number=0,
+            defaults={
+                "asset": asset,
+                "file": asset.file.name,
+                "content_hash": content_hash,
+                "size": size,
+                "created_by": user,
+            },
+        )
+        Document.objects.filter(id=document.id).update(current_revision=revision)
+        document.current_revision = revision
+        return revision
+
+    @classmethod
+    def store(cls, document, asset, data, document_signature, user, s3_client, bucket_name):
+        """Upload the signed PDF ``data``, a file object, as the next revision of ``document``."""
+        number = document.revisions.aggregate(Max("number"))["number__max"]
+        revision = cls(
+            document=document,
+            asset=asset,
+            document_signature=document_signature,
+            number=0 if number is None else number + 1,
+            created_by=user,
+        )
+        with data.getbuffer() as view:
+            revision.content_hash, revision.size = cls.cache_data(view)
+        revision.file.name = get_revision_path(revision, f"{revision.number:04d}-{revision.content_hash[:16]}.pdf")
+        data.seek(0)
+        if not S3FileManager.upload_file_to_s3(
+            data=data,
+            bucket_name=bucket_name,
+            s3_object_name=revision.file.name,
+            s3_client=s3_client,
+            is_object=True
+        ):
+            raise ValueError("Failed to store the signed document.")
+        revision.save()
+        document.update_fields(current_revision=revision, updated_by=user)
+        return revision
+
+    def get_revision_data(self, access_key, secret_key, region_name, bucket_name):
+        return self.read_data(self.file.name, self.content_hash, access_key, secret_key, region_name, bucket_name)
+
+    @staticmethod
+    def read_data(file_key, content_hash, access_key, secret_key, region_name, bucket_name):
+        """Read ``file_key`` through the local cache, ``content_hash`` is None for a file not hashed yet."""
+        data = LocalAssetCache.get(content_hash) if content_hash else None
+        if data is None:
+            data = S3FileManager.get_object_data(
+                bucket_name=bucket_name,
+                file_key=file_key,
+                s3_client=S3FileManager.s3_connection(
+                    aws_access_key_id=access_key,
+                    aws_secret_access_key=secret_key,
+                    region_name=region_name
+                )
+            )
+            if content_hash:
+                LocalAssetCache.put(content_hash, data)
+        return data
@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+class MySignClient:
+    """
+    Pooled HTTP client for the MySign remote signing API.
+
+    Requests go through one keep-alive session per process and kind of call.
+    Idempotent calls (login, certificate and status lookups) are retried with
+    exponential backoff on connection errors, read timeouts and 429/5xx
+    answers. signHash is only retried when the connection could not be
+    established, so a signing request is never sent twice. Every call is
+    timed per endpoint, see ``get_metrics``.
+    """
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    _sessions = {}
+    _metrics = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_session(cls, idempotent):
+        with cls._lock:
+            session = cls._sessions.get(idempotent)
+            if session is None:
+                session = cls._sessions[idempotent] = cls.create_session(idempotent)
+            return session
+
+    @classmethod
+    def create_session(cls, idempotent):
+        if idempotent:
+            retry = Retry(
+                total=settings.MS_MAX_RETRIES,
+                backoff_factor=settings.MS_RETRY_BACKOFF,
+                status_forcelist=cls.RETRY_STATUSES,
+                allowed_methods=None,
+                raise_on_status=False,
+            )
+        else:
+            retry = Retry(
+                total=settings.MS_MAX_RETRIES,
+                connect=settings.MS_MAX_RETRIES,
+                read=0,
+                status=0,
+                other=0,
+                backoff_factor=settings.MS_RETRY_BACKOFF,
+                allowed_methods=None,
+            )
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=settings.MS_POOL_MAXSIZE,
+            max_retries=retry,
+        )
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @classmethod
+    def post(cls, endpoint, url, idempotent=True, **kwargs):
+        start = time.monotonic()
+        status_code = None
+        try:
+            response = cls.get_session(idempotent).post(
+                url,
+                timeout=(settings.MS_CONNECT_TIMEOUT, settings.MS_READ_TIMEOUT),
+                **kwargs
+            )
+            status_code = response.status_code
+            return response
+        finally:
+            cls.record(endpoint, time.monotonic() - start, status_code)
+
+    @classmethod
+    def record(cls, endpoint, duration, status_code):
+        failed = status_code is None or status_code >= 400
+        with cls._lock:
+            metric = cls._metrics.setdefault(
+                endpoint,
+                {"count": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0},
+            )
+            metric["count"] += 1
+            metric["errors"] += int(failed)
+            metric["total_seconds"] += duration
+            metric["max_seconds"] = max(metric["max_seconds"], duration)
+        logger.info(f"MySign {endpoint} {status_code or 'error'} in {duration * 1000:.0f}ms")
+
+    @classmethod
+    def get_metrics(cls):
+        with cls._lock:
+            return {
+                endpoint: {
+                    **metric,
+                    "avg_seconds": metric["total_seconds"] / metric["count"],
+                }
+                for endpoint, metric in cls._metrics.items()
+            }
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+            cls._metrics.clear()
@@ -1,14 +1,18 @@
 import logging
 import os
+from collections import Counter
 import uuid
 
+from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
 
 from edms.assets.models import Asset
 from edms.assets.serializers import AssetSerializer
+from edms.common.pdf_helper import get_signature_fields
+from edms.common.pdf_pool import PdfJobError
 from edms.common.upload_helper import validate_file_type
-from edms.documents.models import Document, DocumentSignature
+from edms.documents.models import Document, DocumentRevision, DocumentSignature, SigningJob
 from edms.documents.models import DocumentReceiver
 from edms.notifications.services import NotificationService
 from edms.organization.models import OrganizationUnit
@@ -52,6 +56,28 @@ class DocumentSignatureSerializer(serializers.ModelSerializer):
         read_only_fields = ["signature_status", "document"]
 
 
+class SigningJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SigningJob
+        fields = ["id", "document", "status", "transaction_id", "batch_id", "error", "created_at", "updated_at"]
+        read_only_fields = fields
+
+
+class DocumentRevisionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentRevision
+        fields = ["id", "number", "document_signature", "content_hash", "size", "created_by", "created_at"]
+        read_only_fields = fields
+
+
+class BatchSignDocumentSerializer(serializers.Serializer):
+    document_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=settings.SIGNING_BATCH_MAX_DOCUMENTS,
+    )
+
+
 class SendDocumentSerializer(serializers.Serializer):
     recipient_type = serializers.ChoiceField(choices=[('user', 'User'), ('organization', 'Organization')])
     recipient_id = serializers.CharField()
@@ -246,9 +272,46 @@ class DocumentSerializer(serializers.ModelSerializer):
         for file in signature_files:
             allowed_extensions = ["pdf"]
             validate_file_type(file, allowed_extensions)
+            try:
+                signature_fields = get_signature_fields(file)
+            except PdfJobError as e:
+                raise serializers.ValidationError({"detail": str(e)})
+            except Exception as e:
+                logger.error("Error: %s", e)
+                raise serializers.ValidationError(
+                    {"detail": "The signature file is not a readable PDF."},
+                )
+            finally:
+                file.seek(0)
+            self.validate_signature_fields(signature_fields, signers_data)
+            data["signature_fields"] = signature_fields
+
+        if not signature_files and self.instance and signers_data:
+            signature_file = Asset.objects.filter(
+                file_type=Asset.SIGNATURE_FILE,
+                document_id=self.instance.id,
+            ).first()
+            if signature_file and signature_file.signature_fields is not None:
+                self.validate_signature_fields(signature_file.signature_fields, signers_data)
 
         return data
 
+    def validate_signature_fields(self, signature_fields, signers_data):
+        # Signers sharing an order sign in parallel, each needs a field of that order.
+        # An order may have more fields than signers, they all belong to its signers.
+        field_orders = Counter(signature_field["order"] for signature_field in signature_fields)
+        signer_orders = Counter(int(signer["order"]) for signer in signers_data)
+        missing_orders = signer_orders - field_orders
+        if missing_orders:
+            raise serializers.ValidationError(
+                {"detail": f"The signature file has no signature field for order(s) {', '.join(map(str, sorted(missing_orders)))}."},
+            )
+        unknown_orders = set(field_orders) - set(signer_orders)
+        if unknown_orders:
+            raise serializers.ValidationError(
+                {"detail": f"The signature file has signature field(s) for order(s) {', '.join(map(str, sorted(unknown_orders)))} without a signer."},
+            )
+
     def create(self, validated_data):
         request = self.context["request"]
         attachment_files = validated_data.pop("attachment_files", [])
@@ -258,6 +321,7 @@ class DocumentSerializer(serializers.ModelSerializer):
         receivers_pks = list(map(int, receivers_ids.split(','))) if receivers_ids else []
         receivers = []
         signers_flow = validated_data.pop("signers_flow", [])
+        signature_fields = validated_data.pop("signature_fields", None)
         attachment_document_ids = validated_data.pop("attachment_document_ids", [])
         attachment_document_ids = list(map(int, attachment_document_ids.split(','))) if attachment_document_ids else []
 
@@ -294,7 +358,7 @@ class DocumentSerializer(serializers.ModelSerializer):
 
         document.associate_assets(attachment_files, Asset.ATTACHMENT)
         document.associate_assets(appendix_files, Asset.APPENDIX)
-        document.associate_assets(signature_files, Asset.SIGNATURE_FILE)
+        document.associate_assets(signature_files, Asset.SIGNATURE_FILE, signature_fields=signature_fields)
         NotificationService.send_notification_to_users(
             sender=request.user,
             receivers=receivers,
@@ -313,6 +377,7 @@ class DocumentSerializer(serializers.ModelSerializer):
         appendix_files = validated_data.pop("appendix_files", [])
         signature_files = validated_data.pop("signature_files", [])
         signers_flow = validated_data.pop("signers_flow", [])
+        signature_fields = validated_data.pop("signature_fields", None)
         _ = validated_data.pop("receivers_ids", [])
         _ = validated_data.pop("document_category", None)
         attachment_document_ids = validated_data.pop("attachment_document_ids", [])
@@ -339,7 +404,7 @@ class DocumentSerializer(serializers.ModelSerializer):
 
         instance.associate_assets(attachment_files, Asset.ATTACHMENT)
         instance.associate_assets(appendix_files, Asset.APPENDIX)
-        instance.associate_assets(signature_files, Asset.SIGNATURE_FILE)
+        instance.associate_assets(signature_files, Asset.SIGNATURE_FILE, signature_fields=signature_fields)
         return instance
 
     def to_representation(self, instance):
@@ -0,0 +1,318 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from botocore.exceptions import ConnectionError as S3ConnectionError
+from botocore.exceptions import HTTPClientError as S3HTTPClientError
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Min
+from django.utils.timezone import now
+
+from edms.assets.models import Asset
+from edms.common.pdf_pool import PdfPoolBusy
+from edms.common.s3_helper import S3FileManager
+from edms.notifications.services import NotificationService
+
+from .locks import DocumentLock, DocumentLocked
+from .models import DocumentSignature, Document, DocumentRevision, SigningJob, SigningSession
+from .signing_utils import MySignHelper
+
+logger = logging.getLogger(__name__)
+
+SIGN_STATUS_MAPPING = {
+    "1": DocumentSignature.SIGNED,
+    "4001": DocumentSignature.TIMEOUT,
+    "4002": DocumentSignature.REJECTED,
+    "4004": DocumentSignature.FAILED,
+    "50000": DocumentSignature.FAILED,
+}
+
+
+class TransientSigningError(Exception):
+    """MySign gave no answer or the transaction is not completed yet, trying again later may succeed."""
+
+
+# Errors a later attempt of the finalization may not run into
+TRANSIENT_SIGNING_ERRORS = (
+    TransientSigningError,
+    DocumentLocked,
+    PdfPoolBusy,
+    requests.ConnectionError,
+    requests.Timeout,
+    S3ConnectionError,
+    S3HTTPClientError,
+)
+
+
+class SigningService:
+    """Finalization of MySign transactions, run by the worker after a webhook delivery."""
+
+    @staticmethod
+    def finalize_transaction(transaction_id, user):
+        # A batch signing shares one transaction between several documents
+        document_signatures = DocumentSignature.objects.select_related("document").filter(
+            transaction_id=transaction_id,
+            signature_status=DocumentSignature.PENDING,
+        )
+        if not document_signatures:
+            return
+
+        sign_status_response = SigningService.get_sign_status(user, transaction_id)
+        SigningService.apply_sign_status(document_signatures, sign_status_response, user)
+
+    @staticmethod
+    def apply_sign_status(document_signatures, sign_status_response, user):
+        errors = []
+        transient = False
+        for document_signature in document_signatures:
+            logger.info(f"document_signature {document_signature.id}")
+            try:
+                # Released after the commit, so the next signer sees the new file and status
+                with DocumentLock.acquire(document_signature.document_id) as lock:
+                    with transaction.atomic():
+                        SigningService.update_signature_status(document_signature, sign_status_response, user)
+                        DocumentLock.extend(lock)
+            except Exception as e:
+                logger.error("Error: %s", e)
+                errors.append(f"{document_signature.document.document_code}: {e}")
+                transient = transient or isinstance(e, TRANSIENT_SIGNING_ERRORS)
+        if errors:
+            # Signatures finalized now are skipped when the transaction is retried
+            raise (TransientSigningError if transient else ValueError)("; ".join(errors))
+
+    @staticmethod
+    def reconcile_pending_signatures():
+        """
+        Settle the signatures whose webhook never came.
+
+        Transactions pending for longer than SIGNING_RECONCILE_AFTER are
+        looked up in MySign concurrently, with one cached token per signer,
+        and finalized like a webhook delivery. Signatures still pending after
+        SIGNING_SESSION_TIMEOUT are then marked TIMEOUT in one update.
+        """
+        stale_before = now() - timedelta(seconds=settings.SIGNING_RECONCILE_AFTER)
+        transactions = {}
+        for document_signature in DocumentSignature.objects.select_related("document", "signer").filter(
+            signature_status=DocumentSignature.PENDING,
+            updated_at__lt=stale_before,
+            transaction_id__isnull=False,
+        ).order_by("updated_at")[:settings.SIGNING_RECONCILE_BATCH_SIZE]:
+            transactions.setdefault(document_signature.transaction_id, []).append(document_signature)
+
+        access_tokens = {}
+        for document_signatures in transactions.values():
+            signer = document_signatures[0].signer
+            if signer.id not in access_tokens:
+                access_tokens[signer.id] = MySignHelper.get_access_token(
+                    user_id=signer.external_user_id,
+                    base_url=settings.MS_BASE_URL,
+                    client_id=settings.MS_CLIENT_ID,
+                    client_secret=settings.MS_CLIENT_SECRET,
+                    profile_id=settings.MS_PROFILE_ID,
+                )
+
+        def get_sign_status(transaction_id, access_token):
+            return MySignHelper.get_sign_status(
+                access_token=access_token,
+                base_url=settings.MS_BASE_URL,
+                transaction_id=transaction_id
+            )
+
+        with ThreadPoolExecutor(max_workers=settings.SIGNING_RECONCILE_CONCURRENCY) as executor:
+            futures = {
+                transaction_id: executor.submit(
+                    get_sign_status,
+                    transaction_id,
+                    access_tokens[document_signatures[0].signer.id],
+                )
+                for transaction_id, document_signatures in transactions.items()
+                if access_tokens[document_signatures[0].signer.id]
+            }
+
+        finalized = 0
+        for transaction_id, future in futures.items():
+            try:
+                sign_status_response = future.result()
+                if not sign_status_response or sign_status_response.get("status") not in SIGN_STATUS_MAPPING:
+                    continue
+                document_signatures = transactions[transaction_id]
+                SigningService.apply_sign_status(document_signatures, sign_status_response, document_signatures[0].signer)
+                finalized += 1
+            except Exception as e:
+                logger.error("Error: %s", e)
+
+        return finalized, SigningService.expire_pending_signatures()
+
+    @staticmethod
+    def expire_pending_signatures():
+        expired_before = now() - timedelta(seconds=settings.SIGNING_SESSION_TIMEOUT)
+        with transaction.atomic():
+            expired_ids = list(
+                DocumentSignature.objects.select_for_update(skip_locked=True).filter(
+                    signature_status=DocumentSignature.PENDING,
+                    updated_at__lt=expired_before,
+                ).values_list("id", flat=True)
+            )
+            if not expired_ids:
+                return 0
+            SigningJob.objects.filter(
+                document_signature_id__in=expired_ids,
+                status=SigningJob.SUBMITTED,
+            ).update(
+                status=SigningJob.FAILED,
+                error="The signing request was not confirmed in time.",
+                updated_at=now(),
+            )
+            return DocumentSignature.objects.filter(id__in=expired_ids).update(
+                signature_status=DocumentSignature.TIMEOUT,
+                updated_at=now(),
+            )
+
+    @staticmethod
+    def get_sign_status(user, transaction_id, refresh=False):
+        access_token = MySignHelper.get_access_token(
+            user_id=user.external_user_id,
+            base_url=settings.MS_BASE_URL,
+            client_id=settings.MS_CLIENT_ID,
+            client_secret=settings.MS_CLIENT_SECRET,
+            profile_id=settings.MS_PROFILE_ID,
+            refresh=refresh,
+        )
+        if not access_token:
+            raise TransientSigningError("Login to MySign failed.")
+
+        sign_status_response = MySignHelper.get_sign_status(
+            access_token=access_token,
+            base_url=settings.MS_BASE_URL,
+            transaction_id=transaction_id
+        )
+        if (not sign_status_response or sign_status_response.get("error")) and not refresh:
+            return SigningService.get_sign_status(user, transaction_id, refresh=True)
+        if not sign_status_response:
+            raise TransientSigningError(f"MySign did not answer the status of transaction {transaction_id}.")
+        return sign_status_response
+
+    @staticmethod
+    @transaction.atomic
+    def update_signature_status(document_signature, sign_status_response, user):
+        status_mapping = SIGN_STATUS_MAPPING
+
+        status_code = sign_status_response.get("status")
+        document_signature = DocumentSignature.objects.select_for_update().select_related("document").get(
+            id=document_signature.id
+        )
+        if document_signature.signature_status != DocumentSignature.PENDING:
+            # Finalized by an earlier delivery of the same transaction
+            return
+        if status_code not in status_mapping:
+            raise TransientSigningError(f"The transaction {document_signature.transaction_id} is not completed yet.")
+
+        signing_session = SigningSession.objects.filter(
+            document_signature=document_signature,
+            transaction_id=document_signature.transaction_id,
+            status=SigningSession.PENDING,
+        ).first()
+        signature_file = Asset.objects.filter(
+            file_type=Asset.SIGNATURE_FILE,
+            document_id=document_signature.document.id,
+        ).first()
+
+        signature_status = status_mapping[status_code]
+        if signature_status == DocumentSignature.SIGNED and signing_session and signature_file and not Asset.objects.filter(
+            id=signature_file.id,
+            version=signing_session.asset_version,
+        ).update(version=F("version") + 1):
+            # Another signature landed after this one was prepared, its byte ranges no longer match the file
+            logger.error(f"Signature file {signature_file.id} changed since transaction {document_signature.transaction_id} was prepared")
+            signature_status = DocumentSignature.FAILED
+
+        document_signature.update_fields(
+            signature_status=signature_status,
+            updated_by=user,
+        )
+        SigningJob.objects.filter(
+            transaction_id=document_signature.transaction_id,
+            document_signature=document_signature,
+            status=SigningJob.SUBMITTED,
+        ).update(
+            status=(
+                SigningJob.SIGNED
+                if signature_status == DocumentSignature.SIGNED
+                else SigningJob.FAILED
+            ),
+        )
+        if signing_session:
+            # Drop the prepared PDF only once the signed one is stored
+            transaction.on_commit(signing_session.close)
+
+        if signature_status == DocumentSignature.SIGNED:
+            signature_data = signing_session.get_signature_data() if signing_session else None
+
+            if signature_data and signature_file:
+                signed_bytes = sign_status_response.get("signatures")[signing_session.index]
+
+                signed_pdf_data = MySignHelper.insert_signature_into_pdf(signature_data, signed_bytes)
+                revision = DocumentRevision.store(
+                    document=document_signature.document,
+                    asset=signature_file,
+                    data=signed_pdf_data,
+                    document_signature=document_signature,
+                    user=user,
+                    s3_client=S3FileManager.s3_connection(
+                        settings.AWS_ACCESS_KEY_ID,
+                        settings.AWS_SECRET_ACCESS_KEY,
+                        settings.AWS_S3_REGION_NAME
+                    ),
+                    bucket_name=settings.AWS_STORAGE_BUCKET_NAME,
+                )
+                # The asset follows the latest revision, earlier ones stay untouched
+                Asset.objects.filter(id=signature_file.id).update(
+                    file=revision.file.name,
+                    content_hash=revision.content_hash,
+                )
+                signature_file.file.name = revision.file.name
+                Asset.schedule_processing([signature_file])
+            else:
+                raise ValueError("There must be exactly 1 signature for this order.")
+            document = document_signature.document
+            if document.signatures.filter(order=document_signature.order).exclude(
+                signature_status=DocumentSignature.SIGNED
+            ).exists():
+                # The rest of the parallel stage has not signed yet
+                return
+
+            next_order = document.signatures.filter(
+                order__gt=document_signature.order
+            ).aggregate(Min("order"))["order__min"]
+
+            if next_order is not None:
+                # TODO Notify the next signer
+                NotificationService.send_notification_to_users(
+                    sender=user,
+                    receivers=document.get_stage_signers(next_order),
+                    title="Yêu cầu ký tài liệu",
+                    body=f"Tài liệu {document_signature.document.document_title} cần được ký. Vui lòng kiểm tra và hoàn tất.",
+                    image=None,
+                    data={
+                        "urgency_status": document_signature.document.urgency_status,
+                        "document_id": str(document_signature.document.id)
+                    }
+                )
+            else:
+                document_signature.document.update_fields(
+                    document_category=Document.COMPLETED_SIGNING_DOCUMENT,
+                    updated_by=user,
+                )
+                NotificationService.send_notification_to_users(
+                    sender=user,
+                    receivers=list(set([signature.signer for signature in document_signature.document.signatures.all()])),
+                    title="Tài liệu đã trình ký thành công",
+                    body=f"Tài liệu {document_signature.document.document_title} đã trình ký thành công.",
+                    image=None,
+                    data={
+                        "urgency_status": document_signature.document.urgency_status,
+                        "document_id": str(document_signature.document.id)
+                    }
+                )
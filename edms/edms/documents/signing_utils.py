@@ -2,17 +2,21 @@ import base64
 import hashlib
 import logging
 import datetime
-import pickle
 from io import BytesIO
 
-import requests
+from django.conf import settings
+from django.core.cache import cache
 from asn1crypto import cms, core, util, x509, algos
 from endesive import pdf
-from pyhanko.pdf_utils import images
+from pyhanko.pdf_utils import content, generic, layout
 from pyhanko.sign.fields import SigSeedSubFilter
 from pyhanko import stamp
-import asyncio
+from types import SimpleNamespace
+from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
 from pyhanko.sign import signers, fields
+
+from edms.common.event_loop import run_sync
+from edms.documents.mysign_client import MySignClient
 logger = logging.getLogger(__name__)
 
 OID_NIST_SHA1 = "1.3.14.3.2.26"
@@ -22,6 +26,57 @@ BASE_URL = "https://remotesigning.viettel.vn:8773"
 BYTES_RESERVED = 16384
 
 
+def write_appearance_xobject(appearance, writer):
+    """Write an appearance of SignatureAppearanceCache to ``writer`` as an image XObject, without re-encoding it."""
+    color_space = appearance["color_space"]
+    if isinstance(color_space, str):
+        color_space = generic.NameObject(f"/{color_space}")
+    else:
+        name, hival, palette = color_space
+        color_space = generic.ArrayObject([
+            generic.NameObject(f"/{name}"),
+            generic.NameObject("/DeviceRGB"),
+            generic.NumberObject(hival),
+            generic.ByteStringObject(palette),
+        ])
+    dict_data = {
+        generic.NameObject("/Type"): generic.NameObject("/XObject"),
+        generic.NameObject("/Subtype"): generic.NameObject("/Image"),
+        generic.NameObject("/Width"): generic.NumberObject(appearance["width"]),
+        generic.NameObject("/Height"): generic.NumberObject(appearance["height"]),
+        generic.NameObject("/ColorSpace"): color_space,
+        generic.NameObject("/BitsPerComponent"): generic.NumberObject(8),
+        generic.NameObject("/Filter"): generic.NameObject("/FlateDecode"),
+    }
+    if appearance["smask"]:
+        dict_data[generic.NameObject("/SMask")] = write_appearance_xobject(appearance["smask"], writer)
+    return writer.add_object(generic.StreamObject(dict_data, encoded_data=appearance["data"]))
+
+
+class AppearanceImage(content.PdfContent):
+    """
+    Stamp background drawn from a pre-built appearance instead of a Pillow image.
+
+    Only the public PdfContent interface is used, the image XObject is
+    written once per writer and referenced from the stamp resources.
+    """
+
+    def __init__(self, appearance):
+        super().__init__(box=layout.BoxConstraints(appearance["width"], appearance["height"]))
+        self.appearance = appearance
+        self.xobject_ref = None
+
+    def render(self):
+        if self.xobject_ref is None or self.xobject_ref.get_pdf_handler() is not self.writer:
+            self.xobject_ref = write_appearance_xobject(self.appearance, self.writer)
+        self.set_resource(
+            category=content.ResourceType.XOBJECT,
+            name=generic.pdf_name("/ImgSignature"),
+            value=self.xobject_ref,
+        )
+        return b"q %g 0 0 %g 0 0 cm /ImgSignature Do Q" % (self.box.width, self.box.height)
+
+
 class Signer:
     def __init__(self, cert, sig, tosign):
         self.cert = cert
@@ -47,35 +102,78 @@ class Signer:
 
 class MySignHelper:
     @staticmethod
-    def get_all_certificates(user_id, base_url, client_id, client_secret, profile_id):
+    def get_access_token(user_id, base_url, client_id, client_secret, profile_id, refresh=False):
+        """
+        Return a MySign access token for ``user_id``, logging in only when the
+        cached token is missing, close to expiry or ``refresh`` is set.
+        """
+        cache_key = f"mysign:access_token:{profile_id}:{user_id}"
+        if not refresh:
+            access_token = cache.get(cache_key)
+            if access_token:
+                return access_token
+
+        response = MySignHelper.login(user_id, base_url, client_id, client_secret, profile_id)
+        if not response or not response.get("access_token"):
+            logger.error("ERROR: Login to Cloud CA")
+            cache.delete(cache_key)
+            return None
+
+        timeout = int(response.get("expires_in") or settings.MS_TOKEN_DEFAULT_TTL) - settings.MS_TOKEN_EXPIRY_MARGIN
+        if timeout > 0:
+            cache.set(cache_key, response["access_token"], timeout=timeout)
+        return response["access_token"]
+
+    @staticmethod
+    def invalidate_user_cache(user_id, profile_id):
+        cache.delete_many([
+            f"mysign:access_token:{profile_id}:{user_id}",
+            f"mysign:certificates:{profile_id}:{user_id}",
+        ])
+
+    @staticmethod
+    def get_all_certificates(user_id, base_url, client_id, client_secret, profile_id, refresh=False):
         cert_list = {}
         access_token = ""
+        cache_key = f"mysign:certificates:{profile_id}:{user_id}"
         try:
             # Step 1: Login to Cloud CA
-            response = MySignHelper.login(user_id, base_url, client_id, client_secret, profile_id)
-            if not response or not response.get("access_token"):
-                logger.error("ERROR: Login to Cloud CA")
-                return cert_list, access_token
+            access_token = MySignHelper.get_access_token(
+                user_id, base_url, client_id, client_secret, profile_id, refresh=refresh
+            )
+            if not access_token:
+                return cert_list, ""
+
+            if not refresh:
+                cached_cert_list = cache.get(cache_key)
+                if cached_cert_list:
+                    return cached_cert_list, access_token
 
-            access_token = response["access_token"]
             credentials_response = MySignHelper.get_credentials_list(client_id, client_secret, profile_id, user_id, access_token, base_url)
+            if credentials_response is not None and credentials_response.status_code == 401 and not refresh:
+                return MySignHelper.get_all_certificates(
+                    user_id, base_url, client_id, client_secret, profile_id, refresh=True
+                )
             if not credentials_response or credentials_response.status_code == 400:
                 logger.error("ERROR: Get Credentials list: %s", credentials_response.json().get("error_description"))
                 return cert_list, access_token
 
             for item in credentials_response.json():
                 cert_list[item["credential_id"]] = item["cert"]
+            if cert_list:
+                cache.set(cache_key, cert_list, timeout=settings.MS_CERTIFICATES_CACHE_TIMEOUT)
             return cert_list, access_token
         except Exception as e:
             logger.error("Error: %s", e)
         return cert_list, access_token
 
     @staticmethod
-    def sign_hash(hash_list, document_id, document_name, client_id, client_secret, credential_id, base_url, access_token):
+    def sign_hash(hash_list, document_id, document_name, client_id, client_secret, credential_id, base_url, access_token, documents=None):
         try:
             # Step 4: Get SAD
             num_signatures = len(hash_list)
-            documents = [{"document_id": document_id, "document_name": document_name} for _ in range(num_signatures)]
+            if documents is None:
+                documents = [{"document_id": document_id, "document_name": document_name} for _ in range(num_signatures)]
 
             # Step 5: Sign hash
             hash_algo = OID_NIST_SHA1 if len(hash_list[0]) == 28 else OID_NIST_SHA256
@@ -102,7 +200,7 @@ class MySignHelper:
                 "client_secret": client_secret,
                 "profile_id": profile_id
             }
-            response = requests.post(url, json=request_data).json()
+            response = MySignClient.post("login", url, json=request_data).json()
             return response
         except Exception as e:
             logger.error("Error: %s", e)
@@ -117,7 +215,7 @@ class MySignHelper:
                 "client_secret": client_secret,
                 "grant_type": "client_credentials"
             }
-            response = requests.post(url, data=request_data)
+            response = MySignClient.post("authenticate", url, data=request_data)
             return response
         except Exception as e:
             logger.error("Error: %s", e)
@@ -137,7 +235,7 @@ class MySignHelper:
                 "authInfo": True
             }
             headers = {"Authorization": f"Bearer {access_token}"}
-            response = requests.post(url, json=request_data, headers=headers)
+            response = MySignClient.post("certificates_info", url, json=request_data, headers=headers)
             return response
         except Exception as e:
             logger.error("Error: %s", e)
@@ -151,7 +249,7 @@ class MySignHelper:
                 "transactionId": transaction_id,
             }
             headers = {"Authorization": f"Bearer {access_token}"}
-            response = requests.post(url, json=request_data, headers=headers).json()
+            response = MySignClient.post("requests_status", url, json=request_data, headers=headers).json()
             return response
         except Exception as e:
             logger.error("Error: %s", e)
@@ -173,7 +271,9 @@ class MySignHelper:
                 "async": 2
             }
             headers = {"Authorization": f"Bearer {access_token}"}
-            response = requests.post(url, json=request_data, headers=headers).json()
+            response = MySignClient.post(
+                "sign_hash", url, idempotent=False, json=request_data, headers=headers
+            ).json()
             return response
         except Exception as e:
             logger.error("Error: %s", e)
@@ -343,7 +443,13 @@ class MySignHelper:
         )
 
     @staticmethod
-    def prepare_document(file_data, sig_name, sigpage, signature_box, signature_img, cert, signer):
+    def prepare_document(file_data, sig_name, sigpage, signature_box, signature_appearance, cert, signer):
+        return run_sync(MySignHelper.async_prepare_document(
+            file_data, sig_name, sigpage, signature_box, signature_appearance, cert, signer
+        ))
+
+    @staticmethod
+    async def async_prepare_document(file_data, sig_name, sigpage, signature_box, signature_appearance, cert, signer):
         ext_signer = MySignHelper.instantiate_external_signer(bytes(256), cert)
         pdf_signer = signers.PdfSigner(
             signature_meta=signers.PdfSignatureMetadata(
@@ -360,28 +466,31 @@ class MySignHelper:
                 box=signature_box,
             ),
             stamp_style=stamp.TextStampStyle(
-                background=images.PdfImage(signature_img),
+                background=AppearanceImage(signature_appearance),
                 stamp_text="",
                 background_opacity=1,
                 border_width=0
             ),
             signer=ext_signer,
         )
-        prep_digest, tbs_document, output = asyncio.run(pdf_signer.async_digest_doc_for_signing(
+        prep_digest, tbs_document, output = await pdf_signer.async_digest_doc_for_signing(
             pdf_out=file_data,
             bytes_reserved=BYTES_RESERVED
-        ))
+        )
         psi = tbs_document.post_sign_instructions
-        signed_attrs = asyncio.run(ext_signer.signed_attrs(
+        signed_attrs = await ext_signer.signed_attrs(
             data_digest=prep_digest.document_digest,
             digest_algorithm='sha256',
             use_pades=True,
-        ))
+        )
         return prep_digest, psi, signed_attrs, output
 
     @staticmethod
     def insert_signature_into_pdf(signature_data, signed_bytes):
-        signature_data = pickle.loads(signature_data)
+        return run_sync(MySignHelper.async_insert_signature_into_pdf(signature_data, signed_bytes))
+
+    @staticmethod
+    async def async_insert_signature_into_pdf(signature_data, signed_bytes):
         prep_digest = signature_data['prep_digest']
         signed_attrs = cms.CMSAttributes.load(signature_data['signed_attrs'])
         psi = signature_data['psi']
@@ -389,14 +498,37 @@ class MySignHelper:
         cert = MySignHelper.get_cert509(signature_data['cert'])
         signature = base64.b64decode(signed_bytes)
         ext_signer = MySignHelper.instantiate_external_signer(signature, cert)
-        content_info = asyncio.run(ext_signer.async_sign_prescribed_attributes(
+        content_info = await ext_signer.async_sign_prescribed_attributes(
             digest_algorithm="sha256",
             signed_attrs=signed_attrs,
-        ))
-        asyncio.run(signers.pdf_signer.PdfTBSDocument.async_finish_signing(
+        )
+        await signers.pdf_signer.PdfTBSDocument.async_finish_signing(
             output,
             prep_digest,
             content_info,
             post_sign_instr=psi,
-        ))
+        )
         return output
+
+
+def prepare_document_job(pdf_data, sig_name, sigpage, signature_box, signature_appearance, cert_data, signer_name, signer_email):
+    """
+    Process pool entry point for MySignHelper.prepare_document.
+
+    Takes and returns plain values only: the PDF and the certificate as bytes
+    and base64, the stamp as a SignatureAppearanceCache appearance, the signed
+    attributes DER encoded and the prepared PDF as bytes. A BytesIO over bytes
+    shares the buffer until it is written to, and getvalue of the finished
+    output hands its buffer over, so neither the input nor the output is
+    copied here.
+    """
+    prep_digest, psi, signed_attrs, output = MySignHelper.prepare_document(
+        file_data=IncrementalPdfFileWriter(BytesIO(pdf_data)),
+        sig_name=sig_name,
+        sigpage=sigpage,
+        signature_box=signature_box,
+        signature_appearance=signature_appearance,
+        cert=MySignHelper.get_cert509(cert_data),
+        signer=SimpleNamespace(name=signer_name, email=signer_email),
+    )
+    return prep_digest, psi, signed_attrs.dump(), output.getvalue()
@@ -0,0 +1,187 @@
+import logging
+
+from celery import shared_task
+from django.conf import settings
+from django.utils.timezone import now
+
+from edms.notifications.services import NotificationService
+
+from .models import Document, SigningJob, SigningSession, SigningWebhookEvent
+from .services import TRANSIENT_SIGNING_ERRORS, SigningService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task()
+def sign_document(job_id):
+    """
+    Run a queued SigningJob: prepare the signature and send it to MySign.
+
+    The job is claimed with a conditional update, so a redelivered task
+    never signs twice.
+    """
+    run_signing_jobs([job_id])
+
+
+@shared_task()
+def sign_document_batch(batch_id):
+    """Run the queued SigningJobs of a batch in one MySign transaction."""
+    run_signing_jobs(
+        SigningJob.objects.filter(batch_id=batch_id).values_list("id", flat=True)
+    )
+
+
+@shared_task(
+    bind=True,
+    autoretry_for=TRANSIENT_SIGNING_ERRORS,
+    max_retries=settings.SIGNING_WEBHOOK_MAX_RETRIES,
+    retry_backoff=settings.SIGNING_WEBHOOK_RETRY_BACKOFF,
+    retry_jitter=True,
+)
+def finalize_signing_transaction(self, event_id):
+    """
+    Finalize the MySign transaction of a webhook delivery.
+
+    The event is claimed with a conditional update, so concurrent or
+    redelivered tasks for the same transaction do nothing. A transient
+    failure, such as MySign or S3 being unavailable, is retried with
+    backoff: the event goes back to received until the last attempt marks
+    it failed. Any other failure marks it failed at once. Signatures
+    finalized by an earlier attempt are skipped.
+    """
+    if not SigningWebhookEvent.claim(event_id):
+        return
+    event = SigningWebhookEvent.objects.select_related("created_by").get(id=event_id)
+
+    try:
+        SigningService.finalize_transaction(event.transaction_id, event.created_by)
+    except TRANSIENT_SIGNING_ERRORS as e:
+        logger.error("Error: %s", e)
+        retrying = self.request.retries < self.max_retries
+        event.update_fields(
+            status=SigningWebhookEvent.RECEIVED if retrying else SigningWebhookEvent.FAILED,
+            error=str(e),
+        )
+        raise
+    except Exception as e:
+        # Another attempt would fail the same way
+        logger.error("Error: %s", e)
+        event.update_fields(status=SigningWebhookEvent.FAILED, error=str(e))
+        return
+    event.update_fields(status=SigningWebhookEvent.PROCESSED, error=None)
+
+
+@shared_task()
+def reconcile_pending_signatures():
+    """Finalize or time out the signatures whose MySign webhook never arrived."""
+    requeued = SigningWebhookEvent.requeue_stale_events()
+    if requeued:
+        logger.info(f"Requeued {requeued} stale webhook events")
+    finalized, expired = SigningService.reconcile_pending_signatures()
+    if finalized or expired:
+        logger.info(f"Reconciled {finalized} signing transactions, {expired} signatures timed out")
+
+
+@shared_task()
+def recover_stale_signing_jobs():
+    """Requeue the signing jobs whose task was lost and fail the ones whose worker died."""
+    requeued, failed = SigningJob.recover_stale_jobs()
+    if requeued or failed:
+        logger.info(f"Requeued {requeued} stale signing jobs, {failed} interrupted jobs failed")
+
+
+@shared_task()
+def expire_signing_sessions():
+    """Close the signing sessions that were never confirmed and delete their prepared PDFs."""
+    expired = SigningSession.expire_sessions()
+    if expired:
+        logger.info(f"Expired {expired} signing sessions")
+
+
+def run_signing_jobs(job_ids):
+    claimed_ids = [
+        job_id for job_id in job_ids
+        if SigningJob.objects.filter(id=job_id, status=SigningJob.QUEUED).update(
+            status=SigningJob.PROCESSING,
+            updated_at=now(),
+        )
+    ]
+    if not claimed_ids:
+        return
+    jobs = list(SigningJob.objects.select_related("document", "created_by").filter(id__in=claimed_ids))
+    user = jobs[0].created_by
+
+    try:
+        sign_hash_response, errors = Document.sign_documents(
+            documents=[job.document for job in jobs],
+            user=user,
+            client_id=settings.MS_CLIENT_ID,
+            client_secret=settings.MS_CLIENT_SECRET,
+            base_url=settings.MS_BASE_URL,
+            profile_id=settings.MS_PROFILE_ID,
+            access_key=settings.AWS_ACCESS_KEY_ID,
+            secret_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_S3_REGION_NAME,
+            bucket_name=settings.AWS_STORAGE_BUCKET_NAME,
+        )
+    except Exception as e:
+        logger.error("Error: %s", e)
+        sign_hash_response = None
+        errors = {job.document_id: str(e) for job in jobs}
+
+    for job in jobs:
+        if job.document_id in errors:
+            job.update_fields(
+                status=SigningJob.FAILED,
+                error=errors[job.document_id],
+                updated_by=user,
+            )
+        else:
+            job.update_fields(
+                status=SigningJob.SUBMITTED,
+                transaction_id=sign_hash_response.get("transactionId"),
+                updated_by=user,
+            )
+
+    try:
+        notify_signing_jobs(user, jobs)
+    except Exception as e:
+        logger.error("Error: %s", e)
+
+
+def notify_signing_jobs(user, jobs):
+    submitted = [job for job in jobs if job.status == SigningJob.SUBMITTED]
+    if len(jobs) == 1:
+        job = jobs[0]
+        if submitted:
+            title = "Yêu cầu ký đã được gửi"
+            body = f"Yêu cầu ký tài liệu {job.document.document_title} đã được gửi. Vui lòng xác nhận trên ứng dụng MySign."
+        else:
+            title = "Ký tài liệu thất bại"
+            body = f"Không thể ký tài liệu {job.document.document_title}. Vui lòng thử lại."
+        data = {
+            "document_id": str(job.document_id),
+            "signing_job_id": str(job.id),
+            "status": job.status,
+        }
+    else:
+        if submitted:
+            title = "Yêu cầu ký đã được gửi"
+            body = f"Yêu cầu ký {len(submitted)}/{len(jobs)} tài liệu đã được gửi. Vui lòng xác nhận trên ứng dụng MySign."
+        else:
+            title = "Ký tài liệu thất bại"
+            body = f"Không thể ký {len(jobs)} tài liệu. Vui lòng thử lại."
+        data = {
+            "batch_id": str(jobs[0].batch_id),
+            "submitted": str(len(submitted)),
+            "failed": str(len(jobs) - len(submitted)),
+        }
+
+    NotificationService.send_notification_to_users(
+        sender=user,
+        receivers=[user],
+        title=title,
+        body=body,
+        image=None,
+        data=data,
+    )
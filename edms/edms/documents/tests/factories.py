@@ -0,0 +1,46 @@
+from factory import Faker
+from factory import SelfAttribute
+from factory import Sequence
+from factory import SubFactory
+from factory.django import DjangoModelFactory
+
+from edms.documents.models import Document
+from edms.documents.models import DocumentSignature
+from edms.documents.models import SigningJob
+from edms.users.tests.factories import UserFactory
+
+
+class DocumentFactory(DjangoModelFactory):
+    document_code = Sequence(lambda n: f"DOC-{n}")
+    document_title = Faker("sentence")
+    document_summary = Faker("paragraph")
+    urgency_status = "normal"
+    document_form = "report"
+    security_type = "normal"
+    document_processing_deadline_at = 0
+    publish_type = "internal"
+    document_number_reference_code = "TEST"
+    sector = "test"
+    processing_status = "processing"
+    document_category = Document.IN_PROGRESS_SIGNING_DOCUMENT
+
+    class Meta:
+        model = Document
+
+
+class DocumentSignatureFactory(DjangoModelFactory):
+    document = SubFactory(DocumentFactory)
+    signer = SubFactory(UserFactory)
+    order = 1
+    signature_status = DocumentSignature.UNSIGNED
+
+    class Meta:
+        model = DocumentSignature
+
+
+class SigningJobFactory(DjangoModelFactory):
+    document_signature = SubFactory(DocumentSignatureFactory)
+    document = SelfAttribute("document_signature.document")
+
+    class Meta:
+        model = SigningJob
@@ -0,0 +1,75 @@
+import threading
+
+import pytest
+from redis.exceptions import LockError
+
+from edms.documents.locks import DocumentLock
+from edms.documents.locks import DocumentLocked
+
+
+class ExpiredLock:
+    """A Redis lock whose lease ran out."""
+
+    def release(self):
+        raise LockError("Cannot release an unlocked lock")
+
+    def extend(self, additional_time, replace_ttl=False):
+        raise LockError("Cannot extend a lock that's no longer owned")
+
+
+@pytest.fixture(autouse=True)
+def _lock_wait(settings):
+    settings.SIGNING_LOCK_WAIT = 0
+
+
+def acquire_elsewhere(document_id):
+    """Try to lock ``document_id`` from another thread, returns the error if it failed."""
+    errors = []
+
+    def acquire():
+        try:
+            with DocumentLock.acquire(document_id):
+                pass
+        except DocumentLocked as e:
+            errors.append(str(e))
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    thread.join()
+    return errors[0] if errors else None
+
+
+def test_locked_document_cannot_be_locked_again():
+    with DocumentLock.acquire(1):
+        assert "being signed by someone else" in acquire_elsewhere(1)
+        assert acquire_elsewhere(2) is None
+    assert acquire_elsewhere(1) is None
+
+
+def test_acquire_many_reports_the_documents_it_could_not_lock():
+    with DocumentLock.acquire(2):
+        errors = []
+
+        def acquire_many():
+            with DocumentLock.acquire_many([3, 1, 2]) as (locks, lock_errors):
+                errors.append((sorted(locks), lock_errors))
+
+        thread = threading.Thread(target=acquire_many)
+        thread.start()
+        thread.join()
+
+    [(locked, lock_errors)] = errors
+    assert locked == [1, 3]
+    assert list(lock_errors) == [2]
+
+
+def test_lost_lease_fails_the_release():
+    with pytest.raises(ValueError, match="expired"):
+        DocumentLock.release(ExpiredLock(), 1)
+    # Already failing, the original error is kept
+    DocumentLock.release(ExpiredLock(), 1, strict=False)
+
+
+def test_lost_lease_fails_the_extension():
+    with pytest.raises(ValueError, match="expired"):
+        DocumentLock.extend(ExpiredLock())
@@ -0,0 +1,243 @@
+import io
+from datetime import timedelta
+
+import pytest
+from django.core.files.base import ContentFile
+from django.db import IntegrityError
+from django.db import transaction
+from django.utils.timezone import now
+
+from edms.assets.models import Asset
+from edms.common.asset_cache import LocalAssetCache
+from edms.common.s3_helper import S3FileManager
+from edms.documents import tasks
+from edms.documents.models import DocumentRevision
+from edms.documents.models import DocumentSignature
+from edms.documents.models import SigningJob
+from edms.documents.models import SigningSession
+from edms.documents.models import SigningWebhookEvent
+from edms.documents.tests.factories import DocumentSignatureFactory
+from edms.documents.tests.factories import SigningJobFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def queued_tasks(monkeypatch):
+    """Record the signing tasks sent to the broker instead of running them."""
+    sent = []
+    monkeypatch.setattr(tasks.sign_document, "delay", lambda job_id: sent.append(("job", job_id)))
+    monkeypatch.setattr(tasks.sign_document_batch, "delay", lambda batch_id: sent.append(("batch", batch_id)))
+    return sent
+
+
+def make_stale(queryset, seconds):
+    queryset.update(updated_at=now() - timedelta(seconds=seconds))
+
+
+def test_submit_rejects_a_signature_already_in_progress(user):
+    document_signature = DocumentSignatureFactory(signer=user)
+
+    job = SigningJob.submit(document_signature.document, user)
+    with pytest.raises(ValueError, match="already in progress"):
+        SigningJob.submit(document_signature.document, user)
+
+    assert list(SigningJob.objects.values_list("id", flat=True)) == [job.id]
+
+
+def test_submit_batch_rejects_a_signature_already_in_progress(user):
+    document_signature = DocumentSignatureFactory(signer=user)
+    SigningJob.submit(document_signature.document, user)
+
+    with pytest.raises(ValueError, match="already in progress"):
+        SigningJob.submit_batch([document_signature.document], user)
+    assert SigningJob.objects.count() == 1
+
+
+def test_one_active_job_per_signature_is_enforced_by_the_database(user):
+    document_signature = DocumentSignatureFactory(signer=user)
+    SigningJobFactory(document_signature=document_signature)
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        SigningJobFactory(document_signature=document_signature)
+
+    # Finished jobs do not count, the signer may submit again
+    SigningJob.objects.update(status=SigningJob.FAILED)
+    SigningJobFactory(document_signature=document_signature)
+
+
+def test_recover_stale_jobs(settings, queued_tasks):
+    settings.SIGNING_JOB_STALE_AFTER = 600
+    queued = SigningJobFactory()
+    running = SigningJobFactory(status=SigningJob.PROCESSING)
+    fresh = SigningJobFactory()
+    make_stale(SigningJob.objects.exclude(id=fresh.id), 601)
+
+    assert SigningJob.recover_stale_jobs() == (1, 1)
+
+    queued.refresh_from_db()
+    running.refresh_from_db()
+    assert queued.status == SigningJob.QUEUED
+    assert running.status == SigningJob.FAILED
+    assert queued_tasks == [("job", str(queued.id))]
+    # A requeued job is not stale again until another SIGNING_JOB_STALE_AFTER passes
+    assert SigningJob.recover_stale_jobs() == (0, 0)
+
+
+def test_recover_stale_jobs_requeues_a_batch_once(settings, queued_tasks, user):
+    settings.SIGNING_JOB_STALE_AFTER = 600
+    documents = [DocumentSignatureFactory(signer=user).document for _ in range(2)]
+    batch_id, _ = SigningJob.submit_batch(documents, user)
+    make_stale(SigningJob.objects.all(), 601)
+
+    assert SigningJob.recover_stale_jobs() == (2, 0)
+    assert queued_tasks == [("batch", str(batch_id))]
+
+
+def test_webhook_event_is_claimed_once(settings, user):
+    settings.SIGNING_WEBHOOK_PROCESSING_TIMEOUT = 600
+    event = SigningWebhookEvent.objects.create(transaction_id="transaction", created_by=user)
+
+    assert SigningWebhookEvent.claim(event.id)
+    assert not SigningWebhookEvent.claim(event.id)
+
+    # The worker holding the event died
+    make_stale(SigningWebhookEvent.objects.filter(id=event.id), 601)
+    assert SigningWebhookEvent.claim(event.id)
+
+    event.refresh_from_db()
+    assert event.status == SigningWebhookEvent.PROCESSING
+    assert event.attempts == 2
+
+
+def test_parallel_signer_is_not_blocked_by_a_pending_signature_of_another_field(user):
+    pending = DocumentSignatureFactory(signature_status=DocumentSignature.PENDING)
+    document_signature = DocumentSignatureFactory(document=pending.document, signer=user)
+
+    assert pending.document.get_signature_to_sign(user) == document_signature
+
+
+@pytest.fixture()
+def s3(monkeypatch, settings, tmp_path):
+    """Keep the uploaded objects in a dict instead of S3, and record the downloads."""
+    settings.ASSET_CACHE_DIR = str(tmp_path / "cache")
+    monkeypatch.setattr(LocalAssetCache, "_sizes", {})
+    objects = {}
+    downloads = []
+
+    def upload_file_to_s3(data, bucket_name, s3_object_name, s3_client, is_object=False):
+        objects[s3_object_name] = data.read()
+        return True
+
+    def get_object_data(bucket_name, file_key, s3_client):
+        downloads.append(file_key)
+        return objects[file_key]
+
+    monkeypatch.setattr(S3FileManager, "s3_connection", staticmethod(lambda **kwargs: None))
+    monkeypatch.setattr(S3FileManager, "upload_file_to_s3", staticmethod(upload_file_to_s3))
+    monkeypatch.setattr(S3FileManager, "get_object_data", staticmethod(get_object_data))
+    return objects, downloads
+
+
+def store_revision(document_signature, data):
+    asset = Asset.objects.create(
+        document=document_signature.document,
+        file=ContentFile(b"%PDF-1.7", name="document.pdf"),
+        size=8,
+        mime_type="application/pdf",
+        asset_name="document.pdf",
+        file_type=Asset.SIGNATURE_FILE,
+    )
+    return DocumentRevision.store(
+        document=document_signature.document,
+        asset=asset,
+        data=io.BytesIO(data),
+        document_signature=document_signature,
+        user=document_signature.signer,
+        s3_client=None,
+        bucket_name="bucket",
+    )
+
+
+def read_revision(revision):
+    return revision.get_revision_data("key", "secret", "region", "bucket")
+
+
+def test_signed_revision_is_read_without_downloading(s3):
+    objects, downloads = s3
+    document_signature = DocumentSignatureFactory()
+
+    revision = store_revision(document_signature, b"%PDF-signed")
+
+    document_signature.document.refresh_from_db()
+    assert document_signature.document.current_revision == revision
+    assert objects == {revision.file.name: b"%PDF-signed"}
+    # The next signer prepares from the local copy
+    assert read_revision(revision) == b"%PDF-signed"
+    assert downloads == []
+
+
+def test_revision_missing_from_the_cache_is_downloaded_once(s3, settings, tmp_path):
+    objects, downloads = s3
+    revision = store_revision(DocumentSignatureFactory(), b"%PDF-signed")
+    # Another host, with its own cache
+    settings.ASSET_CACHE_DIR = str(tmp_path / "other")
+
+    assert read_revision(revision) == b"%PDF-signed"
+    assert read_revision(revision) == b"%PDF-signed"
+    assert downloads == [revision.file.name]
+
+
+PREPARED = {
+    "asset_version": 3,
+    "prep_digest": {"digest": "digest"},
+    "psi": {"instructions": "instructions"},
+    "signed_attrs": b"attributes",
+    "output_handle": b"%PDF-prepared",
+}
+
+
+def test_signing_session_keeps_the_prepared_signature(user, django_capture_on_commit_callbacks):
+    document_signature = DocumentSignatureFactory(signer=user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        SigningSession.open(document_signature, "transaction", 0, PREPARED, "certificate", user)
+
+    # Read back by the worker finalizing the webhook
+    session = SigningSession.objects.get(transaction_id="transaction")
+    assert session.asset_version == 3
+    assert session.get_signature_data() == {
+        "prep_digest": {"digest": "digest"},
+        "psi": {"instructions": "instructions"},
+        "signed_attrs": b"attributes",
+        "output_handle": b"%PDF-prepared",
+        "cert": "certificate",
+    }
+
+
+def test_rolled_back_signing_session_leaves_no_file(user, django_capture_on_commit_callbacks):
+    document_signature = DocumentSignatureFactory(signer=user)
+
+    with django_capture_on_commit_callbacks(execute=False) as callbacks:
+        session = SigningSession.open(document_signature, "transaction", 0, PREPARED, "certificate", user)
+
+    assert len(callbacks) == 1
+    assert not session.prepared_file.storage.exists(session.prepared_file.name)
+
+
+def test_expire_sessions_deletes_the_prepared_files(user, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        expired = SigningSession.open(DocumentSignatureFactory(), "expired", 0, PREPARED, "certificate", user)
+        pending = SigningSession.open(DocumentSignatureFactory(), "pending", 0, PREPARED, "certificate", user)
+    SigningSession.objects.filter(id=expired.id).update(expires_at=now())
+    storage, prepared_name = expired.prepared_file.storage, expired.prepared_file.name
+
+    assert SigningSession.expire_sessions() == 1
+
+    expired.refresh_from_db()
+    pending.refresh_from_db()
+    assert expired.status == SigningSession.EXPIRED
+    assert not expired.prepared_file
+    assert not storage.exists(prepared_name)
+    assert pending.status == SigningSession.PENDING
+    assert pending.prepared_file.storage.exists(pending.prepared_file.name)
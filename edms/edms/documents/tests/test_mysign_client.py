@@ -0,0 +1,79 @@
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+from edms.documents.mysign_client import MySignClient
+
+
+@pytest.fixture()
+def mysign_server():
+    """A local HTTP server answering with the status codes queued in ``statuses``, then 200."""
+    statuses = []
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            requests_seen.append(self.path)
+            self.send_response(statuses.pop(0) if statuses else 200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.statuses = statuses
+    server.requests_seen = requests_seen
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def _client(settings):
+    settings.MS_MAX_RETRIES = 2
+    settings.MS_RETRY_BACKOFF = 0
+    MySignClient.reset()
+    yield
+    MySignClient.reset()
+
+
+def test_idempotent_call_is_retried(mysign_server):
+    mysign_server.statuses.extend([503, 502])
+
+    response = MySignClient.post("certificates", f"{mysign_server.url}/certificates", json={})
+
+    assert response.status_code == 200
+    assert len(mysign_server.requests_seen) == 3
+
+
+def test_sign_hash_is_sent_once(mysign_server):
+    mysign_server.statuses.append(503)
+
+    response = MySignClient.post("signHash", f"{mysign_server.url}/signHash", idempotent=False, json={})
+
+    assert response.status_code == 503
+    assert len(mysign_server.requests_seen) == 1
+
+
+def test_calls_are_timed_per_endpoint(mysign_server):
+    mysign_server.statuses.extend([503, 503, 503])
+    MySignClient.post("status", f"{mysign_server.url}/status", json={})
+    MySignClient.post("status", f"{mysign_server.url}/status", json={})
+    with pytest.raises(requests.ConnectionError):
+        MySignClient.post("login", "http://127.0.0.1:1/login", json={})
+
+    metrics = MySignClient.get_metrics()
+
+    assert metrics["status"]["count"] == 2
+    assert metrics["status"]["errors"] == 1
+    assert (metrics["login"]["count"], metrics["login"]["errors"]) == (1, 1)
+    assert metrics["status"]["avg_seconds"] <= metrics["status"]["max_seconds"]
@@ -0,0 +1,38 @@
+import pytest
+from rest_framework import serializers
+
+from edms.documents.serializers import DocumentSerializer
+
+
+def make_fields(*orders):
+    return [{"order": order} for order in orders]
+
+
+def make_signers(*orders):
+    return [{"order": str(order)} for order in orders]
+
+
+@pytest.mark.parametrize(
+    ("field_orders", "signer_orders"),
+    [
+        ((1, 2), (1, 2)),
+        # Extra fields of an order belong to its signer
+        ((1, 1, 2), (1, 2)),
+        ((1, 1), (1, 1)),
+    ],
+)
+def test_signature_fields_match_the_signers(field_orders, signer_orders):
+    DocumentSerializer().validate_signature_fields(make_fields(*field_orders), make_signers(*signer_orders))
+
+
+@pytest.mark.parametrize(
+    ("field_orders", "signer_orders", "message"),
+    [
+        # A parallel stage needs a field per signer
+        ((1, 2), (1, 1, 2), "no signature field for order"),
+        ((1, 2, 3), (1, 2), "without a signer"),
+    ],
+)
+def test_signature_fields_without_a_signer_or_field_are_rejected(field_orders, signer_orders, message):
+    with pytest.raises(serializers.ValidationError, match=message):
+        DocumentSerializer().validate_signature_fields(make_fields(*field_orders), make_signers(*signer_orders))
@@ -0,0 +1,139 @@
+import pickle
+from datetime import timedelta
+
+import pytest
+from django.core.files.base import ContentFile
+from django.utils.timezone import now
+
+from edms.assets.models import Asset
+from edms.documents.models import DocumentSignature
+from edms.documents.models import SigningJob
+from edms.documents.models import SigningSession
+from edms.documents.services import SigningService
+from edms.documents.signing_utils import MySignHelper
+from edms.documents.tests.factories import DocumentSignatureFactory
+from edms.documents.tests.factories import SigningJobFactory
+
+pytestmark = pytest.mark.django_db
+
+SIGNED_RESPONSE = {"status": "1", "signatures": ["c2lnbmF0dXJl"]}
+
+
+def make_pending(seconds, **kwargs):
+    """A signature sent to MySign ``seconds`` ago, with its submitted job."""
+    document_signature = DocumentSignatureFactory(signature_status=DocumentSignature.PENDING, **kwargs)
+    SigningJobFactory(
+        document_signature=document_signature,
+        status=SigningJob.SUBMITTED,
+        transaction_id=document_signature.transaction_id,
+    )
+    DocumentSignature.objects.filter(id=document_signature.id).update(updated_at=now() - timedelta(seconds=seconds))
+    return document_signature
+
+
+@pytest.fixture()
+def mysign(monkeypatch, settings):
+    """Answer the status lookups from ``statuses`` instead of asking MySign."""
+    settings.SIGNING_RECONCILE_AFTER = 300
+    settings.SIGNING_SESSION_TIMEOUT = 3600
+    calls = {"logins": [], "statuses": {}}
+
+    def get_access_token(user_id, **kwargs):
+        calls["logins"].append(user_id)
+        return f"token-{user_id}"
+
+    monkeypatch.setattr(MySignHelper, "get_access_token", staticmethod(get_access_token))
+    monkeypatch.setattr(
+        MySignHelper,
+        "get_sign_status",
+        staticmethod(lambda access_token, base_url, transaction_id: calls["statuses"].get(transaction_id)),
+    )
+    return calls
+
+
+def test_reconcile_finalizes_the_completed_transactions(mysign, user):
+    user.external_user_id = "signer"
+    user.save()
+    rejected = make_pending(600, signer=user, transaction_id="rejected")
+    waiting = make_pending(600, signer=user, transaction_id="waiting")
+    fresh = make_pending(60, signer=user, transaction_id="fresh")
+    mysign["statuses"] = {"rejected": {"status": "4002"}, "waiting": {"status": "0"}, "fresh": {"status": "4002"}}
+
+    assert SigningService.reconcile_pending_signatures() == (1, 0)
+
+    statuses = dict(DocumentSignature.objects.values_list("id", "signature_status"))
+    assert statuses[rejected.id] == DocumentSignature.REJECTED
+    assert statuses[waiting.id] == DocumentSignature.PENDING
+    assert statuses[fresh.id] == DocumentSignature.PENDING
+    assert SigningJob.objects.get(document_signature=rejected).status == SigningJob.FAILED
+    # One token per signer for all of their transactions
+    assert mysign["logins"] == ["signer"]
+
+
+def test_reconcile_times_out_unconfirmed_signatures(mysign):
+    expired = make_pending(3601, transaction_id="expired")
+    pending = make_pending(600, transaction_id="pending")
+
+    assert SigningService.reconcile_pending_signatures() == (0, 1)
+
+    expired.refresh_from_db()
+    pending.refresh_from_db()
+    assert expired.signature_status == DocumentSignature.TIMEOUT
+    assert pending.signature_status == DocumentSignature.PENDING
+    assert SigningJob.objects.get(document_signature=expired).status == SigningJob.FAILED
+
+
+@pytest.fixture()
+def pending_signature(user):
+    """A signature sent to MySign, prepared from version 0 of the signature file."""
+    document_signature = DocumentSignatureFactory(
+        signer=user,
+        signature_status=DocumentSignature.PENDING,
+        transaction_id="transaction",
+    )
+    Asset.objects.create(
+        document=document_signature.document,
+        file=ContentFile(b"%PDF-1.7", name="document.pdf"),
+        size=8,
+        mime_type="application/pdf",
+        asset_name="document.pdf",
+        file_type=Asset.SIGNATURE_FILE,
+    )
+    SigningSession.objects.create(
+        document_signature=document_signature,
+        transaction_id="transaction",
+        asset_version=0,
+        state=pickle.dumps({}),
+        signed_attrs=b"",
+        cert="",
+        expires_at=now(),
+    )
+    SigningJobFactory(
+        document_signature=document_signature,
+        status=SigningJob.SUBMITTED,
+        transaction_id="transaction",
+    )
+    return document_signature
+
+
+def test_signature_prepared_from_an_older_file_fails(pending_signature, user):
+    # Another signer's signature landed after this one was prepared
+    Asset.objects.filter(document=pending_signature.document).update(version=1)
+
+    SigningService.update_signature_status(pending_signature, SIGNED_RESPONSE, user)
+
+    pending_signature.refresh_from_db()
+    assert pending_signature.signature_status == DocumentSignature.FAILED
+    assert SigningJob.objects.get(document_signature=pending_signature).status == SigningJob.FAILED
+    assert Asset.objects.get(document=pending_signature.document).version == 1
+    assert not pending_signature.document.revisions.exists()
+
+
+def test_finalized_signature_is_left_untouched(pending_signature, user):
+    DocumentSignature.objects.filter(id=pending_signature.id).update(signature_status=DocumentSignature.SIGNED)
+
+    SigningService.update_signature_status(pending_signature, {"status": "4004"}, user)
+
+    pending_signature.refresh_from_db()
+    assert pending_signature.signature_status == DocumentSignature.SIGNED
+    assert SigningJob.objects.get(document_signature=pending_signature).status == SigningJob.SUBMITTED
@@ -0,0 +1,105 @@
+import pytest
+from django.core.cache import cache
+from PIL import Image
+from pyhanko.pdf_utils.images import pil_image
+from pyhanko.pdf_utils.writer import PdfFileWriter
+
+from edms.common.image_cache import SignatureAppearanceCache
+from edms.documents.signing_utils import MySignHelper
+from edms.documents.signing_utils import write_appearance_xobject
+
+CREDENTIALS = [{"credential_id": "credential", "cert": {"certificates": ["certificate"]}}]
+
+
+class FakeResponse:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def __bool__(self):
+        return self.status_code < 400
+
+    def json(self):
+        return self.data
+
+
+@pytest.fixture()
+def mysign(monkeypatch, settings):
+    """Record the logins and certificate lookups instead of calling MySign."""
+    settings.MS_TOKEN_EXPIRY_MARGIN = 60
+    settings.MS_CERTIFICATES_CACHE_TIMEOUT = 600
+    cache.clear()
+    calls = {"logins": 0, "certificates": [], "expires_in": 3600, "statuses": []}
+
+    def login(user_id, base_url, client_id, client_secret, profile_id):
+        calls["logins"] += 1
+        return {"access_token": f"token-{calls['logins']}", "expires_in": calls["expires_in"]}
+
+    def get_credentials_list(client_id, client_secret, profile_id, user_id, access_token, base_url):
+        calls["certificates"].append(access_token)
+        status_code = calls["statuses"].pop(0) if calls["statuses"] else 200
+        return FakeResponse(status_code, CREDENTIALS if status_code == 200 else {})
+
+    monkeypatch.setattr(MySignHelper, "login", staticmethod(login))
+    monkeypatch.setattr(MySignHelper, "get_credentials_list", staticmethod(get_credentials_list))
+    return calls
+
+
+def get_all_certificates():
+    return MySignHelper.get_all_certificates("user", "https://mysign", "client", "secret", "profile")
+
+
+def test_token_and_certificates_are_fetched_once(mysign):
+    assert get_all_certificates() == ({"credential": {"certificates": ["certificate"]}}, "token-1")
+    assert get_all_certificates() == ({"credential": {"certificates": ["certificate"]}}, "token-1")
+
+    assert mysign["logins"] == 1
+    assert mysign["certificates"] == ["token-1"]
+
+
+def test_token_close_to_expiry_is_not_cached(mysign):
+    mysign["expires_in"] = 30
+
+    MySignHelper.get_access_token("user", "https://mysign", "client", "secret", "profile")
+    MySignHelper.get_access_token("user", "https://mysign", "client", "secret", "profile")
+
+    assert mysign["logins"] == 2
+
+
+def test_rejected_token_logs_in_again(mysign):
+    MySignHelper.get_access_token("user", "https://mysign", "client", "secret", "profile")
+    mysign["statuses"].append(401)
+
+    cert_list, access_token = get_all_certificates()
+
+    assert cert_list
+    assert access_token == "token-2"
+    assert mysign["certificates"] == ["token-1", "token-2"]
+
+
+def test_invalidated_user_starts_fresh(mysign):
+    get_all_certificates()
+
+    MySignHelper.invalidate_user_cache("user", "profile")
+    get_all_certificates()
+
+    assert mysign["logins"] == 2
+    assert mysign["certificates"] == ["token-1", "token-2"]
+
+
+def get_xobject(reference):
+    """The entries and the encoded data of an image XObject, with its soft mask."""
+    xobject = reference.get_object()
+    entries = {key: value for key, value in xobject.items() if key not in ("/Length", "/SMask")}
+    smask = get_xobject(xobject["/SMask"]) if "/SMask" in xobject else None
+    return entries, xobject.encoded_data, smask
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "RGB", "LA", "L", "P"])
+def test_appearance_is_written_like_pyhanko_embeds_the_image(mode):
+    image = Image.new(mode, (40, 20))
+    writer = PdfFileWriter()
+
+    appearance = SignatureAppearanceCache.build_appearance(image)
+
+    assert get_xobject(write_appearance_xobject(appearance, writer)) == get_xobject(pil_image(image, writer))
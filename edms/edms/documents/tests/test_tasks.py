@@ -0,0 +1,80 @@
+import pytest
+
+from edms.documents.models import SigningWebhookEvent
+from edms.documents.services import SigningService
+from edms.documents.services import TransientSigningError
+from edms.documents.tasks import finalize_signing_transaction
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def finalized(monkeypatch):
+    """Record the transactions finalized instead of asking MySign."""
+    calls = []
+    monkeypatch.setattr(
+        SigningService,
+        "finalize_transaction",
+        staticmethod(lambda transaction_id, user: calls.append(transaction_id)),
+    )
+    return calls
+
+
+def test_finalize_signing_transaction_runs_once_per_event(user, finalized):
+    event = SigningWebhookEvent.objects.create(transaction_id="transaction", created_by=user)
+
+    finalize_signing_transaction.apply(args=[event.id])
+    # A redelivery of the task finds the event processed
+    finalize_signing_transaction.apply(args=[event.id])
+
+    event.refresh_from_db()
+    assert finalized == ["transaction"]
+    assert event.status == SigningWebhookEvent.PROCESSED
+    assert event.attempts == 1
+
+
+def test_duplicate_webhook_is_not_finalized_again(user, finalized, django_capture_on_commit_callbacks, settings):
+    settings.CELERY_TASK_ALWAYS_EAGER = True
+    with django_capture_on_commit_callbacks(execute=True):
+        SigningWebhookEvent.record("transaction", user)
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        SigningWebhookEvent.record("transaction", user)
+
+    assert not callbacks
+    assert finalized == ["transaction"]
+
+
+
+def fail_finalization(monkeypatch, error):
+    calls = []
+
+    def finalize_transaction(transaction_id, user):
+        calls.append(transaction_id)
+        raise error
+
+    monkeypatch.setattr(SigningService, "finalize_transaction", staticmethod(finalize_transaction))
+    return calls
+
+
+def test_transient_failure_is_retried(user, monkeypatch):
+    calls = fail_finalization(monkeypatch, TransientSigningError("MySign did not answer."))
+    event = SigningWebhookEvent.objects.create(transaction_id="transaction", created_by=user)
+
+    finalize_signing_transaction.apply(args=[event.id])
+
+    event.refresh_from_db()
+    assert len(calls) == finalize_signing_transaction.max_retries + 1
+    assert event.status == SigningWebhookEvent.FAILED
+    assert event.error == "MySign did not answer."
+
+
+def test_permanent_failure_is_not_retried(user, monkeypatch):
+    calls = fail_finalization(monkeypatch, ValueError("There must be exactly 1 signature for this order."))
+    event = SigningWebhookEvent.objects.create(transaction_id="transaction", created_by=user)
+
+    finalize_signing_transaction.apply(args=[event.id])
+
+    event.refresh_from_db()
+    assert calls == ["transaction"]
+    assert event.status == SigningWebhookEvent.FAILED
+    assert event.attempts == 1
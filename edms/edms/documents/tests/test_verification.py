@@ -0,0 +1,118 @@
+import io
+
+import pikepdf
+import pytest
+from django.core.files.base import ContentFile
+
+from edms.assets.models import Asset
+from edms.documents import verification
+from edms.documents.tests.factories import DocumentFactory
+from edms.documents.verification import SignatureVerifier
+
+VALID_SIGNATURE = {"field_name": "Signature1", "bottom_line": True}
+INVALID_SIGNATURE = {"field_name": "Signature1", "bottom_line": False, "error": "OCSP responder unreachable"}
+
+
+class RecordingCache:
+    def __init__(self):
+        self.data = {}
+        self.timeouts = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, timeout):
+        self.data[key] = value
+        self.timeouts[key] = timeout
+
+
+@pytest.fixture()
+def verification_cache(monkeypatch):
+    monkeypatch.setattr(SignatureVerifier, "_trust_roots", [b"root"])
+    cache = RecordingCache()
+    monkeypatch.setattr(verification, "cache", cache)
+    return cache
+
+
+@pytest.fixture()
+def signatures(monkeypatch, settings):
+    """Signatures returned by the validation job, in place of pyhanko."""
+    settings.PDF_POOL_ENABLED = False
+    result = [VALID_SIGNATURE]
+    monkeypatch.setattr(verification, "verify_signatures_job", lambda **kwargs: list(result))
+    return result
+
+
+def test_cache_key_depends_on_fetching_and_trust_store(monkeypatch):
+    monkeypatch.setattr(SignatureVerifier, "_trust_roots", [b"root"])
+    offline = SignatureVerifier.get_cache_key("hash", allow_fetching=False)
+    online = SignatureVerifier.get_cache_key("hash", allow_fetching=True)
+
+    monkeypatch.setattr(SignatureVerifier, "_trust_roots", [b"other root"])
+    assert len({offline, online, SignatureVerifier.get_cache_key("hash", allow_fetching=False)}) == 3
+    assert offline.endswith(":hash")
+
+
+def test_offline_result_is_cached(settings, verification_cache, signatures):
+    settings.SIGNATURE_VERIFICATION_ALLOW_FETCHING = False
+    settings.SIGNATURE_VERIFICATION_CACHE_TIMEOUT = 3600
+
+    result = SignatureVerifier.verify("hash", lambda: b"%PDF-1.7")
+    signatures[:] = [INVALID_SIGNATURE]
+
+    assert SignatureVerifier.verify("hash", lambda: b"%PDF-1.7") == result
+    assert result["valid"]
+    assert list(verification_cache.timeouts.values()) == [3600]
+
+
+def test_result_with_fetched_revocation_data_expires_sooner(settings, verification_cache, signatures):
+    settings.SIGNATURE_VERIFICATION_ALLOW_FETCHING = True
+    settings.SIGNATURE_VERIFICATION_FETCHING_CACHE_TIMEOUT = 300
+
+    SignatureVerifier.verify("hash", lambda: b"%PDF-1.7")
+
+    assert verification_cache.timeouts == {SignatureVerifier.get_cache_key("hash", allow_fetching=True): 300}
+
+
+def test_result_with_a_validation_error_is_not_cached(verification_cache, signatures):
+    signatures[:] = [INVALID_SIGNATURE]
+
+    result = SignatureVerifier.verify("hash", lambda: b"%PDF-1.7")
+
+    assert not result["valid"]
+    assert not verification_cache.data
+
+
+def test_signatures_are_verified_in_the_pdf_pool(monkeypatch, verification_cache, pdf_pool):
+    monkeypatch.setattr(SignatureVerifier, "_trust_roots", [])
+    pdf = pikepdf.new()
+    pdf.add_blank_page()
+    output = io.BytesIO()
+    pdf.save(output)
+
+    result = SignatureVerifier.verify("hash", output.getvalue)
+
+    assert result["signatures"] == []
+    assert not result["valid"]
+
+
+@pytest.mark.django_db
+def test_document_without_revisions_is_hashed_once(monkeypatch, verification_cache, signatures):
+    document = DocumentFactory()
+    signature_file = Asset.objects.create(
+        document=document,
+        file=ContentFile(b"%PDF-1.7", name="document.pdf"),
+        size=8,
+        mime_type="application/pdf",
+        asset_name="document.pdf",
+        file_type=Asset.SIGNATURE_FILE,
+    )
+    reads = []
+    monkeypatch.setattr(Asset, "get_asset_data", lambda self, **kwargs: reads.append(self.pk) or b"%PDF-1.7")
+
+    result = SignatureVerifier.verify_document(document)
+
+    signature_file.refresh_from_db()
+    assert signature_file.content_hash == result["content_hash"]
+    assert SignatureVerifier.verify_document(document) == result
+    assert reads == [signature_file.pk]
@@ -0,0 +1,75 @@
+import pytest
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from edms.documents.models import SigningJob
+from edms.documents.tests.factories import DocumentSignatureFactory
+from edms.documents.tests.factories import SigningJobFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+def test_batch_sign_queues_one_job_per_document(api_client, user):
+    documents = [DocumentSignatureFactory(signer=user).document for _ in range(2)]
+
+    response = api_client.post(
+        reverse("document-batch-signing-document"),
+        {"document_ids": [document.id for document in documents]},
+        format="json",
+    )
+
+    assert response.status_code == 202
+    jobs = SigningJob.objects.filter(batch_id=response.data["batch_id"])
+    assert sorted(jobs.values_list("document_id", flat=True)) == sorted(document.id for document in documents)
+
+
+def test_batch_sign_rejects_too_many_documents(api_client, user, settings):
+    documents = [DocumentSignatureFactory(signer=user).document for _ in range(settings.SIGNING_BATCH_MAX_DOCUMENTS + 1)]
+
+    response = api_client.post(
+        reverse("document-batch-signing-document"),
+        {"document_ids": [document.id for document in documents]},
+        format="json",
+    )
+
+    assert response.status_code == 400
+    assert not SigningJob.objects.exists()
+
+
+def test_batch_sign_rejects_documents_of_other_signers(api_client, user):
+    own = DocumentSignatureFactory(signer=user).document
+    other = DocumentSignatureFactory().document
+
+    response = api_client.post(
+        reverse("document-batch-signing-document"),
+        {"document_ids": [own.id, other.id]},
+        format="json",
+    )
+
+    assert response.status_code == 400
+    assert not SigningJob.objects.exists()
+
+
+def test_signing_job_status_is_polled_by_its_owner(api_client, user):
+    document_signature = DocumentSignatureFactory(signer=user)
+    job = SigningJob.submit(document_signature.document, user)
+
+    response = api_client.get(reverse("document-signing-job", kwargs={"job_id": job.id}))
+
+    assert response.status_code == 200
+    assert response.data["status"] == SigningJob.QUEUED
+
+
+def test_signing_job_of_another_user_is_not_found(api_client):
+    job = SigningJobFactory()
+
+    response = api_client.get(reverse("document-signing-job", kwargs={"job_id": job.id}))
+
+    assert response.status_code == 404
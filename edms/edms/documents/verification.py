@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from asn1crypto import pem
+from asn1crypto import x509 as asn1_x509
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.timezone import now
+
+from edms.assets.models import Asset
+from edms.common.pdf_pool import PdfRenderPool
+from edms.common.signature_verification import verify_signatures_job
+
+logger = logging.getLogger(__name__)
+
+TRUST_STORE_SUFFIXES = (".pem", ".crt", ".cer", ".der")
+
+
+class SignatureVerifier:
+    """
+    Validation of the signatures embedded in a document.
+
+    Signatures are checked with pyhanko against the certificates of the local
+    trust store SIGNATURE_TRUST_STORE, without fetching revocation data unless
+    SIGNATURE_VERIFICATION_ALLOW_FETCHING is set. A revision never changes, so
+    results are cached by its content hash, the trust store fingerprint and
+    whether revocation data was fetched, repeated verifications of a document
+    are a single cache lookup. Results with fetched revocation data expire
+    after SIGNATURE_VERIFICATION_FETCHING_CACHE_TIMEOUT, and results where a
+    signature could not be validated are not cached at all.
+    """
+    _trust_roots = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_trust_roots(cls):
+        """Return the DER encoded certificates of the trust store, loaded once per process."""
+        with cls._lock:
+            if cls._trust_roots is None:
+                cls._trust_roots = cls.load_trust_roots(settings.SIGNATURE_TRUST_STORE)
+            return cls._trust_roots
+
+    @staticmethod
+    def load_trust_roots(path):
+        path = Path(path)
+        files = sorted(path.iterdir()) if path.is_dir() else [path]
+        trust_roots = []
+        for file in files:
+            if file.suffix.lower() not in TRUST_STORE_SUFFIXES or not file.is_file():
+                continue
+            data = file.read_bytes()
+            try:
+                if pem.detect(data):
+                    trust_roots.extend(der for _, _, der in pem.unarmor(data, multiple=True))
+                else:
+                    trust_roots.append(asn1_x509.Certificate.load(data).dump())
+            except ValueError as e:
+                logger.error("Error: %s", e)
+        if not trust_roots:
+            logger.warning(f"The signature trust store {path} has no certificates, no signer will be trusted")
+        return trust_roots
+
+    @classmethod
+    def get_cache_key(cls, content_hash, allow_fetching):
+        fingerprint = hashlib.sha256(b"".join(cls.get_trust_roots())).hexdigest()[:16]
+        mode = "online" if allow_fetching else "offline"
+        return f"signature_verification:{fingerprint}:{mode}:{content_hash}"
+
+    @staticmethod
+    def get_cache_timeout(allow_fetching):
+        if allow_fetching:
+            return settings.SIGNATURE_VERIFICATION_FETCHING_CACHE_TIMEOUT
+        return settings.SIGNATURE_VERIFICATION_CACHE_TIMEOUT
+
+    @staticmethod
+    def get_storage_options():
+        return {
+            "access_key": settings.AWS_ACCESS_KEY_ID,
+            "secret_key": settings.AWS_SECRET_ACCESS_KEY,
+            "region_name": settings.AWS_S3_REGION_NAME,
+            "bucket_name": settings.AWS_STORAGE_BUCKET_NAME,
+        }
+
+    @classmethod
+    def verify_document(cls, document):
+        """Verify the signatures of the current revision of ``document``."""
+        revision = document.current_revision
+        if revision:
+            return cls.verify(
+                revision.content_hash,
+                lambda: revision.get_revision_data(**cls.get_storage_options()),
+            )
+
+        # Signed before revisions were recorded, the file is hashed once and the hash kept on the asset
+        signature_file = Asset.objects.filter(
+            file_type=Asset.SIGNATURE_FILE,
+            document_id=document.id,
+        ).first()
+        if not signature_file:
+            raise ValueError("The document has no signature file.")
+        if signature_file.content_hash:
+            return cls.verify(
+                signature_file.content_hash,
+                lambda: signature_file.get_asset_data(**cls.get_storage_options()),
+            )
+        pdf_data = signature_file.get_asset_data(**cls.get_storage_options())
+        content_hash = hashlib.sha256(pdf_data).hexdigest()
+        # Only if the file was not replaced meanwhile
+        Asset.objects.filter(pk=signature_file.pk, file=signature_file.file.name).update(content_hash=content_hash)
+        return cls.verify(content_hash, lambda: pdf_data)
+
+    @classmethod
+    def verify(cls, content_hash, read_data):
+        allow_fetching = settings.SIGNATURE_VERIFICATION_ALLOW_FETCHING
+        key = cls.get_cache_key(content_hash, allow_fetching)
+        result = cache.get(key)
+        if result is not None:
+            return result
+
+        signatures = PdfRenderPool.run(
+            verify_signatures_job,
+            pdf_data=read_data(),
+            trust_roots=cls.get_trust_roots(),
+            allow_fetching=allow_fetching,
+        )
+        result = {
+            "content_hash": content_hash,
+            "verified_at": now().isoformat(),
+            "valid": bool(signatures) and all(signature["bottom_line"] for signature in signatures),
+            "signatures": signatures,
+        }
+        # A validation error may be transient, such as an unreachable revocation server
+        if not any("error" in signature for signature in signatures):
+            cache.set(key, result, timeout=cls.get_cache_timeout(allow_fetching))
+        return result
+
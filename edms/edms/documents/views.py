@@ -8,16 +8,25 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from edms.assets.models import AssetText
 from edms.common.app_status import AppResponse
 from edms.common.app_status import ErrorResponse
 from edms.common.helper import custom_error
+from edms.common.pdf_pool import PdfJobError
 from edms.common.pagination import StandardResultsSetPagination
 from edms.common.permissions import IsOwnerOrAdmin
 from edms.documents.filters import DocumentFilter
-from edms.documents.models import Document, DocumentSignature, DocumentReceiver
-from edms.documents.serializers import DocumentSerializer, SendDocumentSerializer
+from edms.documents.models import Document, DocumentSignature, DocumentReceiver, SigningJob
+from edms.documents.verification import SignatureVerifier
+from edms.documents.serializers import (
+    BatchSignDocumentSerializer,
+    DocumentRevisionSerializer,
+    DocumentSerializer,
+    SendDocumentSerializer,
+    SigningJobSerializer,
+)
 from edms.organization.models import OrganizationUnit
-from edms.search.filters import UnaccentSearchFilter
+from edms.search.filters import ContentSearchFilter
 from edms.users.models import User
 from django.conf import settings
 
@@ -29,9 +38,11 @@ class DocumentViewSet(viewsets.ModelViewSet):
     serializer_class = DocumentSerializer
     filter_backends = (
         DjangoFilterBackend,
-        UnaccentSearchFilter,
+        ContentSearchFilter,
     )
     filterset_class = DocumentFilter
+    search_content_model = AssetText
+    search_content_relation = "document"
     search_fields = [
         "document_title",
         "document_summary",
@@ -326,24 +337,94 @@ class DocumentViewSet(viewsets.ModelViewSet):
     def signing_document(self, request, pk=None):
         try:
             document = get_object_or_404(self.get_queryset(), id=pk)
-            sign_hash_response = document.sign(
-                request=request,
-                client_id=settings.MS_CLIENT_ID,
-                client_secret=settings.MS_CLIENT_SECRET,
-                base_url=settings.MS_BASE_URL,
-                profile_id=settings.MS_PROFILE_ID,
-                access_key=settings.AWS_ACCESS_KEY_ID,
-                secret_key=settings.AWS_SECRET_ACCESS_KEY,
-                region_name=settings.AWS_S3_REGION_NAME,
-                bucket_name=settings.AWS_STORAGE_BUCKET_NAME,
+            job = SigningJob.submit(document=document, user=request.user)
+            data = AppResponse.SUBMIT_SIGNING_DOCUMENTS.success_response
+            data["job_id"] = str(job.id)
+            return Response(
+                data=data,
+                status=AppResponse.SUBMIT_SIGNING_DOCUMENTS.status_code
             )
-            data = AppResponse.START_SIGNING_DOCUMENTS.success_response
-            data["transaction_id"] = sign_hash_response.get("transactionId")
+        except ValueError as e:
+            return ErrorResponse(
+                str(e),
+            ).failure_response()
+
+    @action(
+        methods=["POST"],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        serializer_class=BatchSignDocumentSerializer,
+        url_name='batch-signing-document',
+        url_path="batch-sign"
+    )
+    def batch_signing_document(self, request):
+        try:
+            serializer = BatchSignDocumentSerializer(data=request.data)
+            if not serializer.is_valid():
+                return ErrorResponse(
+                    custom_error("DOCUMENT", serializer.errors),
+                ).failure_response()
+
+            document_ids = set(serializer.validated_data["document_ids"])
+            documents = list(self.get_queryset().filter(id__in=document_ids))
+            if len(documents) != len(document_ids):
+                raise ValueError("Some documents do not exist or are not available to you.")
+
+            batch_id, jobs = SigningJob.submit_batch(documents=documents, user=request.user)
+            data = AppResponse.SUBMIT_SIGNING_DOCUMENTS.success_response
+            data["batch_id"] = str(batch_id)
+            data["jobs"] = SigningJobSerializer(jobs, many=True).data
             return Response(
                 data=data,
-                status=AppResponse.START_SIGNING_DOCUMENTS.status_code
+                status=AppResponse.SUBMIT_SIGNING_DOCUMENTS.status_code
             )
         except ValueError as e:
             return ErrorResponse(
                 str(e),
             ).failure_response()
+
+    @action(
+        methods=["GET"],
+        detail=True,
+        permission_classes=[IsAuthenticated],
+        serializer_class=DocumentRevisionSerializer,
+        url_name='document-revisions',
+        url_path="revisions"
+    )
+    def revisions(self, request, pk=None):
+        document = get_object_or_404(self.get_queryset(), id=pk)
+        return Response(
+            data=DocumentRevisionSerializer(document.revisions.all(), many=True).data,
+            status=status.HTTP_200_OK
+        )
+
+    @action(
+        methods=["GET"],
+        detail=True,
+        permission_classes=[IsAuthenticated],
+        serializer_class=None,
+        url_name='verify-document',
+        url_path="verify"
+    )
+    def verify(self, request, pk=None):
+        document = get_object_or_404(self.get_queryset(), id=pk)
+        try:
+            result = SignatureVerifier.verify_document(document)
+        except (ValueError, PdfJobError) as e:
+            return ErrorResponse(str(e)).failure_response()
+        return Response(data=result, status=status.HTTP_200_OK)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[IsAuthenticated],
+        serializer_class=SigningJobSerializer,
+        url_name='signing-job',
+        url_path=r"signing-jobs/(?P<job_id>[0-9a-f-]+)"
+    )
+    def signing_job(self, request, job_id=None):
+        job = get_object_or_404(SigningJob.objects.filter(created_by=request.user), id=job_id)
+        return Response(
+            data=SigningJobSerializer(job).data,
+            status=status.HTTP_200_OK
+        )
@@ -1,5 +1,6 @@
 import logging
 
+from django.conf import settings
 from django.db import models
 
 from edms.assets.models import Asset
@@ -72,7 +73,7 @@ class MeetingSchedule(SoftDeleteModel, BaseModel):
     )
 
     def associate_assets(self, files, file_type):
-        Asset.objects.bulk_create(
+        assets = Asset.objects.bulk_create(
             [
                 Asset(
                     meeting_schedule=self,
@@ -90,6 +91,7 @@ class MeetingSchedule(SoftDeleteModel, BaseModel):
                 for file in files
             ],
         )
+        Asset.schedule_processing(assets, optimize=settings.PDF_OPTIMIZE_ON_UPLOAD)
 
     def update_status(self, new_status, user):
         """
@@ -1,5 +1,8 @@
 from rest_framework.filters import SearchFilter
-from django.db.models import Func, Q
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import Case, Exists, F, FloatField, Func, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from text_unidecode import unidecode
 import django_filters
 
@@ -40,6 +43,49 @@ class UnaccentSearchFilter(SearchFilter):
         return queryset.filter(conditions)
 
 
+class ContentSearchFilter(UnaccentSearchFilter):
+    """
+    UnaccentSearchFilter that also matches the extracted text of attachments.
+
+    The view names the text model in ``search_content_model`` and its foreign
+    key back to the view's model in ``search_content_relation``. Results are
+    ranked: a metadata match counts 1, a content match its text rank scaled by
+    ``SEARCH_CONTENT_WEIGHT``.
+    """
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        content_model = getattr(view, 'search_content_model', None)
+        if not search_terms or content_model is None:
+            return super().filter_queryset(request, queryset, view)
+
+        metadata_queryset = super().filter_queryset(request, queryset, view)
+        search_query = SearchQuery(
+            " ".join(unidecode(term) for term in search_terms),
+            config="simple",
+        )
+        content_queryset = content_model.objects.filter(
+            **{view.search_content_relation: OuterRef("pk")},
+            search_vector=search_query,
+        )
+        content_rank = content_queryset.annotate(
+            rank=SearchRank(F("search_vector"), search_query),
+        ).order_by("-rank").values("rank")[:1]
+
+        queryset = queryset.filter(
+            Q(pk__in=metadata_queryset.values("pk")) | Q(Exists(content_queryset))
+        ).annotate(
+            metadata_rank=Case(
+                When(pk__in=metadata_queryset.values("pk"), then=Value(1.0)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            ),
+            content_rank=Coalesce(Subquery(content_rank), Value(0.0), output_field=FloatField()),
+        ).annotate(
+            search_rank=F("metadata_rank") + F("content_rank") * settings.SEARCH_CONTENT_WEIGHT,
+        )
+        return queryset.order_by("-search_rank", *queryset.query.order_by)
+
+
 class UnaccentFilter(django_filters.CharFilter):
     """
     Custom filter that supports searching both with and without accents.